@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+"""bench - Benchmark for PyMunin Plugins using canned inputs.
+
+    - The proc collectors (SystemInfo, DiskIOinfo, NetIfaceInfo) read a
+      synthetic /proc and /sys tree generated by the ProcFixture Class.
+    - The service collectors query local fake servers for Memcached, Asterisk
+      Manager Interface, the status pages of Apache, Lighttpd, Nginx, PHP FPM
+      and Apache Tomcat and the Squid Cache Manager.
+    - Each scenario is run in a forked process for a number of iterations.
+      The wall time and CPU time of the phases of the config and fetch cycles
+      of the plugin and the growth of the resident set size are reported.
+    - The median wall times and the memory growth are checked against the
+      budgets defined in a configuration file; the exit status is 1 if any
+      budget is exceeded or any scenario fails.
+
+    Phases:
+        config   - Instantiation of plugin and output of config cycle.
+        init     - Instantiation of plugin for fetch cycle.
+        retrieve - Retrieval of values.
+        output   - Formatting and output of values.
+
+    The budget configuration file has one section per scenario and one option
+    per phase with the budget in milliseconds; the memory option defines the
+    budget for the growth of the resident set size in kB. Options in the
+    DEFAULT section apply to all scenarios.
+
+        [DEFAULT]
+        retrieve = 100
+        memory = 8192
+        [asteriskstats]
+        retrieve = 200
+
+    Example:
+        python benchmark/bench.py --disks 32 diskiostats
+
+"""
+
+import os
+import sys
+import gc
+import errno
+import marshal
+import optparse
+import resource
+import shutil
+import tempfile
+import traceback
+import ConfigParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymunin.instrument import MuninInstrument
+import fixtures
+import servers
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+defaultIterations = 10
+defaultBudgetFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'budgets.conf')
+
+benchPhases = ('config', 'init', 'retrieve', 'output')
+
+# (scenario, plugin module or None, fake server or None)
+scenarioTable = (
+    ('sysstats', 'sysstats', None),
+    ('diskiostats', 'diskiostats', None),
+    ('netifacestats', 'netifacestats', None),
+    ('procstats', 'procstats', None),
+    ('procacctstats', 'procacctstats', None),
+    ('netstats', 'netstats', None),
+    ('memcachedstats', 'memcachedstats', 'memcached'),
+    ('asteriskstats', 'asteriskstats', 'asterisk'),
+    ('apachestats', 'apachestats', 'apache'),
+    ('lighttpdstats', 'lighttpdstats', 'lighttpd'),
+    ('nginxstats', 'nginxstats', 'nginx'),
+    ('phpfpmstats', 'phpfpmstats', 'phpfpm'),
+    ('tomcatstats', 'tomcatstats', 'tomcat'),
+    ('squid', None, 'squid'),
+)
+
+
+def get_plugin_class(modname):
+    """Import plugin module and return the MuninPlugin child class it defines.
+
+    @param modname: Name of module in pymunin.plugins package.
+    @return:        Plugin class.
+
+    """
+    from pymunin import MuninPlugin
+    modpath = 'pymunin.plugins.%s' % modname
+    __import__(modpath)
+    module = sys.modules[modpath]
+    for obj in module.__dict__.values():
+        if (isinstance(obj, type(MuninPlugin)) and issubclass(obj, MuninPlugin)
+            and obj.__module__ == modpath and obj.plugin_name is not None):
+            return obj
+    raise Exception("No plugin class defined in module %s." % modpath)
+
+
+def current_rss():
+    """Returns resident set size of the process.
+
+    @return: Resident set size in kB.
+
+    """
+    fp = open('/proc/self/statm', 'r')
+    try:
+        pages = int(fp.read().split()[1])
+    finally:
+        fp.close()
+    return pages * resource.getpagesize() / 1024
+
+
+def reset_peak_rss():
+    """Resets the peak resident set size of the process where supported, so
+    that the peak inherited from the parent process is not reported.
+
+    """
+    try:
+        fp = open('/proc/self/clear_refs', 'w')
+        try:
+            fp.write('5')
+        finally:
+            fp.close()
+    except (IOError, OSError):
+        pass
+
+
+def median(vals):
+    """Returns median of list of numbers.
+
+    @param vals: List of numbers.
+    @return:     Median.
+
+    """
+    vals = sorted(vals)
+    mid = len(vals) / 2
+    if len(vals) % 2:
+        return vals[mid]
+    return (vals[mid - 1] + vals[mid]) / 2.0
+
+
+def measure_plugin(cls, env, iterations):
+    """Run config and fetch cycles of plugin and measure the phases.
+
+    @param cls:        Plugin class.
+    @param env:        Dictionary of environment variables for the plugin.
+    @param iterations: Number of runs.
+    @return:           Dictionary that maps phase names to lists of
+                       (wall, cpu) tuples.
+
+    """
+    samples = dict([(phase, []) for phase in benchPhases])
+    devnull = open(os.devnull, 'w')
+    name = cls.plugin_name
+    try:
+        for i in range(iterations): #@UnusedVariable
+            timer = MuninInstrument()
+            timer.begin('config')
+            plugin = cls([name, 'config'], dict(env))
+            plugin.setOutput(devnull)
+            plugin.config()
+            timer.end('config')
+            del plugin
+            timer.begin('init')
+            plugin = cls([name, 'fetch'], dict(env))
+            timer.end('init')
+            plugin.setOutput(devnull)
+            collect = plugin._collectVals
+            def timed_collect():
+                timer.begin('retrieve')
+                collect()
+                timer.end('retrieve')
+            plugin._collectVals = timed_collect
+            timer.begin('output')
+            plugin.fetch()
+            timer.end('output')
+            del plugin
+            (wall, cpu) = timer.getTimes('output')
+            (retr_wall, retr_cpu) = timer.getTimes('retrieve')
+            timer.setTimes('output', wall - retr_wall, cpu - retr_cpu)
+            for phase in benchPhases:
+                samples[phase].append(timer.getTimes(phase))
+    finally:
+        devnull.close()
+    return samples
+
+
+def measure_squid(env, iterations):
+    """Query Squid Cache Manager counters using SquidInfo and measure the
+    phases. (There is no plugin for Squid.)
+
+    @param env:        Dictionary of environment variables.
+    @param iterations: Number of runs.
+    @return:           Dictionary that maps phase names to lists of
+                       (wall, cpu) tuples.
+
+    """
+    from pysysinfo.squid import SquidInfo
+    samples = {'init': [], 'retrieve': []}
+    for i in range(iterations): #@UnusedVariable
+        timer = MuninInstrument()
+        timer.begin('init')
+        info = SquidInfo(env['host'], int(env['port']))
+        timer.end('init')
+        timer.begin('retrieve')
+        info.getCounters()
+        timer.end('retrieve')
+        del info
+        for phase in samples.keys():
+            samples[phase].append(timer.getTimes(phase))
+    return samples
+
+
+def run_forked(func, *args):
+    """Run function in forked child process and return the result.
+
+    @param func: Function that returns a marshallable result.
+    @param args: Positional arguments for function.
+    @return:     Tuple of result and None or None and error string.
+
+    """
+    (rfd, wfd) = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        try:
+            gc.collect()
+            reset_peak_rss()
+            rss_start = current_rss()
+            result = func(*args)
+            gc.collect()
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            data = marshal.dumps((result, peak, max(0, peak - rss_start), None))
+        except:
+            data = marshal.dumps((None, None, None, traceback.format_exc()))
+        while data:
+            data = data[os.write(wfd, data):]
+        os.close(wfd)
+        os._exit(0)
+    os.close(wfd)
+    chunks = []
+    while True:
+        try:
+            chunk = os.read(rfd, 65536)
+        except OSError, e:
+            if e.errno == errno.EINTR:
+                continue
+            raise
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(rfd)
+    os.waitpid(pid, 0)
+    if not chunks:
+        return (None, "Benchmark process terminated without result.")
+    (result, peak, growth, err) = marshal.loads(''.join(chunks))
+    if err is not None:
+        return (None, err)
+    return ((result, peak, growth), None)
+
+
+class BudgetConf:
+    """Class for budgets of benchmark scenarios."""
+
+    def __init__(self, path=None, scale=1.0):
+        """Initialize budgets.
+
+        @param path:  Path of budget configuration file or None.
+        @param scale: Multiplier for all budgets.
+
+        """
+        self._conf = ConfigParser.RawConfigParser()
+        self._scale = scale
+        if path is not None:
+            if not self._conf.read(path):
+                raise IOError("Failed reading budgets from file: %s" % path)
+
+    def getBudget(self, scenario, key):
+        """Returns budget for phase or memory of scenario.
+
+        @param scenario: Scenario name.
+        @param key:      Phase name or memory.
+        @return:         Budget in ms or kB or None if not defined.
+
+        """
+        if self._conf.has_section(scenario):
+            if not self._conf.has_option(scenario, key):
+                return None
+            val = self._conf.get(scenario, key)
+        else:
+            val = self._conf.defaults().get(key)
+            if val is None:
+                return None
+        return float(val) * self._scale
+
+
+def report_scenario(scenario, samples, peak, growth, budgets, fp):
+    """Print results of scenario and check them against the budgets.
+
+    @param scenario: Scenario name.
+    @param samples:  Dictionary that maps phase names to lists of
+                     (wall, cpu) tuples.
+    @param peak:     Peak resident set size in kB.
+    @param growth:   Growth of resident set size in kB.
+    @param budgets:  BudgetConf instance.
+    @param fp:       Output file.
+    @return:         List of budget overrun messages.
+
+    """
+    overruns = []
+    for phase in benchPhases:
+        vals = samples.get(phase)
+        if not vals:
+            continue
+        walls = [x[0] * 1000 for x in vals]
+        cpus = [x[1] * 1000 for x in vals]
+        wall_med = median(walls)
+        budget = budgets.getBudget(scenario, phase)
+        status = ''
+        if budget is not None:
+            if wall_med > budget:
+                status = 'FAIL'
+                overruns.append("%s %s: %.2f ms > %.2f ms"
+                                % (scenario, phase, wall_med, budget))
+            budget_str = "%10.2f" % budget
+        else:
+            budget_str = "%10s" % '-'
+        fp.write("%-16s %-10s %10.2f %10.2f %10.2f %10.2f %s %s\n"
+                 % (scenario, phase, min(walls), wall_med, max(walls),
+                    median(cpus), budget_str, status))
+    budget = budgets.getBudget(scenario, 'memory')
+    status = ''
+    if budget is not None:
+        if growth > budget:
+            status = 'FAIL'
+            overruns.append("%s memory: %d kB > %d kB"
+                            % (scenario, growth, budget))
+        budget_str = "%10d" % budget
+    else:
+        budget_str = "%10s" % '-'
+    fp.write("%-16s %-10s %10s %10d %10s %10s %s %s\n"
+             % (scenario, 'memory', 'peak', peak, 'growth', growth,
+                budget_str, status))
+    return overruns
+
+
+def parse_args(argv):
+    """Parse command line arguments.
+
+    @param argv: List of command line arguments.
+    @return:     Tuple of options and list of scenario names.
+
+    """
+    parser = optparse.OptionParser(usage="%prog [options] [scenario ...]")
+    parser.add_option('-n', '--iterations', type='int',
+                      default=defaultIterations,
+                      help="Number of runs per scenario. (Default: %default)")
+    parser.add_option('-b', '--budgets', default=defaultBudgetFile,
+                      help="Budget configuration file. (Default: %default)")
+    parser.add_option('--no-budgets', dest='budgets', action='store_const',
+                      const=None, help="Do not check budgets.")
+    parser.add_option('-s', '--budget-scale', type='float', default=1.0,
+                      help="Multiplier for all budgets. (Default: %default)")
+    parser.add_option('-l', '--list', action='store_true', default=False,
+                      help="List scenarios and exit.")
+    group = optparse.OptionGroup(parser, "Fixture Sizes")
+    for (opt, default, helpstr) in (
+        ('cpus', fixtures.defaultCPUs, "Number of CPUs."),
+        ('disks', fixtures.defaultDisks, "Number of disks."),
+        ('partitions', fixtures.defaultPartitions, "Partitions per disk."),
+        ('md-devs', fixtures.defaultMDdevs, "Number of MD devices."),
+        ('interfaces', fixtures.defaultInterfaces,
+         "Number of network interfaces."),
+        ('processes', fixtures.defaultProcesses, "Number of processes."),
+        ('sockets', fixtures.defaultSockets, "Number of TCP and UDP sockets."),
+        ('slabs', servers.defaultSlabs, "Number of Memcached slab classes."),
+        ('channels', servers.defaultChannels,
+         "Number of active Asterisk channels."),
+        ('peers', servers.defaultPeers, "Number of SIP and IAX2 peers."),
+        ('queues', servers.defaultQueues, "Number of Asterisk queues."),
+        ('members', servers.defaultQueueMembers, "Members per queue."),
+        ('workers', servers.defaultWorkers,
+         "Number of worker slots of web servers."),
+        ('connectors', servers.defaultConnectors,
+         "Number of Apache Tomcat connectors."),
+        ('counters', servers.defaultCounters, "Number of Squid counters.")):
+        group.add_option('--' + opt, dest=opt.replace('-', '_'), type='int',
+                         default=default, help=helpstr + " (Default: %default)")
+    parser.add_option_group(group)
+    return parser.parse_args(argv[1:])
+
+
+def main(argv=None):
+    """Main Block for benchmark.
+
+    @param argv: List of command line arguments.
+    @return:     Exit status.
+
+    """
+    if argv is None:
+        argv = sys.argv
+    (opts, args) = parse_args(argv)
+    names = [scenario[0] for scenario in scenarioTable]
+    if opts.list:
+        for name in names:
+            print name
+        return 0
+    for name in args:
+        if name not in names:
+            sys.stderr.write("Unknown scenario: %s\n" % name)
+            return 2
+    scenarios = [scenario for scenario in scenarioTable
+                 if not args or scenario[0] in args]
+    budgets = BudgetConf(opts.budgets, opts.budget_scale)
+    os.environ['no_proxy'] = ','.join(filter(None, (os.environ.get('no_proxy'),
+                                                    servers.defaultHost,
+                                                    'localhost')))
+
+    classes = {}
+    for (name, modname, server_name) in scenarios: #@UnusedVariable
+        if modname is not None:
+            classes[name] = get_plugin_class(modname)
+    tmpdir = tempfile.mkdtemp(prefix='pymunin-bench-')
+    fixture = fixtures.ProcFixture(os.path.join(tmpdir, 'root'),
+                                   cpus=opts.cpus, disks=opts.disks,
+                                   partitions=opts.partitions,
+                                   md_devs=opts.md_devs,
+                                   interfaces=opts.interfaces,
+                                   processes=opts.processes,
+                                   sockets=opts.sockets)
+    fake_servers = {}
+    failures = []
+    try:
+        fixture.build()
+        fixture.install()
+        server_names = [scenario[2] for scenario in scenarios
+                        if scenario[2] is not None]
+        fake_servers = servers.start_servers(
+            [flavor for flavor in servers.httpFlavors
+             if flavor in server_names],
+            slabs=opts.slabs, channels=opts.channels, peers=opts.peers,
+            queues=opts.queues, members=opts.members, workers=opts.workers,
+            connectors=opts.connectors, counters=opts.counters)
+        state_dir = os.path.join(tmpdir, 'state')
+        os.mkdir(state_dir)
+        out = sys.stdout
+        out.write("%-16s %-10s %10s %10s %10s %10s %10s\n"
+                  % ('scenario', 'phase', 'wall min', 'wall med', 'wall max',
+                     'cpu med', 'budget'))
+        for (name, modname, server_name) in scenarios:
+            env = {'MUNIN_PLUGSTATE': state_dir}
+            if server_name is not None:
+                env.update(fake_servers[server_name].getPluginEnv())
+            if modname is not None:
+                (res, err) = run_forked(measure_plugin, classes[name], env,
+                                        opts.iterations)
+            else:
+                (res, err) = run_forked(measure_squid, env, opts.iterations)
+            if err is not None:
+                out.write("%-16s ERROR\n" % name)
+                sys.stderr.write("Scenario %s failed:\n%s\n" % (name, err))
+                failures.append("%s: error" % name)
+                continue
+            (samples, peak, growth) = res
+            failures.extend(report_scenario(name, samples, peak, growth,
+                                            budgets, out))
+            out.flush()
+    finally:
+        servers.stop_servers(fake_servers)
+        fixture.uninstall()
+        shutil.rmtree(tmpdir, True)
+    if failures:
+        sys.stderr.write("\nBudget check failed:\n")
+        for msg in failures:
+            sys.stderr.write("  %s\n" % msg)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,509 @@
+"""Synthetic /proc and /sys trees for benchmarking the PyMunin collectors.
+
+    - The ProcFixture Class generates the files parsed by the SystemInfo,
+      DiskIOinfo, FilesystemInfo and NetIfaceInfo collectors with a
+      configurable number of CPUs, disks, partitions, MD devices, network
+      interfaces, processes and sockets.
+    - The paths used by the collector modules are redirected to the generated
+      tree while the fixture is installed.
+
+"""
+
+import os
+import sys
+import random
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+defaultCPUs = 4
+defaultDisks = 4
+defaultPartitions = 3
+defaultMDdevs = 1
+defaultInterfaces = 4
+defaultProcesses = 200
+defaultSockets = 2000
+defaultSeed = 1
+
+# Module attributes redirected to the fixture tree.
+# (module, attribute, path relative to fixture root)
+pathTable = (
+    ('pysysinfo.system', 'uptimeFile', 'proc/uptime'),
+    ('pysysinfo.system', 'loadavgFile', 'proc/loadavg'),
+    ('pysysinfo.system', 'cpustatFile', 'proc/stat'),
+    ('pysysinfo.system', 'meminfoFile', 'proc/meminfo'),
+    ('pysysinfo.system', 'swapsFile', 'proc/swaps'),
+    ('pysysinfo.system', 'vmstatFile', 'proc/vmstat'),
+    ('pysysinfo.system', 'interruptsFile', 'proc/interrupts'),
+    ('pysysinfo.system', 'softirqsFile', 'proc/softirqs'),
+    ('pysysinfo.diskio', 'diskStatsFile', 'proc/diskstats'),
+    ('pysysinfo.diskio', 'devicesFile', 'proc/devices'),
+    ('pysysinfo.diskio', 'devmapperDir', 'dev/mapper'),
+    ('pysysinfo.diskio', 'sysfsBlockdevDir', 'sys/block'),
+    ('pysysinfo.filesystem', 'mountsFile', 'proc/mounts'),
+    ('pysysinfo.netiface', 'ifaceStatsFile', 'proc/net/dev'),
+    ('pysysinfo.process', 'procDir', 'proc'),
+    ('pysysinfo.netstat', 'procNetDir', 'proc/net'),
+    ('pysysinfo.netproto', 'snmpFile', 'proc/net/snmp'),
+    ('pysysinfo.netproto', 'netstatFile', 'proc/net/netstat'),
+    ('pysysinfo.netproto', 'sockstatFile', 'proc/net/sockstat'),
+    ('pysysinfo.netproto', 'sockstat6File', 'proc/net/sockstat6'),
+)
+
+# Module attributes set while the fixture is installed.
+# (module, attribute, value)
+attrTable = (
+    # Socket stats are read from the fixture tree instead of sock_diag.
+    ('pysysinfo.sockdiag', 'sockDiagEnabled', False),
+)
+
+_meminfoKeys = ('MemTotal', 'MemFree', 'MemAvailable', 'Buffers', 'Cached',
+                'SwapCached', 'Active', 'Inactive', 'Active(anon)',
+                'Inactive(anon)', 'Active(file)', 'Inactive(file)',
+                'Unevictable', 'Mlocked', 'SwapTotal', 'SwapFree', 'Dirty',
+                'Writeback', 'AnonPages', 'Mapped', 'Shmem', 'Slab',
+                'SReclaimable', 'SUnreclaim', 'KernelStack', 'PageTables',
+                'NFS_Unstable', 'Bounce', 'WritebackTmp', 'CommitLimit',
+                'Committed_AS', 'VmallocTotal', 'VmallocUsed', 'VmallocChunk',
+                'HugePages_Total', 'HugePages_Free', 'HugePages_Rsvd',
+                'HugePages_Surp', 'Hugepagesize', 'DirectMap4k',
+                'DirectMap2M')
+_vmstatKeys = ('nr_free_pages', 'nr_inactive_anon', 'nr_active_anon',
+               'nr_inactive_file', 'nr_active_file', 'nr_dirty',
+               'nr_writeback', 'pgpgin', 'pgpgout', 'pswpin', 'pswpout',
+               'pgalloc_dma', 'pgalloc_normal', 'pgfree', 'pgactivate',
+               'pgdeactivate', 'pgfault', 'pgmajfault', 'pgsteal_normal',
+               'pgscan_kswapd_normal', 'pgscan_direct_normal', 'pginodesteal',
+               'slabs_scanned', 'kswapd_steal', 'pageoutrun', 'allocstall',
+               'pgrotated')
+_procStates = 'SSSSSSSSRDZTI'
+# TCP states weighted towards established connections.
+_tcpStates = ['01'] * 12 + ['06'] * 4 + ['08', '04', '05', '09', '02', '03']
+_serverPorts = (80, 443, 3306, 5432, 8080)
+_softirqNames = ('HI', 'TIMER', 'NET_TX', 'NET_RX', 'BLOCK', 'IRQ_POLL',
+                 'TASKLET', 'SCHED', 'HRTIMER', 'RCU')
+_snmpCounters = (
+    ('Ip', ('Forwarding', 'DefaultTTL', 'InReceives', 'InHdrErrors',
+            'InAddrErrors', 'ForwDatagrams', 'InDelivers', 'OutRequests')),
+    ('Tcp', ('RtoAlgorithm', 'RtoMin', 'RtoMax', 'MaxConn', 'ActiveOpens',
+             'PassiveOpens', 'AttemptFails', 'EstabResets', 'CurrEstab',
+             'InSegs', 'OutSegs', 'RetransSegs', 'InErrs', 'OutRsts',
+             'InCsumErrors')),
+    ('Udp', ('InDatagrams', 'NoPorts', 'InErrors', 'OutDatagrams',
+             'RcvbufErrors', 'SndbufErrors', 'InCsumErrors', 'IgnoredMulti')),
+)
+_netstatCounters = (
+    ('TcpExt', ('SyncookiesSent', 'SyncookiesRecv', 'SyncookiesFailed',
+                'PruneCalled', 'RcvPruned', 'OfoPruned', 'ListenOverflows',
+                'ListenDrops', 'TCPMemoryPressures', 'TCPAbortOnMemory')),
+    ('IpExt', ('InNoRoutes', 'InTruncatedPkts', 'InMcastPkts', 'OutMcastPkts',
+               'InOctets', 'OutOctets')),
+)
+_sdMajors = [8] + range(65, 72) + range(128, 136)
+
+
+class ProcFixture:
+    """Class for generating a synthetic /proc and /sys tree and redirecting
+    the PyMunin collectors to it.
+
+    """
+
+    def __init__(self, root, cpus=defaultCPUs, disks=defaultDisks,
+                 partitions=defaultPartitions, md_devs=defaultMDdevs,
+                 interfaces=defaultInterfaces, processes=defaultProcesses,
+                 sockets=defaultSockets, seed=defaultSeed):
+        """Initialize fixture.
+
+        @param root:       Root directory of the fixture tree.
+        @param cpus:       Number of CPUs.
+        @param disks:      Number of disk devices.
+        @param partitions: Number of partitions per disk.
+        @param md_devs:    Number of MD devices.
+        @param interfaces: Number of network interfaces besides loopback.
+        @param processes:  Number of processes.
+        @param sockets:    Number of TCP and UDP sockets.
+        @param seed:       Seed for generated counter values.
+
+        """
+        self._root = root
+        self._cpus = cpus
+        self._disks = disks
+        self._partitions = partitions
+        self._mdDevs = md_devs
+        self._interfaces = interfaces
+        self._processes = processes
+        self._sockets = sockets
+        self._rand = random.Random(seed)
+        self._saved = None
+
+    def getPath(self, relpath):
+        """Returns absolute path for path relative to fixture root.
+
+        @param relpath: Path relative to fixture root.
+        @return:        Absolute path.
+
+        """
+        return os.path.join(self._root, relpath)
+
+    def _counter(self, scale=1000000):
+        """Returns random counter value.
+
+        @param scale: Upper bound for value.
+        @return:      Integer.
+
+        """
+        return self._rand.randint(0, scale)
+
+    def _write(self, relpath, lines):
+        """Writes lines to file in fixture tree creating parent directories.
+
+        @param relpath: Path relative to fixture root.
+        @param lines:   List of lines.
+
+        """
+        path = self.getPath(relpath)
+        dirpath = os.path.dirname(path)
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath)
+        fp = open(path, 'w')
+        try:
+            fp.write('\n'.join(lines) + '\n')
+        finally:
+            fp.close()
+
+    def _mkdir(self, relpath):
+        """Creates directory in fixture tree.
+
+        @param relpath: Path relative to fixture root.
+
+        """
+        path = self.getPath(relpath)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _diskNames(self):
+        """Returns names of disk devices.
+
+        @return: List of device names (sda, sdb, ..., sdaa, ...).
+
+        """
+        names = []
+        for idx in range(self._disks):
+            suffix = ''
+            num = idx
+            while True:
+                suffix = chr(ord('a') + num % 26) + suffix
+                num = num / 26 - 1
+                if num < 0:
+                    break
+            names.append('sd' + suffix)
+        return names
+
+    def build(self):
+        """Generates all files of the fixture tree."""
+        self._buildSystem()
+        self._buildProcesses()
+        self._buildBlockDevices()
+        self._buildNetIfaces()
+        self._buildSockets()
+        self._buildNetProto()
+
+    def _buildSystem(self):
+        """Generates /proc/uptime, loadavg, stat, meminfo, vmstat, 
+        interrupts and softirqs.
+        
+        """
+        rand = self._rand
+        self._write('proc/uptime', ['%.2f %.2f' % (rand.uniform(1e5, 1e7),
+                                                  rand.uniform(1e5, 1e7))])
+        running = min(self._processes, max(1, self._cpus))
+        self._write('proc/loadavg', ['%.2f %.2f %.2f %d/%d %d'
+                                     % (rand.uniform(0, self._cpus),
+                                        rand.uniform(0, self._cpus),
+                                        rand.uniform(0, self._cpus),
+                                        running, self._processes,
+                                        self._processes + 1000)])
+        cols = 10
+        total = [0] * cols
+        cpulines = []
+        for cpu in range(self._cpus):
+            vals = [self._counter() for i in range(cols)] #@UnusedVariable
+            total = [x + y for (x, y) in zip(total, vals)]
+            cpulines.append('cpu%d %s' % (cpu, ' '.join([str(x)
+                                                         for x in vals])))
+        intr = [self._counter() for i in range(64)] #@UnusedVariable
+        softirq = [self._counter() for i in range(10)] #@UnusedVariable
+        lines = ['cpu  %s' % ' '.join([str(x) for x in total])]
+        lines.extend(cpulines)
+        lines.extend(['intr %d %s' % (sum(intr), ' '.join([str(x)
+                                                           for x in intr])),
+                      'ctxt %d' % self._counter(10 ** 9),
+                      'btime 1300000000',
+                      'processes %d' % self._counter(10 ** 7),
+                      'procs_running %d' % running,
+                      'procs_blocked %d' % rand.randint(0, 4),
+                      'softirq %d %s' % (sum(softirq),
+                                         ' '.join([str(x)
+                                                   for x in softirq]))])
+        self._write('proc/stat', lines)
+        self._write('proc/meminfo', ['%s: %8d kB' % (key, self._counter(10 ** 7))
+                                     for key in _meminfoKeys])
+        self._write('proc/vmstat', ['%s %d' % (key, self._counter(10 ** 8))
+                                    for key in _vmstatKeys])
+        header = ' ' * 4 + ''.join(['%11s' % ('CPU%d' % cpu)
+                                    for cpu in range(self._cpus)])
+        lines = [header]
+        for irq in range(len(intr)):
+            lines.append('%4d: %s  PCI-MSI %d-edge      eth0-TxRx-%d'
+                         % (irq, ' '.join(['%10d' % self._counter()
+                                           for cpu in range(self._cpus)]), #@UnusedVariable
+                            irq, irq))
+        for name in ('NMI', 'LOC', 'RES', 'CAL', 'TLB'):
+            lines.append('%4s: %s  %s interrupts'
+                         % (name, ' '.join(['%10d' % self._counter()
+                                            for cpu in range(self._cpus)]), #@UnusedVariable
+                            name))
+        lines.append(' ERR: %10d' % self._counter(100))
+        self._write('proc/interrupts', lines)
+        lines = [header]
+        for name in _softirqNames:
+            lines.append('%12s: %s' % (name, ' '.join(['%10d' % self._counter()
+                                                       for cpu in range(self._cpus)]))) #@UnusedVariable
+        self._write('proc/softirqs', lines)
+
+    def _buildProcesses(self):
+        """Generates /proc/<pid> directories with the task directories for
+        the threads and the I/O counters of the processes.
+
+        """
+        rand = self._rand
+        next_tid = self._processes + 1
+        for pid in range(1, self._processes + 1):
+            name = 'proc%d' % (pid % 50)
+            nlwp = rand.randint(1, 8)
+            tids = [pid] + range(next_tid, next_tid + nlwp - 1)
+            next_tid += nlwp - 1
+            for tid in tids:
+                line = ('%d (%s) %s %d %d %d 0 -1 4194560 %d 0 %d 0 %d %d '
+                        '0 0 20 %d %d 0 %d %d %d'
+                        % (tid, name, rand.choice(_procStates),
+                           max(pid - 1, 1), pid, pid, self._counter(),
+                           self._counter(), self._counter(), self._counter(),
+                           rand.choice((0, 0, 0, 0, -5, 5)), nlwp,
+                           self._counter(), self._counter(10 ** 9),
+                           self._counter(10 ** 5)))
+                if tid == pid:
+                    self._write('proc/%d/stat' % pid, [line])
+                self._write('proc/%d/task/%d/stat' % (pid, tid), [line])
+            self._write('proc/%d/cmdline' % pid, ['/usr/bin/%s' % name])
+            self._write('proc/%d/status' % pid,
+                        ['Name:\t%s' % name, 'State:\tS (sleeping)',
+                         'Pid:\t%d' % pid, 'VmLck:\t%8d kB'
+                         % rand.choice((0, 0, 0, 64)),
+                         'Threads:\t%d' % nlwp])
+            self._write('proc/%d/io' % pid,
+                        ['rchar: %d' % self._counter(),
+                         'wchar: %d' % self._counter(),
+                         'syscr: %d' % self._counter(),
+                         'syscw: %d' % self._counter(),
+                         'read_bytes: %d' % self._counter(),
+                         'write_bytes: %d' % self._counter(),
+                         'cancelled_write_bytes: 0'])
+
+    def _buildBlockDevices(self):
+        """Generates /proc/devices, diskstats, mounts and swaps and the
+        /sys/block and /dev/mapper directories.
+
+        """
+        self._write('proc/devices', ['Character devices:', '  1 mem',
+                                     '  4 tty', '', 'Block devices:',
+                                     '  7 loop', '  9 md']
+                    + ['%3d sd' % major for major in _sdMajors]
+                    + ['253 device-mapper', '254 mdp', '259 blkext'])
+        self._mkdir('dev/mapper')
+        diskstats = []
+        mounts = ['rootfs / rootfs rw 0 0',
+                  'proc /proc proc rw,nosuid,nodev,noexec,relatime 0 0',
+                  'sysfs /sys sysfs rw,nosuid,nodev,noexec,relatime 0 0',
+                  'tmpfs /run tmpfs rw,nosuid,nodev,mode=755 0 0']
+        swaps = ['Filename\t\t\t\tType\t\tSize\tUsed\tPriority']
+        for (idx, disk) in enumerate(self._diskNames()):
+            major = _sdMajors[(idx / 16) % len(_sdMajors)]
+            minor = (idx % 16) * 16
+            self._mkdir('sys/block/%s' % disk)
+            diskstats.append(self._diskstatLine(major, minor, disk))
+            for part in range(1, self._partitions + 1):
+                partdev = '%s%d' % (disk, part)
+                diskstats.append(self._diskstatLine(major, minor + part,
+                                                    partdev))
+                if part == 1:
+                    if idx == 0:
+                        mountpoint = '/'
+                    else:
+                        mountpoint = '/srv/%s' % disk
+                    mounts.append('/dev/%s %s ext4 rw,relatime 0 0'
+                                  % (partdev, mountpoint))
+                elif part == 2:
+                    swaps.append('/dev/%s\t\t\t\tpartition\t2097148\t%d\t-%d'
+                                 % (partdev, self._counter(2097148), idx + 1))
+                else:
+                    mounts.append('/dev/%s /srv/%s ext4 rw,relatime 0 0'
+                                  % (partdev, partdev))
+        for idx in range(self._mdDevs):
+            mddev = 'md%d' % idx
+            self._mkdir('sys/block/%s' % mddev)
+            diskstats.append(self._diskstatLine(9, idx, mddev))
+            mounts.append('/dev/%s /srv/%s xfs rw,relatime 0 0'
+                          % (mddev, mddev))
+        self._write('proc/diskstats', diskstats)
+        self._write('proc/mounts', mounts)
+        self._write('proc/swaps', swaps)
+
+    def _diskstatLine(self, major, minor, dev):
+        """Returns line of /proc/diskstats.
+
+        @param major: Major device number.
+        @param minor: Minor device number.
+        @param dev:   Device name.
+        @return:      Line string.
+
+        """
+        return '%4d %7d %s %s' % (major, minor, dev,
+                                  ' '.join([str(self._counter())
+                                            for i in range(11)])) #@UnusedVariable
+
+    def _buildNetIfaces(self):
+        """Generates /proc/net/dev."""
+        lines = ['Inter-|   Receive                                                '
+                 '|  Transmit',
+                 ' face |bytes    packets errs drop fifo frame compressed '
+                 'multicast|bytes    packets errs drop fifo colls carrier '
+                 'compressed']
+        ifaces = ['lo'] + ['eth%d' % idx for idx in range(self._interfaces)]
+        for iface in ifaces:
+            lines.append('%6s: %s' % (iface, ' '.join([str(self._counter(10 ** 12))
+                                                       for i in range(16)]))) #@UnusedVariable
+        self._write('proc/net/dev', lines)
+
+    def _buildSockets(self):
+        """Generates /proc/net/tcp, tcp6, udp and udp6 with listening 
+        sockets on the server ports and connections to them.
+
+        """
+        rand = self._rand
+        tables = {}
+        for name in ('tcp', 'tcp6', 'udp', 'udp6'):
+            if name.endswith('6'):
+                addr_len = 32
+            else:
+                addr_len = 8
+            tables[name] = (addr_len, [])
+            for port in _serverPorts:
+                if name.startswith('tcp'):
+                    state = '0A'
+                else:
+                    state = '07'
+                tables[name][1].append((state, '0' * addr_len, port,
+                                        '0' * addr_len, 0))
+        for idx in range(self._sockets):
+            name = rand.choice(('tcp', 'tcp', 'tcp', 'tcp6', 'tcp6', 'udp',
+                                'udp6'))
+            (addr_len, entries) = tables[name]
+            if name.startswith('tcp'):
+                state = rand.choice(_tcpStates)
+            else:
+                state = '01'
+            entries.append((state,
+                            '%0*X' % (addr_len, rand.getrandbits(addr_len * 4)),
+                            rand.choice(_serverPorts),
+                            '%0*X' % (addr_len, rand.getrandbits(addr_len * 4)),
+                            rand.randint(1024, 65535)))
+        for (name, (addr_len, entries)) in tables.items():
+            lines = ['  sl  local_address rem_address   st tx_queue rx_queue '
+                     'tr tm->when retrnsmt   uid  timeout inode']
+            for (idx, entry) in enumerate(entries):
+                (state, laddr, lport, raddr, rport) = entry
+                lines.append('%4d: %s:%04X %s:%04X %s %08X:%08X 00:00000000 '
+                             '00000000 %5d        0 %d 1 0000000000000000 '
+                             '100 0 0 10 0'
+                             % (idx, laddr, lport, raddr, rport, state,
+                                self._counter(4096), self._counter(4096),
+                                rand.choice((0, 33, 999)), 10000 + idx))
+            self._write('proc/net/%s' % name, lines)
+
+    def _buildNetProto(self):
+        """Generates /proc/net/snmp, netstat, sockstat and sockstat6."""
+        for (name, protos) in (('snmp', _snmpCounters),
+                               ('netstat', _netstatCounters)):
+            lines = []
+            for (proto, names) in protos:
+                lines.append('%s: %s' % (proto, ' '.join(names)))
+                lines.append('%s: %s' % (proto, ' '.join([str(self._counter(10 ** 9))
+                                                           for n in names]))) #@UnusedVariable
+            self._write('proc/net/%s' % name, lines)
+        self._write('proc/net/sockstat',
+                    ['sockets: used %d' % self._sockets,
+                     'TCP: inuse %d orphan %d tw %d alloc %d mem %d'
+                     % tuple([self._counter(self._sockets) for i in range(5)]), #@UnusedVariable
+                     'UDP: inuse %d mem %d' % (self._counter(self._sockets),
+                                               self._counter(4096)),
+                     'UDPLITE: inuse 0',
+                     'RAW: inuse 0',
+                     'FRAG: inuse 0 memory 0'])
+        self._write('proc/net/sockstat6',
+                    ['TCP6: inuse %d' % self._counter(self._sockets),
+                     'UDP6: inuse %d' % self._counter(self._sockets),
+                     'UDPLITE6: inuse 0',
+                     'RAW6: inuse 0',
+                     'FRAG6: inuse 0 memory 0'])
+
+    def install(self):
+        """Redirects the paths used by the collector modules and by already
+        imported plugin modules to the fixture tree and sets the attributes in
+        attrTable.
+
+        """
+        if self._saved is not None:
+            return
+        self._saved = []
+        for (modname, attr, relpath) in pathTable:
+            __import__(modname)
+            module = sys.modules[modname]
+            orig = getattr(module, attr)
+            path = self.getPath(relpath)
+            self._setAttr(module, attr, path)
+            for (name, plugin_module) in sys.modules.items():
+                if (plugin_module is not None
+                    and name.startswith('pymunin.plugins.')
+                    and getattr(plugin_module, attr, None) == orig):
+                    self._setAttr(plugin_module, attr, path)
+        for (modname, attr, val) in attrTable:
+            __import__(modname)
+            self._setAttr(sys.modules[modname], attr, val)
+
+    def _setAttr(self, module, attr, val):
+        """Sets module attribute saving the original value.
+
+        @param module: Module object.
+        @param attr:   Attribute name.
+        @param val:    New value.
+
+        """
+        self._saved.append((module, attr, getattr(module, attr)))
+        setattr(module, attr, val)
+
+    def uninstall(self):
+        """Restores the paths and attributes of the collector modules."""
+        if self._saved is None:
+            return
+        for (module, attr, val) in reversed(self._saved):
+            setattr(module, attr, val)
+        self._saved = None
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""parsebench - Benchmark for the parsers of key-value stats responses.
+
+    - A Memcached stats slabs response with the given number of slab classes
+      is generated by the fake Memcached Server. (125 slab classes yield a
+      response of about 2000 lines.)
+    - The response is parsed with the line by line parser used by the
+      Memcached collector before util.parse_stats() was introduced and with
+      MemcachedInfo._parseStats() and the best time over a number of rounds
+      is reported for each parser.
+
+    Example:
+        python benchmark/parsebench.py --slabs 125
+
+"""
+
+import os
+import sys
+import re
+import time
+import optparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pysysinfo import memcached
+import servers
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+defaultSlabs = 125
+defaultRounds = 50
+
+
+def legacy_parse_value(val, parsebool=False):
+    """Parse input string using the uncompiled patterns of the original
+    util.parse_value().
+
+    @param val:       Input string.
+    @param parsebool: If True parse yes / no, on / off as boolean.
+    @return:          Value of type int, float or str.
+
+    """
+    if re.match('-{0,1}\d+$',  str(val)):
+            return int(val)
+    elif re.match('-{0,1}\d*\.\d+$',  str(val)):
+        return float(val)
+    elif parsebool and re.match('yes|on', str(val), re.IGNORECASE):
+        return True
+    elif parsebool and re.match('no|off', str(val), re.IGNORECASE):
+        return False
+    else:
+        return val
+
+
+def legacy_parse_stats(data, parse_slabs=False):
+    """Parse Memcached stats response line by line.
+
+    @param data:        Response text.
+    @param parse_slabs: Parse slab stats if True.
+    @return:            Stats dictionary.
+
+    """
+    info_dict = {}
+    info_dict['slabs'] = {}
+    for line in data.splitlines():
+        mobj = re.match('^STAT\s(\w+)\s(\S+)$',  line)
+        if mobj:
+            info_dict[mobj.group(1)] = legacy_parse_value(mobj.group(2), True)
+            continue
+        elif parse_slabs:
+            mobj = re.match('STAT\s(\w+:)?(\d+):(\w+)\s(\S+)$',  line)
+            if mobj:
+                (slab, key, val) = mobj.groups()[-3:]
+                if not info_dict['slabs'].has_key(slab):
+                    info_dict['slabs'][slab] = {}
+                info_dict['slabs'][slab][key] = legacy_parse_value(val, True)
+    return info_dict
+
+
+def best_time(func, rounds, *args):
+    """Returns the best wall time of a number of calls of function.
+
+    @param func:   Function.
+    @param rounds: Number of calls.
+    @param args:   Arguments for function.
+    @return:       Tuple of the best time in seconds and the result of the
+                   last call.
+
+    """
+    best = None
+    for i in range(rounds): #@UnusedVariable
+        start = time.time()
+        result = func(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return (best, result)
+
+
+def main(argv=None):
+    """Main Block for parser benchmark.
+
+    @param argv: List of command line arguments.
+    @return:     Exit status.
+
+    """
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('--slabs', type='int', default=defaultSlabs,
+                      help="Number of slab classes. (Default: %default)")
+    parser.add_option('-r', '--rounds', type='int', default=defaultRounds,
+                      help="Number of rounds per parser. (Default: %default)")
+    (opts, args) = parser.parse_args(argv) #@UnusedVariable
+    server = servers.MemcachedServer(slabs=opts.slabs)
+    try:
+        data = server.getResponse('stats slabs')
+    finally:
+        server.stop()
+    data = data[:data.rindex('END\r\n')]
+    mc = memcached.MemcachedInfo(autoInit=False)
+    (legacy_time, legacy) = best_time(legacy_parse_stats, opts.rounds,
+                                      data, True)
+    (new_time, new) = best_time(mc._parseStats, opts.rounds, data, True)
+    if new != legacy:
+        print >> sys.stderr, "Parsers returned different results."
+        return 1
+    print "Lines: %d" % data.count('\n')
+    print "%-24s %10.3f ms" % ('line by line', legacy_time * 1000)
+    print "%-24s %10.3f ms" % ('parse_stats', new_time * 1000)
+    print "%-24s %10.1f x" % ('speedup', legacy_time / new_time)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
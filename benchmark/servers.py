@@ -0,0 +1,778 @@
+"""Local stand-ins for the servers queried by the PyMunin service collectors.
+
+    - MemcachedServer implements the stats commands of the Memcached text
+      protocol.
+    - AMIServer implements login and the CLI Command action of the Asterisk
+      Manager Interface with canned output for the commands used by
+      AsteriskInfo.
+    - HTTPStatusServer serves the status pages of Apache, Lighttpd, Nginx,
+      PHP FPM and Apache Tomcat.
+    - SquidServer serves cache_object requests of the Squid Cache Manager.
+
+    The responses are generated once on startup with a configurable number of
+    entries, so serving a request costs little more than a socket write. All
+    servers listen on an ephemeral port of the loopback interface and are run
+    by daemon threads.
+
+"""
+
+import sys
+import random
+import threading
+import SocketServer
+import BaseHTTPServer
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+defaultHost = '127.0.0.1'
+defaultSeed = 1
+defaultSlabs = 40
+defaultChannels = 100
+defaultPeers = 200
+defaultQueues = 8
+defaultQueueMembers = 10
+defaultWorkers = 256
+defaultConnectors = 2
+defaultCounters = 100
+
+httpFlavors = ('apache', 'lighttpd', 'nginx', 'phpfpm', 'tomcat')
+
+_amiVersion = '1.1'
+_asteriskVersion = '1.8.32.3'
+_amiModules = ('app_queue.so', 'app_meetme.so', 'app_voicemail.so',
+               'res_fax.so', 'chan_sip.so', 'chan_iax2.so', 'chan_dahdi.so',
+               'chan_local.so', 'app_dial.so', 'pbx_config.so')
+_amiApplications = ('Answer', 'Dial', 'Hangup', 'MeetMe', 'Playback',
+                    'Queue', 'ReceiveFAX', 'SendFAX', 'VoiceMail', 'Wait')
+_amiChannelTypes = (('SIP', 'Session Initiation Protocol (SIP)'),
+                    ('IAX2', 'Inter Asterisk eXchange Driver (Ver 2)'),
+                    ('DAHDI', 'DAHDI Telephony Driver'),
+                    ('Local', 'Local Proxy Channel Driver'))
+_amiCodecs = (('0x4', 'ulaw'), ('0x8', 'alaw'), ('0x2', 'gsm'),
+              ('0x100', 'g729'), ('0x40', 'slin'), ('0x0', 'nothing'))
+_amiMemberStates = ('Not in use', 'In use', 'Busy', 'Unavailable', 'Ringing',
+                    'On Hold', 'Unknown', 'Invalid')
+_amiPeerStates = ('OK (12 ms)', 'OK (3 ms)', 'OK (25 ms)', 'UNREACHABLE',
+                  'UNKNOWN', 'Unmonitored', 'LAGGED')
+
+
+class FakeServer(SocketServer.ThreadingTCPServer):
+    """Base class for fake servers listening on an ephemeral port."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, handler, host=defaultHost, seed=defaultSeed):
+        """Initialize server and bind it to an ephemeral port.
+
+        @param handler: Request handler class.
+        @param host:    Listen address.
+        @param seed:    Seed for generated values.
+
+        """
+        SocketServer.ThreadingTCPServer.__init__(self, (host, 0), handler)
+        self._rand = random.Random(seed)
+        self._thread = None
+
+    def getHost(self):
+        """Returns listen address.
+
+        @return: Address string.
+
+        """
+        return self.server_address[0]
+
+    def getPort(self):
+        """Returns listen port.
+
+        @return: Port number.
+
+        """
+        return self.server_address[1]
+
+    def getPluginEnv(self):
+        """Returns environment variables that point the plugin to the server.
+
+        @return: Dictionary of environment variables.
+
+        """
+        return {'host': self.getHost(), 'port': str(self.getPort())}
+
+    def start(self):
+        """Start serving requests in a daemon thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests and close the listening socket."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def _counter(self, scale=1000000):
+        """Returns random counter value.
+
+        @param scale: Upper bound for value.
+        @return:      Integer.
+
+        """
+        return self._rand.randint(0, scale)
+
+
+class MemcachedHandler(SocketServer.StreamRequestHandler):
+    """Request handler for the Memcached text protocol."""
+
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = ' '.join(line.split())
+            if cmd == 'quit':
+                return
+            resp = self.server.getResponse(cmd)
+            if resp is None:
+                self.wfile.write("ERROR\r\n")
+            else:
+                self.wfile.write(resp)
+
+
+class MemcachedServer(FakeServer):
+    """Fake Memcached Server."""
+
+    def __init__(self, slabs=defaultSlabs, host=defaultHost,
+                 seed=defaultSeed):
+        """Initialize server.
+
+        @param slabs: Number of slab classes in slab and item stats.
+        @param host:  Listen address.
+        @param seed:  Seed for generated values.
+
+        """
+        FakeServer.__init__(self, MemcachedHandler, host, seed)
+        self._responses = {}
+        self._responses['stats'] = self._format(self._genStats())
+        self._responses['stats settings'] = self._format(self._genSettings())
+        self._responses['stats slabs'] = self._format(self._genSlabs(slabs))
+        self._responses['stats items'] = self._format(self._genItems(slabs))
+
+    def _format(self, items):
+        """Formats response of stats command.
+
+        @param items: List of name-value pairs.
+        @return:      Response string.
+
+        """
+        buf = ["STAT %s %s\r\n" % item for item in items]
+        buf.append("END\r\n")
+        return ''.join(buf)
+
+    def _genStats(self):
+        """Generates general stats.
+
+        @return: List of name-value pairs.
+
+        """
+        ctr = self._counter
+        get_hits = ctr(10 ** 8)
+        get_misses = ctr(10 ** 7)
+        total_items = ctr(10 ** 7)
+        return [('pid', 4321), ('uptime', ctr()), ('time', 1300000000),
+                ('version', '1.4.13'), ('libevent', '2.0.16-stable'),
+                ('pointer_size', 64), ('rusage_user', '%d.%06d' % (ctr(), ctr())),
+                ('rusage_system', '%d.%06d' % (ctr(), ctr())),
+                ('curr_connections', ctr(1000)),
+                ('total_connections', ctr(10 ** 6)),
+                ('connection_structures', ctr(1000)),
+                ('reserved_fds', 20),
+                ('cmd_get', get_hits + get_misses),
+                ('cmd_set', total_items + ctr(10 ** 5)),
+                ('cmd_flush', 0), ('cmd_touch', ctr()),
+                ('get_hits', get_hits), ('get_misses', get_misses),
+                ('delete_misses', ctr()), ('delete_hits', ctr()),
+                ('incr_misses', ctr()), ('incr_hits', ctr()),
+                ('decr_misses', ctr()), ('decr_hits', ctr()),
+                ('cas_misses', ctr()), ('cas_hits', ctr()),
+                ('cas_badval', ctr()), ('touch_hits', ctr()),
+                ('touch_misses', ctr()), ('auth_cmds', 0),
+                ('auth_errors', 0), ('bytes_read', ctr(10 ** 12)),
+                ('bytes_written', ctr(10 ** 12)),
+                ('limit_maxbytes', 1073741824), ('accepting_conns', 1),
+                ('listen_disabled_num', 0), ('threads', 4),
+                ('conn_yields', 0), ('hash_power_level', 16),
+                ('hash_bytes', 524288), ('hash_is_expanding', 0),
+                ('expired_unfetched', ctr()), ('evicted_unfetched', ctr()),
+                ('bytes', ctr(10 ** 9)), ('curr_items', ctr(10 ** 6)),
+                ('total_items', total_items), ('evictions', ctr()),
+                ('reclaimed', ctr())]
+
+    def _genSettings(self):
+        """Generates settings.
+
+        @return: List of name-value pairs.
+
+        """
+        return [('maxbytes', 1073741824), ('maxconns', 1024),
+                ('tcpport', 11211), ('udpport', 11211), ('inter', 'NULL'),
+                ('verbosity', 0), ('oldest', 0), ('evictions', 'on'),
+                ('domain_socket', 'NULL'), ('umask', 700),
+                ('growth_factor', '1.25'), ('chunk_size', 48),
+                ('num_threads', 4), ('num_threads_per_udp', 4),
+                ('stat_key_prefix', ':'), ('detail_enabled', 'no'),
+                ('reqs_per_event', 20), ('cas_enabled', 'yes'),
+                ('tcp_backlog', 1024), ('binding_protocol', 'auto-negotiate'),
+                ('auth_enabled_sasl', 'no'), ('item_size_max', 1048576),
+                ('maxconns_fast', 'no'), ('hashpower_init', 0)]
+
+    def _genSlabs(self, slabs):
+        """Generates slab stats.
+
+        @param slabs: Number of slab classes.
+        @return:      List of name-value pairs.
+
+        """
+        ctr = self._counter
+        items = []
+        size = 96
+        for slab in range(1, slabs + 1):
+            for key in ('chunk_size', 'chunks_per_page', 'total_pages',
+                        'total_chunks', 'used_chunks', 'free_chunks',
+                        'free_chunks_end', 'mem_requested', 'get_hits',
+                        'cmd_set', 'delete_hits', 'incr_hits', 'decr_hits',
+                        'cas_hits', 'cas_badval', 'touch_hits'):
+                if key == 'chunk_size':
+                    val = size
+                else:
+                    val = ctr()
+                items.append(('%d:%s' % (slab, key), val))
+            size = int(size * 1.25)
+        items.extend([('active_slabs', slabs),
+                      ('total_malloced', ctr(10 ** 9))])
+        return items
+
+    def _genItems(self, slabs):
+        """Generates item stats.
+
+        @param slabs: Number of slab classes.
+        @return:      List of name-value pairs.
+
+        """
+        ctr = self._counter
+        items = []
+        for slab in range(1, slabs + 1):
+            for key in ('number', 'age', 'evicted', 'evicted_nonzero',
+                        'evicted_time', 'outofmemory', 'tailrepairs',
+                        'reclaimed', 'expired_unfetched',
+                        'evicted_unfetched'):
+                items.append(('items:%d:%s' % (slab, key), ctr()))
+        return items
+
+    def getResponse(self, cmd):
+        """Returns response for command.
+
+        @param cmd: Command string.
+        @return:    Response string or None for unknown commands.
+
+        """
+        return self._responses.get(cmd)
+
+
+class AMIHandler(SocketServer.StreamRequestHandler):
+    """Request handler for the Asterisk Manager Interface."""
+
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.wfile.write("Asterisk Call Manager/%s\r\n" % _amiVersion)
+        while True:
+            attrs = {}
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                line = line.rstrip('\r\n')
+                if len(line) == 0:
+                    break
+                (key, sep, val) = line.partition(':') #@UnusedVariable
+                attrs[key.strip().lower()] = val.strip()
+            if not attrs:
+                continue
+            action = attrs.get('action', '').lower()
+            if action == 'login':
+                self.wfile.write("Response: Success\r\n"
+                                 "Message: Authentication accepted\r\n\r\n")
+            elif action == 'command':
+                self.wfile.write("Response: Follows\r\n"
+                                 "Privilege: Command\r\n"
+                                 "%s--END COMMAND--\r\n\r\n"
+                                 % self.server.getCommandOutput(
+                                     attrs.get('command', '')))
+            elif action == 'logoff':
+                self.wfile.write("Response: Goodbye\r\n"
+                                 "Message: Thanks for all the fish.\r\n\r\n")
+                return
+            else:
+                self.wfile.write("Response: Error\r\n"
+                                 "Message: Invalid/unknown command\r\n\r\n")
+
+
+class AMIServer(FakeServer):
+    """Fake Asterisk Manager Interface."""
+
+    def __init__(self, channels=defaultChannels, peers=defaultPeers,
+                 queues=defaultQueues, members=defaultQueueMembers,
+                 host=defaultHost, seed=defaultSeed):
+        """Initialize server.
+
+        @param channels: Number of active channels.
+        @param peers:    Number of SIP and IAX2 peers each.
+        @param queues:   Number of call queues.
+        @param members:  Number of members per queue.
+        @param host:     Listen address.
+        @param seed:     Seed for generated values.
+
+        """
+        FakeServer.__init__(self, AMIHandler, host, seed)
+        self._outputs = {
+            'core show version': self._genVersion(),
+            'module show': self._genModules(),
+            'core show applications': self._genApplications(),
+            'core show channeltypes': self._genChannelTypes(),
+            'core show channels': self._genChannels(channels),
+            'sip show peers': self._genPeers('sip', peers),
+            'iax2 show peers': self._genPeers('iax2', peers),
+            'sip show channels': self._genSIPchannels(channels / 2),
+            'iax2 show channels': self._genIAX2channels(channels / 4),
+            'meetme list': self._genMeetme(),
+            'voicemail show users': self._genVoicemail(peers),
+            'queue show': self._genQueues(queues, members),
+            'fax show stats': self._genFaxStats(),
+        }
+
+    def getPluginEnv(self):
+        """Returns environment variables that point the plugin to the server.
+
+        @return: Dictionary of environment variables.
+
+        """
+        return {'amihost': self.getHost(), 'amiport': str(self.getPort()),
+                'amiuser': 'bench', 'amipass': 'bench'}
+
+    def getCommandOutput(self, command):
+        """Returns output of CLI command.
+
+        @param command: CLI command.
+        @return:        Newline terminated output string.
+
+        """
+        output = self._outputs.get(' '.join(command.split()))
+        if output is None:
+            output = ("No such command '%s' (type 'core show help %s' for "
+                      "other possible commands)\n" % (command, command))
+        return output
+
+    def _genVersion(self):
+        return ("Asterisk %s built by root @ pbx on a x86_64 running Linux on "
+                "2011-01-01 00:00:00 UTC\n" % _asteriskVersion)
+
+    def _genModules(self):
+        lines = ["%-30s %-40s %-10s" % ('Module', 'Description', 'Use Count')]
+        for module in _amiModules:
+            lines.append("%-30s %-40s %-10d" % (module, module.split('.')[0],
+                                                self._counter(10)))
+        lines.append("%d modules loaded" % len(_amiModules))
+        return '\n'.join(lines) + '\n'
+
+    def _genApplications(self):
+        lines = ["    -= Registered Asterisk Applications =-"]
+        for app in _amiApplications:
+            lines.append("%20s: %s application." % (app, app))
+        lines.append("    -= %d Applications Registered =-"
+                     % len(_amiApplications))
+        return '\n'.join(lines) + '\n'
+
+    def _genChannelTypes(self):
+        fmt = "%-10s  %-40s %-12s %-12s %-12s"
+        lines = [fmt % ('Type', 'Description', 'Devicestate', 'Indications',
+                        'Transfer'),
+                 fmt % ('----------', '-----------', '-----------',
+                        '-----------', '--------')]
+        for (chantype, desc) in _amiChannelTypes:
+            lines.append(fmt % (chantype, desc, 'yes', 'yes', 'no'))
+        lines.extend(['----------', "%d channel drivers registered."
+                      % len(_amiChannelTypes)])
+        return '\n'.join(lines) + '\n'
+
+    def _genChannels(self, channels):
+        fmt = "%-20.20s %-20.20s %-7.7s %-30.30s"
+        lines = [fmt % ('Channel', 'Location', 'State', 'Application(Data)')]
+        for idx in range(channels):
+            chantype = ('SIP', 'SIP', 'IAX2', 'DAHDI', 'Local')[idx % 5]
+            if chantype == 'DAHDI':
+                chan = 'DAHDI/%d-1' % (idx % 24 + 1)
+            elif chantype == 'Local':
+                chan = 'Local/%d@from-internal-%04x;1' % (1000 + idx, idx)
+            else:
+                chan = '%s/%d-%08x' % (chantype, 1000 + idx % 100, idx)
+            lines.append(fmt % (chan, 's@macro-dial:7', 'Up',
+                                'Dial(SIP/trunk/5551234)'))
+        lines.extend(["%d active channels" % channels,
+                      "%d active calls" % (channels / 2),
+                      "%d calls processed" % self._counter()])
+        return '\n'.join(lines) + '\n'
+
+    def _genPeers(self, chantype, peers):
+        rand = self._rand
+        fmt = "%-25.25s %-15.15s %-3.3s %-10.10s %-3.3s %-8s %s"
+        lines = [fmt % ('Name/username', 'Host', 'Dyn', 'Forcerport', 'ACL',
+                        'Port', 'Status')]
+        for idx in range(peers):
+            lines.append(fmt % ('%d/%d' % (1000 + idx, 1000 + idx),
+                                '10.0.%d.%d' % (idx / 250, idx % 250 + 1),
+                                'D', 'N', '', 5060,
+                                rand.choice(_amiPeerStates)))
+        lines.append("%d %s peers [Monitored: %d online, 0 offline "
+                     "Unmonitored: 0 online, 0 offline]"
+                     % (peers, chantype, peers))
+        return '\n'.join(lines) + '\n'
+
+    def _genSIPchannels(self, channels):
+        rand = self._rand
+        fmt = "%-15.15s  %-15.15s  %-15.15s  %-15.15s  %-7.7s  %-15.15s"
+        lines = [fmt % ('Peer', 'User/ANR', 'Call ID', 'Format', 'Hold',
+                        'Last Message')]
+        for idx in range(channels):
+            (code, codec) = rand.choice(_amiCodecs)
+            lines.append(fmt % ('10.0.0.%d' % (idx % 250 + 1), 1000 + idx,
+                                '%08x' % rand.getrandbits(32),
+                                '%s (%s)' % (code, codec), 'No', 'Rx: ACK'))
+        lines.append("%d active SIP dialogs" % channels)
+        return '\n'.join(lines) + '\n'
+
+    def _genIAX2channels(self, channels):
+        rand = self._rand
+        fmt = ("%-20.20s  %-15.15s  %-10.10s  %-11.11s  %-11.11s  %-7.7s  "
+               "%-7.7s  %-10.10s")
+        lines = [fmt % ('Channel', 'Peer', 'Username', 'ID (Lo/Rem)',
+                        'Seq (Tx/Rx)', 'Lag', 'Format', 'FirstMsg')]
+        for idx in range(channels):
+            (code, codec) = rand.choice(_amiCodecs) #@UnusedVariable
+            lines.append(fmt % ('IAX2/%d-%d' % (2000 + idx, idx),
+                                '10.0.1.%d' % (idx % 250 + 1), 2000 + idx,
+                                '%05d/%05d' % (idx, idx + 1),
+                                '%05d/%05d' % (idx, idx),
+                                '00000ms', codec, 'Rx:NEW'))
+        lines.append("%d active IAX channels" % channels)
+        return '\n'.join(lines) + '\n'
+
+    def _genMeetme(self):
+        lines = ["Conf Num       Parties        Marked     Activity  "
+                 "Creation  Locked"]
+        for idx in range(4):
+            lines.append("%-14d %04d           N/A        00:%02d:%02d  "
+                         "Static    No" % (8000 + idx, self._counter(10),
+                                           idx, idx * 7))
+        lines.append("* Total number of MeetMe users: 12")
+        return '\n'.join(lines) + '\n'
+
+    def _genVoicemail(self, users):
+        fmt = "%-10s %-5s %-25s %-10s %6s"
+        lines = [fmt % ('Context', 'Mbox', 'User', 'Zone', 'NewMsg')]
+        for idx in range(users):
+            lines.append(fmt % ('default', 1000 + idx, 'User %d' % idx, '',
+                                self._counter(20)))
+        lines.append("%d voicemail users configured." % users)
+        return '\n'.join(lines) + '\n'
+
+    def _genQueues(self, queues, members):
+        rand = self._rand
+        lines = []
+        for idx in range(queues):
+            lines.append("queue-%d has %d calls (max unlimited) in 'ringall' "
+                         "strategy (%ds holdtime, %ds talktime), W:0, C:%d, "
+                         "A:%d, SL:%.1f%% within 60s"
+                         % (idx, rand.randint(0, 5), rand.randint(0, 60),
+                            rand.randint(0, 600), self._counter(),
+                            self._counter(10000), rand.uniform(0, 100)))
+            lines.append("   Members: ")
+            for member in range(members):
+                lines.append("      SIP/%d (dynamic) (%s) has taken %d calls "
+                             "(last was %d secs ago)"
+                             % (1000 + member, rand.choice(_amiMemberStates),
+                                self._counter(1000), self._counter(1000)))
+            lines.append("   No Callers")
+            lines.append("")
+        return '\n'.join(lines) + '\n'
+
+    def _genFaxStats(self):
+        ctr = self._counter
+        lines = ["", "Fax Statistics:", "---------------", "",
+                 "Current Sessions     : %d" % ctr(10),
+                 "Reserved Sessions    : %d" % ctr(10),
+                 "Transmit Attempts    : %d" % ctr(),
+                 "Receive Attempts     : %d" % ctr(),
+                 "Completed FAXes      : %d" % ctr(),
+                 "Failed FAXes         : %d" % ctr(),
+                 "",
+                 "Spandsp",
+                 "Success              : %d" % ctr(),
+                 "Switched to T.38     : %d" % ctr(),
+                 "Call Dropped         : %d" % ctr(),
+                 "No FAX               : %d" % ctr(),
+                 "Partial              : %d" % ctr(),
+                 "Other                : %d" % ctr()]
+        return '\n'.join(lines) + '\n'
+
+
+class HTTPStatusHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Request handler for status pages."""
+
+    protocol_version = 'HTTP/1.1'
+    # Responses are written with a single send like real web servers do;
+    # separate small writes of headers and body would be delayed by the
+    # Nagle algorithm on persistent connections.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        page = self.server.getPage(self.path)
+        if page is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        (content_type, body) = page
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args): #@ReservedAssignment
+        pass
+
+
+class HTTPStatusServer(FakeServer):
+    """Fake Web Server serving status pages for one server flavor."""
+
+    def __init__(self, flavor, workers=defaultWorkers,
+                 connectors=defaultConnectors, host=defaultHost,
+                 seed=defaultSeed):
+        """Initialize server.
+
+        @param flavor:     Server flavor; one of apache, lighttpd, nginx,
+                           phpfpm or tomcat.
+        @param workers:    Number of worker slots in the scoreboard and the
+                           worker list of Apache Tomcat connectors.
+        @param connectors: Number of Apache Tomcat connectors.
+        @param host:       Listen address.
+        @param seed:       Seed for generated values.
+
+        """
+        FakeServer.__init__(self, HTTPStatusHandler, host, seed)
+        if flavor not in httpFlavors:
+            raise AttributeError("Invalid server flavor: %s" % flavor)
+        self._flavor = flavor
+        if flavor == 'apache':
+            self._pages = {'/server-status':
+                           self._genScoreboard('Workers', workers)}
+        elif flavor == 'lighttpd':
+            self._pages = {'/server-status':
+                           self._genScoreboard('Servers', workers)}
+        elif flavor == 'nginx':
+            self._pages = {'/nginx_status': self._genNginx()}
+        elif flavor == 'phpfpm':
+            self._pages = {'/fpm_status.php': self._genPHPfpm()}
+        elif flavor == 'tomcat':
+            self._pages = {'/manager/status': self._genTomcat(workers,
+                                                              connectors)}
+
+    def getPluginEnv(self):
+        """Returns environment variables that point the plugin to the server.
+
+        @return: Dictionary of environment variables.
+
+        """
+        env = FakeServer.getPluginEnv(self)
+        if self._flavor == 'tomcat':
+            env.update({'user': 'bench', 'password': 'bench'})
+        return env
+
+    def getPage(self, path):
+        """Returns status page for request path.
+
+        @param path: Request path including query string.
+        @return:     Tuple of content type and body or None.
+
+        """
+        return self._pages.get(path.split('?', 1)[0])
+
+    def _genScoreboard(self, name, workers):
+        rand = self._rand
+        board = ''.join([rand.choice('___WWKRSCL.') for i in range(workers)]) #@UnusedVariable
+        body = ("Total Accesses: %d\nTotal kBytes: %d\nCPULoad: .0123\n"
+                "Uptime: %d\nReqPerSec: 12.34\nBytesPerSec: 45678.9\n"
+                "BytesPerReq: 3702.1\nBusy%s: %d\nIdle%s: %d\nScoreboard: %s\n"
+                % (self._counter(10 ** 9), self._counter(10 ** 9),
+                   self._counter(), name, board.count('W'), name,
+                   board.count('_'), board))
+        return ('text/plain', body)
+
+    def _genNginx(self):
+        accepts = self._counter(10 ** 9)
+        body = ("Active connections: %d \nserver accepts handled requests\n"
+                " %d %d %d \nReading: %d Writing: %d Waiting: %d \n"
+                % (self._counter(1000), accepts, accepts,
+                   accepts + self._counter(10 ** 8), self._counter(100),
+                   self._counter(100), self._counter(1000)))
+        return ('text/plain', body)
+
+    def _genPHPfpm(self):
+        idle = self._counter(20)
+        active = self._counter(20)
+        body = ("pool:                 www\nprocess manager:      dynamic\n"
+                "start time:           01/Jan/2011:00:00:00 +0000\n"
+                "start since:          %d\naccepted conn:        %d\n"
+                "listen queue:         0\nmax listen queue:     0\n"
+                "listen queue len:     128\nidle processes:       %d\n"
+                "active processes:     %d\ntotal processes:      %d\n"
+                "max active processes: %d\nmax children reached: 0\n"
+                % (self._counter(), self._counter(10 ** 8), idle, active,
+                   idle + active, active + 2))
+        return ('text/plain', body)
+
+    def _genTomcat(self, workers, connectors):
+        ctr = self._counter
+        buf = ['<?xml version="1.0" encoding="utf-8"?><status>',
+               '<jvm><memory free="%d" total="%d" max="%d"/>'
+               % (ctr(10 ** 8), 10 ** 9, 2 * 10 ** 9)]
+        for pool in ('Eden Space', 'Survivor Space', 'Tenured Gen'):
+            buf.append('<memorypool name="%s" type="Heap memory" '
+                       'usageInit="%d" usageCommitted="%d" usageMax="%d" '
+                       'usageUsed="%d"/>' % (pool, ctr(), ctr(), ctr(), ctr()))
+        buf.append('</jvm>')
+        for idx in range(connectors):
+            buf.append('<connector name="%s-%d">'
+                       % (('http-bio', 'ajp-bio')[idx % 2], 8080 + idx))
+            buf.append('<threadInfo maxThreads="%d" currentThreadCount="%d" '
+                       'currentThreadsBusy="%d"/>'
+                       % (workers, workers / 2, ctr(workers / 2)))
+            buf.append('<requestInfo maxTime="%d" processingTime="%d" '
+                       'requestCount="%d" errorCount="%d" bytesReceived="%d" '
+                       'bytesSent="%d"/>' % (ctr(10000), ctr(10 ** 9),
+                                             ctr(10 ** 8), ctr(10 ** 5),
+                                             ctr(10 ** 10), ctr(10 ** 11)))
+            buf.append('<workers>')
+            for worker in range(workers / 2):
+                buf.append('<worker stage="S" requestProcessingTime="%d" '
+                           'requestBytesSent="0" requestBytesReceived="0" '
+                           'remoteAddr="10.0.0.%d" virtualHost="localhost" '
+                           'method="GET" currentUri="/app/%d" '
+                           'currentQueryString="?" protocol="HTTP/1.1"/>'
+                           % (ctr(1000), worker % 250 + 1, worker))
+            buf.append('</workers></connector>')
+        buf.append('</status>')
+        return ('text/xml', ''.join(buf))
+
+
+class SquidServer(FakeServer):
+    """Fake Squid Cache Manager."""
+
+    def __init__(self, counters=defaultCounters, host=defaultHost,
+                 seed=defaultSeed):
+        """Initialize server.
+
+        @param counters: Number of counters in counters page.
+        @param host:     Listen address.
+        @param seed:     Seed for generated values.
+
+        """
+        FakeServer.__init__(self, HTTPStatusHandler, host, seed)
+        self._pages = {'counters': ('text/plain', self._genCounters(counters))}
+
+    def getPage(self, path):
+        """Returns cache manager page for request path.
+
+        @param path: Request path as cache_object://host/page URL.
+        @return:     Tuple of content type and body or None.
+
+        """
+        prefix = 'cache_object://'
+        if not path.startswith(prefix):
+            return None
+        return self._pages.get(path[len(prefix):].split('/', 1)[-1])
+
+    def _genCounters(self, counters):
+        rand = self._rand
+        groups = ('client_http', 'server.all', 'server.http', 'server.ftp',
+                  'server.other', 'icp', 'cd', 'unlink', 'page_faults',
+                  'select_loops', 'cpu_time', 'wall_time', 'swap', 'aborted')
+        lines = ['sample_time = 1300000000.123456 (Thu, 01 Jan 2011 '
+                 '00:00:00 GMT)']
+        for idx in range(counters):
+            group = groups[idx % len(groups)]
+            key = '%s.counter_%d' % (group, idx)
+            if idx % 7 == 0:
+                lines.append('%s = %.6f' % (key, rand.uniform(0, 10 ** 4)))
+            elif idx % 11 == 0:
+                lines.append('%s = %d KB' % (key, self._counter()))
+            else:
+                lines.append('%s = %d' % (key, self._counter()))
+        return '\n'.join(lines) + '\n'
+
+
+def start_servers(flavors=httpFlavors, **sizes):
+    """Start all fake servers.
+
+    @param flavors: HTTP status page server flavors to start.
+    @param sizes:   Keyword arguments passed on to the constructors of the
+                    servers that accept them.
+    @return:        Dictionary of started servers indexed by name.
+
+    """
+    servers = {}
+    def create(name, cls, *args):
+        code = cls.__init__.im_func.func_code
+        argnames = code.co_varnames[:code.co_argcount]
+        kwargs = dict([(key, val) for (key, val) in sizes.iteritems()
+                       if key in argnames])
+        servers[name] = cls(*args, **kwargs)
+    try:
+        create('memcached', MemcachedServer)
+        create('asterisk', AMIServer)
+        create('squid', SquidServer)
+        for flavor in flavors:
+            create(flavor, HTTPStatusServer, flavor)
+    except:
+        stop_servers(servers)
+        raise
+    for server in servers.values():
+        server.start()
+    return servers
+
+
+def stop_servers(servers):
+    """Stop fake servers.
+
+    @param servers: Dictionary of servers returned by start_servers.
+
+    """
+    for server in servers.values():
+        try:
+            server.stop()
+        except Exception, e:
+            sys.stderr.write("Error stopping fake server: %s\n" % str(e))
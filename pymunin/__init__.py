@@ -6,10 +6,19 @@
 
 """
 
-import os.path
+import os
 import sys
 import re
-import cPickle as pickle
+import time
+import hashlib
+from pymunin.state import MuninStateStore, defaultStateDir
+from pymunin.counters import MuninRateEngine
+from pymunin.tasks import MuninTaskPool, defaultMaxWorkers, defaultDeadline
+from pymunin.instrument import MuninInstrument, instrumentPhases
+from pysysinfo.util import enable_call_stats, get_call_stats
+from pysysinfo.util import ExecCache
+from pymunin.spool import MuninSpool, defaultSpoolMaxAge
+from pymunin.confcache import MuninConfigCache, config_cache_enabled
 
 __author__ = "Ali Onur Uyar"
 __copyright__ = "Copyright 2011, Ali Onur Uyar"
@@ -23,7 +32,17 @@ __status__ = "Development"
 
 maxLabelLenGraphSimple = 40
 maxLabelLenGraphDual = 14
+graphAttrOrder = ('category', 'vlabel', 'info', 'args', 'period', 'scale', 
+                  'total', 'order', 'printf', 'width', 'height')
+fieldAttrOrder = ('label', 'type', 'draw', 'info', 'extinfo', 'colour',
+                  'negative', 'graph', 'min', 'max', 'cdef', 'line', 
+                  'warning', 'critical')
+defaultSampleInterval = 10
+defaultOutputEncoding = 'utf-8'
+execCacheDirName = 'pymunin-exec-cache'
 
+_reFieldNameStart = re.compile('^[^A-Za-z_]')
+_reFieldNameChars = re.compile('[^A-Za-z0-9_]')
 
 
 class MuninAttrFilter:
@@ -100,6 +119,14 @@ class MuninPlugin:
     isMultiInstance = False
     """True for Multi-Graph Plugins with Multi-Instance support, False otherwise.
     Must be overriden in child classes to indicate plugin type."""
+    
+    isReusable = False
+    """True for plugins whose instances can serve multiple fetch and config 
+    cycles in a persistent process (pymunin-node) or in sampler mode, False 
+    otherwise.
+    Must be overriden in child classes for plugins that retrieve all values in 
+    retrieveVals() without caching them on the instance, or that discard the 
+    cached values in resetVals()."""
 
     def __init__(self, argv=(), env=None, debug=False):
         """Constructor for MuninPlugin Class.
@@ -122,6 +149,20 @@ class MuninPlugin:
         self._instanceName = None
         self._instanceLabel = None
         self._nestedGraphs = False
+        self._stateStores = {}
+        self._rateFields = {}
+        self._rateEngine = None
+        self._fetchTasks = []
+        self._numCollections = 0
+        self._spool = None
+        self._configCache = None
+        self._output = None
+        self._outputBytes = 0
+        self._outputLines = 0
+        if argv is not None and len(argv) > 1 and len(argv[1]) > 0:
+            self._oper = argv[1]
+        else:
+            self._oper = 'fetch'
         if (self.plugin_name is not None and argv is not None and len(argv) > 0 
             and re.search('_$', self.plugin_name)):
             mobj = re.match("%s(\S+)$" % self.plugin_name, 
@@ -129,6 +170,7 @@ class MuninPlugin:
             if mobj:
                 self.arg0 = mobj.group(1)
         self._parseEnv()
+        self._initExecCache()
         if self.isMultigraph:
             self.envRegisterFilter('graphs', '^[\w\-]+$')
             self._nestedGraphs = self.envCheckFlag('nested_graphs', True)
@@ -144,12 +186,22 @@ class MuninPlugin:
                     else:
                         self._instanceLabel = None
                         self._instanceLabelType = None
+        self._instrument = None
+        if self.isMultigraph and self.envCheckFlag('internal_stats', False):
+            self._instrument = MuninInstrument()
+            self._instrument.begin('init')
+            state = self._getStateStore('internal').restore()
+            if state is not None:
+                self._instrument.setTimes('output', state.get('wall'), 
+                                          state.get('cpu'))
+            enable_call_stats()
                 
     def _parseEnv(self, env=None):
         """Private method for parsing through environment variables.
         
         Parses for environment variables common to all Munin Plugins:
             - MUNIN_STATEFILE
+            - MUNIN_PLUGSTATE
             - MUNIN_CAP_DIRTY_CONFIG
             - nested_graphs
         
@@ -160,13 +212,46 @@ class MuninPlugin:
         """
         if not env:
             env = self._env
-        if env.has_key('MUNIN_STATEFILE'):
-            self._stateFile = env.get('MUNIN_STATEFILE')
-        else:
-            self._stateFile = '/tmp/munin-state-%s' % self.plugin_name
+        self._stateFile = env.get('MUNIN_STATEFILE')
+        self._stateDir = env.get('MUNIN_PLUGSTATE', defaultStateDir)
         if env.has_key('MUNIN_CAP_DIRTY_CONFIG'):
             self._dirtyConfig = True
             
+    def _initExecCache(self):
+        """Private method for initializing the cache for the output of 
+        external commands, which is shared through the cache directory by the 
+        plugins executing the same commands.
+        
+        The cache is enabled by setting the exec_cache_ttl environment 
+        variable to the time to live for cached output in seconds. The cache
+        directory is defined by the exec_cache_dir environment variable
+        (Default: pymunin-exec-cache in MUNIN_PLUGSTATE directory).
+        
+        The cache belongs to the plugin instance and is passed explicitly to 
+        the collectors, so that plugins running in the same process do not 
+        share cache settings.
+        
+        """
+        self._execCache = False
+        ttl = self.envGet('exec_cache_ttl', 0, float)
+        if ttl > 0:
+            cache_dir = self.envGet('exec_cache_dir',
+                                    os.path.join(self._stateDir, 
+                                                 execCacheDirName))
+            try:
+                self._execCache = ExecCache(cache_dir, ttl)
+            except (IOError, OSError):
+                pass
+    
+    def getExecCache(self):
+        """Returns the cache for the output of external commands for passing 
+        to the collectors.
+        
+        @return: ExecCache instance or False if the cache is disabled.
+        
+        """
+        return self._execCache
+            
     def _getGraph(self, graph_name, fail_noexist=False):
         """Private method for returning graph object with name graph_name. 
         
@@ -232,58 +317,204 @@ class MuninPlugin:
                 return graph_name
             else:
                 return "%s.%s" % (graph_name, subgraph_name)
+    
+    def _iterGraphs(self):
+        """Private method for iterating through the graphs and nested subgraphs
+        of the plugin in output order.
+        
+        @return: Iterator of (Multigraph ID, Graph Object) pairs.
+                 (The Multigraph ID is None for Simple Plugins.)
+        
+        """
+        for parent_name in self._graphNames:
+            if self.isMultigraph:
+                yield (self._getMultigraphID(parent_name), 
+                       self._graphDict[parent_name])
+            else:
+                yield (None, self._graphDict[parent_name])
+        if (self.isMultigraph and self._nestedGraphs 
+            and self._subgraphDict and self._subgraphNames):
+            for (parent_name, subgraph_names) in self._subgraphNames.iteritems():
+                for graph_name in subgraph_names:
+                    yield (self._getMultigraphID(parent_name, graph_name),
+                           self._subgraphDict[parent_name][graph_name])
+    
+    def _getSpool(self):
+        """Private method for returning the spool for timestamped values 
+        collected in sampler mode.
+        
+        The spool file path is determined by the spool_file environment 
+        variable; the default path is derived from the plugin name and the 
+        instance name.
+        
+        @return: MuninSpool instance.
+        
+        """
+        if self._spool is None:
+            path = self.envGet('spool_file')
+            if path is None:
+                if self.isMultiInstance and self._instanceName is not None:
+                    path = '/tmp/munin-spool-%s_%s' % (self.plugin_name, 
+                                                       self._instanceName)
+                else:
+                    path = '/tmp/munin-spool-%s' % self.plugin_name
+            self._spool = MuninSpool(path, self.envGet('spool_max_age', 
+                                                       defaultSpoolMaxAge, 
+                                                       int))
+        return self._spool
             
-    def _formatConfig(self, conf_dict):
-        """Formats configuration directory from Munin Graph and returns 
-        multi-line value entries for the plugin config cycle.
+    def _getConfigCache(self):
+        """Private method for returning the cache for config output.
         
-        @param conf_dict: Configuration directory. 
-        @return:          Multi-line text.
+        @return: MuninConfigCache instance or None if caching of config output
+                 is not enabled through the config_cache environment variable.
         
         """
-        confs = []
+        if self._configCache is None and config_cache_enabled(self._env):
+            self._configCache = MuninConfigCache(self.__class__, self._argv, 
+                                                 self._env)
+        return self._configCache
+    
+    def _getStructHash(self):
+        """Private method for calculating hash of graph / field structure of 
+        plugin.
+        
+        @return: Hash string.
+        
+        """
+        items = [(graph_id, graph.getFieldList()) 
+                 for (graph_id, graph) in self._iterGraphs()]
+        return hashlib.sha1(repr(items)).hexdigest()
+    
+    def _getInternalGraphs(self, graph_count=None, field_count=None):
+        """Private method for returning the graphs of the self-instrumentation
+        of the plugin populated with the measurements of the current run.
+        
+        @param graph_count: Number of graphs emitted by plugin.
+        @param field_count: Number of fields emitted by plugin.
+        @return:            List of (Multigraph ID, MuninGraph) pairs.
+        
+        """
+        instance_id = _reFieldNameChars.sub('_', self._getInstanceID())
+        prefix = 'pymunin_internal_%s' % instance_id
+        graphs = []
+        for (idx, suffix, title) in ((0, 'wall', 'Wall Time'), 
+                                     (1, 'cpu', 'CPU Time')):
+            graph = MuninGraph('PyMunin - %s - Runtime - %s' 
+                               % (instance_id, title), 'munin',
+                info='%s in seconds spent by plugin in each phase of run.' 
+                     % title,
+                vlabel='seconds', args='--base 1000 --lower-limit 0')
+            for phase in instrumentPhases:
+                graph.addField(phase, phase, draw='AREASTACK', type='GAUGE')
+                times = self._instrument.getTimes(phase)
+                if times is not None:
+                    graph.setVal(phase, times[idx])
+            graphs.append(("%s_%s" % (prefix, suffix), graph))
+        graph = MuninGraph('PyMunin - %s - Output' % instance_id, 'munin',
+            info='Number of graphs and fields emitted by plugin.',
+            args='--base 1000 --lower-limit 0')
+        graph.addField('graphs', 'graphs', draw='LINE2', type='GAUGE')
+        graph.addField('fields', 'fields', draw='LINE2', type='GAUGE')
+        graph.setVal('graphs', graph_count)
+        graph.setVal('fields', field_count)
+        graphs.append(("%s_output" % prefix, graph))
+        graph = MuninGraph('PyMunin - %s - Collector Latency' % instance_id, 
+            'munin',
+            info='Average latency in seconds of data collection calls.',
+            vlabel='seconds', args='--base 1000 --lower-limit 0')
+        call_stats = get_call_stats() or {}
+        for call in ('exec_command', 'get_url', 'db_query'):
+            graph.addField(call, call, draw='LINE2', type='GAUGE')
+            stats = call_stats.get(call)
+            if stats is not None:
+                graph.setVal(call, stats[1] / stats[0])
+        graphs.append(("%s_calls" % prefix, graph))
+        if self._execCache:
+            exec_stats = self._execCache.getStats()
+            graph = MuninGraph('PyMunin - %s - Command Cache' % instance_id, 
+                'munin',
+                info='External command executions served from the shared '
+                     'command cache and fresh executions.',
+                args='--base 1000 --lower-limit 0')
+            for key in ('cached', 'fresh'):
+                graph.addField(key, key, draw='AREASTACK', type='GAUGE')
+                graph.setVal(key, exec_stats[key])
+            graphs.append(("%s_exec_cache" % prefix, graph))
+        return graphs
+    
+    def _renderConfig(self, conf_dict, buf):
+        """Renders configuration directory from Munin Graph appending the 
+        newline terminated entries for the plugin config cycle to buffer.
+        
+        @param conf_dict: Configuration directory.
+        @param buf:       List of output text fragments.
+        
+        """
+        append = buf.append
         graph_dict = conf_dict['graph']
-        field_list = conf_dict['fields']
         
         # Order and format Graph Attributes
         title = graph_dict.get('title')
         if title is not None:
             if self.isMultiInstance and self._instanceLabel is not None:
                 if self._instanceLabelType == 'suffix':
-                    confs.append("graph_%s %s - %s" % ('title', 
-                                                       title, 
-                                                       self._instanceLabel,))
+                    append("graph_title %s - %s\n" % (title, 
+                                                      self._instanceLabel))
                 elif self._instanceLabelType == 'prefix':
-                    confs.append("graph_%s %s - %s" % ('title', 
-                                                       self._instanceLabel,
-                                                       title,))
+                    append("graph_title %s - %s\n" % (self._instanceLabel,
+                                                      title))
             else:
-                confs.append("graph_%s %s" % ('title', title))
-        for key in ('category', 'vlabel', 'info', 'args', 'period', 
-                    'scale', 'total', 'order', 'printf', 'width', 'height'):
+                append("graph_title %s\n" % title)
+        for key in graphAttrOrder:
             val = graph_dict.get(key)
             if val is not None:
-                if isinstance(val, bool):
-                    if val:
-                        val = "yes"
-                    else:
-                        val = "no"
-                confs.append("graph_%s %s" % (key, val))
+                if val is True:
+                    val = "yes"
+                elif val is False:
+                    val = "no"
+                append("graph_%s %s\n" % (key, val))
 
         # Order and Format Field Attributes
-        for (field_name, field_attrs) in field_list:
-            for key in ('label', 'type', 'draw', 'info', 'extinfo', 'colour',
-                        'negative', 'graph', 'min', 'max', 'cdef', 
-                        'line', 'warning', 'critical'):
-                val = field_attrs.get(key)
+        for (field_name, field_attrs) in conf_dict['fields']:
+            get = field_attrs.get
+            for key in fieldAttrOrder:
+                val = get(key)
                 if val is not None:
-                    if isinstance(val, bool):
-                        if val:
-                            val = "yes"
-                        else:
-                            val = "no"
-                    confs.append("%s.%s %s" % (field_name, key, val))
-        return "\n".join(confs)
+                    if val is True:
+                        val = "yes"
+                    elif val is False:
+                        val = "no"
+                    append("%s.%s %s\n" % (field_name, key, val))
+    
+    def _renderVals(self, val_list, buf):
+        """Renders value list from Munin Graph appending the newline terminated
+        value entries for the plugin fetch cycle to buffer.
+        
+        @param val_list: List of name-value pairs.
+        @param buf:      List of output text fragments.
+        
+        """
+        append = buf.append
+        for (name, val) in val_list:
+            if val is None:
+                append("%s.value U\n" % name)
+            elif isinstance(val, float):
+                append("%s.value %f\n" % (name, val))
+            else:
+                append("%s.value %s\n" % (name, val))
+            
+    def _formatConfig(self, conf_dict):
+        """Formats configuration directory from Munin Graph and returns 
+        multi-line value entries for the plugin config cycle.
+        
+        @param conf_dict: Configuration directory. 
+        @return:          Multi-line text.
+        
+        """
+        buf = []
+        self._renderConfig(conf_dict, buf)
+        return ''.join(buf)[:-1]
     
     def _formatVals(self, val_list):
         """Formats value list from Munin Graph and returns multi-line value
@@ -293,17 +524,41 @@ class MuninPlugin:
         @return:         Multi-line text.
         
         """
-        vals = []
-        for (name, val) in val_list:
-            if val is not None:
-                if isinstance(val, float):
-                    vals.append("%s.value %f" % (name, val))
-                else:
-                    vals.append("%s.value %s" % (name, val))
-            else:
-                vals.append("%s.value U" % (name,))
-        return "\n".join(vals)
-            
+        buf = []
+        self._renderVals(val_list, buf)
+        return ''.join(buf)[:-1]
+    
+    def _writeOutput(self, buf):
+        """Writes the whole plugin response accumulated in buffer to the output
+        stream at once and updates the output counters.
+        
+        The response is written to the file descriptor of the output stream 
+        with a single write system call whenever possible. Unicode text is 
+        encoded with the encoding of the output stream (Default: UTF-8) and 
+        the byte counter is updated with the length of the encoded response.
+        
+        @param buf: List of output text fragments.
+        
+        """
+        text = ''.join(buf)
+        fp = self._output or sys.stdout
+        if isinstance(text, unicode):
+            encoding = getattr(fp, 'encoding', None) or defaultOutputEncoding
+            text = text.encode(encoding, 'replace')
+        self._outputBytes += len(text)
+        self._outputLines += text.count('\n')
+        try:
+            fd = fp.fileno()
+        except (AttributeError, IOError, ValueError):
+            fd = None
+        if fd is None:
+            fp.write(text)
+        else:
+            fp.flush()
+            view = buffer(text)
+            while len(view) > 0:
+                view = view[os.write(fd, view):]
+        
     def envHasKey(self, name):
         """Return True if environment variable with name exists.  
         
@@ -435,6 +690,34 @@ class MuninPlugin:
         """
         return self._debug
     
+    def setOutput(self, fp):
+        """Redirect plugin output to file object fp.
+        
+        @param fp: File object for output. (Standard output is used if None.)
+        
+        """
+        self._output = fp
+        
+    def endInit(self):
+        """Stop the measurement of the init phase of the self-instrumentation.
+        
+        Must be called by the code that creates the plugin instance once the 
+        constructor returns; run() calls it for plugins executed by Munin and 
+        pymunin-node calls it for the plugin instances that it hosts. Calls 
+        after the first one have no effect.
+        
+        """
+        if self._instrument is not None:
+            self._instrument.end('init')
+        
+    def getOutputStats(self):
+        """Returns the number of bytes and lines emitted by the plugin.
+        
+        @return: Dictionary of output counters.
+        
+        """
+        return {'bytes': self._outputBytes, 'lines': self._outputLines}
+    
     def graphEnabled(self, graph_name):
         """Utility method to check if graph with the given name is enabled.
         
@@ -443,41 +726,207 @@ class MuninPlugin:
             
         """
         return not self.isMultigraph or self.envCheckFilter('graphs', graph_name)
+    
+    def graphsRequired(self):
+        """Utility method to check if the current plugin command requires the
+        graphs of the plugin.
+        
+        Plugins with costly graph discovery may skip the registration of graphs 
+        for the autoconf and suggest commands.
+        
+        @return: Returns False for autoconf and suggest, True otherwise.
+        
+        """
+        return self._oper not in ('autoconf', 'suggest')
+        
+    def invalidateConfigCache(self):
+        """Utility method to discard the cached config output of the plugin.
+        
+        For use in plugins with dynamic graph topology that detect changes 
+        which are not reflected in the graph / field structure or in the cache 
+        key returned by getConfigCacheKey().
+        
+        """
+        cache = self._getConfigCache()
+        if cache is not None:
+            cache.invalidate()
+            
+    def getConfigCacheKey(cls, env):
+        """Returns key that identifies the topology the config output depends 
+        on, for inclusion in the fingerprint of the cached config output.
+        
+        The method is called before the plugin is instantiated and must be 
+        cheap. Must be overwritten in child classes for plugins with dynamic 
+        topology to return, for instance, the list of monitored devices.
+        
+        @param env: Dictionary of environment variables.
+        @return:    Key that can be converted to string with repr or None.
+        
+        """
+        return None
+    getConfigCacheKey = classmethod(getConfigCacheKey)
+        
+    def _getInstanceID(self):
+        """Private method for returning name that identifies the plugin 
+        instance, derived from the plugin name, the wildcard argument and the 
+        instance name.
+        
+        @return: Instance ID string.
+        
+        """
+        name = self.plugin_name
+        if self.arg0 is not None:
+            name += self.arg0
+        if self.isMultiInstance and self._instanceName is not None:
+            name = "%s_%s" % (name, self._instanceName)
+        return name
+    
+    def _getStateStore(self, namespace=None):
+        """Private method for returning the persistent storage for plugin 
+        state.
+        
+        The state file path is determined by the MUNIN_STATEFILE environment 
+        variable; the default path in the MUNIN_PLUGSTATE directory (Default: 
+        /tmp) is derived from the plugin name, the wildcard argument and the 
+        instance name.
+        
+        @param namespace: Suffix of state file for state kept by the framework
+                          separately from the state of the plugin.
+        @return:          MuninStateStore instance.
+        
+        """
+        store = self._stateStores.get(namespace)
+        if store is None:
+            path = self._stateFile
+            if path is None:
+                path = os.path.join(self._stateDir, 
+                                    'munin-state-%s' % self._getInstanceID())
+            if namespace is not None:
+                path = "%s.%s" % (path, namespace)
+            store = MuninStateStore(path, self.envCheckFlag('state_mmap', 
+                                                            False))
+            self._stateStores[namespace] = store
+        return store
+    
+    def _collectVals(self):
+        """Private method for retrieving the values for graphs for fetch and
+        sampler mode.
+        
+        The fetch tasks registered with registerFetchTask() are run after 
+        retrieveVals().
+        
+        Rates and ratios for the fields declared with declareRateField() and 
+        declareRatioField() are calculated with respect to the raw counter 
+        values stored in the previous collection, and the current raw counter
+        values are stored for the next collection.
+        
+        Values cached on the instance are discarded by calling resetVals() 
+        before each collection except the first one.
+        
+        """
+        if self._numCollections > 0:
+            self.resetVals()
+        self._numCollections += 1
+        if self._rateFields:
+            if self._rateEngine is not None:
+                state = self._rateEngine.getState()
+            else:
+                state = self._getStateStore('rates').restore()
+            self._rateEngine = MuninRateEngine(state)
+        self.retrieveVals()
+        if self._fetchTasks:
+            self._runFetchTasks()
+        if self._rateFields:
+            self._getStateStore('rates').save(self._rateEngine.getState())
+            
+    def _runFetchTasks(self):
+        """Private method for running the registered fetch tasks concurrently.
+        
+        The number of worker threads is determined by the fetch_threads 
+        environment variable (Default: 4) and the overall deadline in seconds 
+        by fetch_deadline (Default: 8). The callbacks of the tasks that finish 
+        in time are called in registration order; the values of the graphs of 
+        late or failed tasks are reset to undefined.
+        
+        """
+        pool = MuninTaskPool(self.envGet('fetch_threads', defaultMaxWorkers, 
+                                         int),
+                             self.envGet('fetch_deadline', defaultDeadline, 
+                                         float))
+        (results, errors, late) = pool.run([(name, func) 
+                                            for (name, func, callback, graphs) #@UnusedVariable
+                                            in self._fetchTasks])
+        for (name, func, callback, graphs) in self._fetchTasks: #@UnusedVariable
+            if results.has_key(name):
+                callback(results[name])
+            else:
+                for graph_name in graphs:
+                    graph = self._getGraph(graph_name)
+                    if graph is not None:
+                        for field_name in graph.getFieldList():
+                            graph.setVal(field_name, None)
+        for name in late:
+            print >> sys.stderr, ("Fetch task %s did not finish before the "
+                                  "deadline." % name)
+        for (name, func, callback, graphs) in self._fetchTasks: #@UnusedVariable
+            exc = errors.get(name)
+            if exc is not None:
+                if self._debug:
+                    raise exc[0], exc[1], exc[2]
+                print >> sys.stderr, ("EXCEPTION in fetch task %s: %s" 
+                                      % (name, str(exc[1])))
+    
+    def _calcRateVal(self, graph_name, field_name, val):
+        """Private method for converting the raw counter value passed for a
+        rate or ratio field to the value for the field.
+        
+        @param graph_name: Graph Name
+        @param field_name: Field Name.
+        @param val:        Raw counter value for rate fields, or tuple of 
+                           numerator and denominator counter values for ratio 
+                           fields.
+        @return:           Rate or ratio.
+        
+        """
+        (ratio, scale, default, wrap) = self._rateFields[(graph_name, 
+                                                          field_name)]
+        if self._rateEngine is None:
+            self._rateEngine = MuninRateEngine(
+                self._getStateStore('rates').restore())
+        key = "%s.%s" % (graph_name, field_name)
+        if ratio:
+            if val is None:
+                return None
+            return self._rateEngine.ratio(key, val[0], val[1], 
+                                          scale, default, wrap)
+        else:
+            return self._rateEngine.rate(key, val, wrap)
         
     def saveState(self,  stateObj):
         """Utility methos to save plugin state stored in stateObj to persistent 
         storage to permit access to previous state in subsequent plugin runs.
         
         Any object that can be pickled and unpickled can be used to store the 
-        plugin state.
+        plugin state. Dictionaries that map field names to numeric values are 
+        stored in a compact binary format, which makes them the preferred way 
+        for keeping the previous values of fields.
+        
+        The state file is replaced atomically.
         
         @param stateObj: Object that stores plugin state.
         
         """
-        try:
-            fp = open(self._stateFile,  'w')
-            pickle.dump(stateObj, fp)
-        except:
-            raise IOError("Failure in storing plugin state in file: %s" 
-                          % self._stateFile)
-        return True
+        return self._getStateStore().save(stateObj)
     
     def restoreState(self):
         """Utility method to restore plugin state from persistent storage to 
         permit access to previous plugin state.
         
-        @return: Object that stores plugin state.
+        @return: Object that stores plugin state or None if no valid state has
+                 been stored.
         
         """
-        if os.path.exists(self._stateFile):
-            try:
-                fp = open(self._stateFile,  'r')
-                stateObj = pickle.load(fp)
-            except:
-                raise IOError("Failure in reading plugin state from file: %s" 
-                              % self._stateFile)
-            return stateObj
-        return None
+        return self._getStateStore().restore()
         
     def appendGraph(self, graph_name, graph):
         """Utility method to associate Graph Object to Plugin.
@@ -494,6 +943,20 @@ class MuninPlugin:
         if not self.isMultigraph  and len(self._graphNames) > 1:
             raise AttributeError("Simple Munin Plugins cannot have more than one graph.")
         
+    def replaceGraph(self, graph_name, graph):
+        """Utility method to replace Graph Object associated to Plugin.
+        
+        This utility method is for use by plugins that rebuild the fields of a
+        graph between collections; the output order of graphs is retained.
+        
+        @param graph_name:  Graph Name
+        @param graph:       MuninGraph Instance
+
+        """
+        if not self._graphDict.has_key(graph_name):
+            raise AttributeError("Invalid graph name: %s" % graph_name)
+        self._graphDict[graph_name] = graph
+        
     def appendSubgraph(self, parent_name,  graph_name, graph):
         """Utility method to associate Subgraph Instance to Root Graph Instance.
 
@@ -517,6 +980,42 @@ class MuninPlugin:
             raise AttributeError("Invalid parent graph name %s used for subgraph %s."
                 % (parent_name,  graph_name))
             
+    def appendGraphSpec(self, graph_name, field_names, builder, 
+                        autoFixNames=False):
+        """Utility method to associate Graph Specification to Plugin.
+        
+        Only the field names are registered in the constructor; the MuninGraph 
+        instance with titles, labels and the rest of the field attributes is
+        built by calling builder the first time the config of the graph is 
+        requested.
+        
+        @param graph_name:   Graph Name
+        @param field_names:  List of field names in output order.
+        @param builder:      Function without arguments that returns the 
+                             MuninGraph instance for the graph.
+        @param autoFixNames: Automatically fix invalid characters in field 
+                             names by replacing them with '_'.
+        
+        """
+        self.appendGraph(graph_name, 
+                         MuninGraphSpec(field_names, builder, autoFixNames))
+        
+    def appendSubgraphSpec(self, parent_name, graph_name, field_names, builder,
+                           autoFixNames=False):
+        """Utility method to associate Subgraph Specification to Root Graph.
+        
+        @param parent_name:  Root Graph Name
+        @param graph_name:   Subgraph Name
+        @param field_names:  List of field names in output order.
+        @param builder:      Function without arguments that returns the 
+                             MuninGraph instance for the subgraph.
+        @param autoFixNames: Automatically fix invalid characters in field 
+                             names by replacing them with '_'.
+        
+        """
+        self.appendSubgraph(parent_name, graph_name, 
+                            MuninGraphSpec(field_names, builder, autoFixNames))
+            
     def setGraphVal(self, graph_name, field_name, val):
         """Utility method to set Value for Field in Graph.
         
@@ -529,11 +1028,74 @@ class MuninPlugin:
         """
         graph = self._getGraph(graph_name, True)
         if graph.hasField(field_name):
+            if self._rateFields.has_key((graph_name, field_name)):
+                val = self._calcRateVal(graph_name, field_name, val)
             graph.setVal(field_name, val)
         else:
             raise AttributeError("Invalid field name %s for graph %s." 
                                  % (field_name, graph_name))
     
+    def registerFetchTask(self, name, func, callback, graphs=()):
+        """Utility method to register fetch task for retrieving values from an 
+        independent data source.
+        
+        The fetch tasks of the plugin are run concurrently on a bounded thread 
+        pool after retrieveVals() for each fetch. The function of the task 
+        must only retrieve the data and must not modify the graphs; the 
+        callback is called with the value returned by the function in the main 
+        thread to set the values of the graphs. The values of the graphs of 
+        the task are reported as undefined if the task fails or does not 
+        finish before the deadline.
+        
+        @param name:     Name of task.
+        @param func:     Function without arguments for retrieving data.
+        @param callback: Function for setting graph values, called with the 
+                         value returned by func.
+        @param graphs:   List of names of graphs updated by callback.
+        
+        """
+        self._fetchTasks.append((name, func, callback, graphs))
+        
+    def declareRateField(self, graph_name, field_name, wrap=None):
+        """Utility method to declare field for which the plugin calculates the
+        rate per second of a counter locally.
+        
+        The raw counter value is passed to setGraphVal() and the rate since 
+        the previous run is reported as value of the field; the previous values
+        are kept in the state of the plugin. The value is undefined in the 
+        first run and after counter resets.
+        
+        @param graph_name: Graph Name
+        @param field_name: Field Name.
+        @param wrap:       Counter width as modulus (counterWrap32, 
+                           counterWrap64) for detecting counter wraps. Any 
+                           decrease of the counter is handled as a reset if 
+                           None.
+        
+        """
+        self._rateFields[(graph_name, field_name)] = (False, None, None, wrap)
+    
+    def declareRatioField(self, graph_name, field_name, scale=1, default=None,
+                          wrap=None):
+        """Utility method to declare field for which the plugin calculates the
+        ratio of the increments of two counters locally.
+        
+        A tuple of the raw values of the numerator and denominator counters is 
+        passed to setGraphVal() and the ratio of their increments since the 
+        previous run is reported as value of the field. Hit ratios, 
+        percentages and per request averages can be reported this way.
+        
+        @param graph_name: Graph Name
+        @param field_name: Field Name.
+        @param scale:      Multiplier for ratio. (Use 100 for percentages.)
+        @param default:    Value reported when the denominator does not change.
+        @param wrap:       Counter width as modulus for detecting counter 
+                           wraps.
+        
+        """
+        self._rateFields[(graph_name, field_name)] = (True, scale, default, 
+                                                      wrap)
+    
     def setSubgraphVal(self,  parent_name,  graph_name, field_name, val):
         """Set Value for Field in Subgraph.
 
@@ -692,6 +1254,18 @@ class MuninPlugin:
         """
         pass
 
+    def resetVals(self):
+        """Discard values cached on the instance before a new collection.
+        
+        This method is called before each collection except the first one for 
+        the instances that serve multiple collections (reusable plugins in 
+        pymunin-node and sampler mode). It must be overwritten in reusable 
+        child classes that cache values on the instance, for example, while 
+        populating the graphs in the constructor.
+        
+        """
+        pass
+
     def autoconf(self):
         """Implements Munin Plugin Auto-Configuration Option.
         
@@ -714,21 +1288,23 @@ class MuninPlugin:
         populated.
 
         """
-        for parent_name in self._graphNames:
-            graph = self._graphDict[parent_name]
-            if self.isMultigraph:
-                print "multigraph %s" % self._getMultigraphID(parent_name)
-            print self._formatConfig(graph.getConfig())
-            print
-        if (self.isMultigraph and self._nestedGraphs 
-            and self._subgraphDict and self._subgraphNames):
-            for (parent_name, subgraph_names) in self._subgraphNames.iteritems():
-                for graph_name in subgraph_names:
-                    graph = self._subgraphDict[parent_name][graph_name]
-                    print "multigraph %s" % self.getMultigraphID(parent_name, 
-                                                                 graph_name)
-                    print self._formatConfig(graph.getConfig())
-                    print
+        buf = []
+        for (graph_id, graph) in self._iterGraphs():
+            if graph_id is not None:
+                buf.append("multigraph %s\n" % graph_id)
+            self._renderConfig(graph.getConfig(), buf)
+            buf.append("\n")
+        if self._instrument is not None:
+            for (graph_id, graph) in self._getInternalGraphs():
+                buf.append("multigraph %s\n" % graph_id)
+                self._renderConfig(graph.getConfig(), buf)
+                buf.append("\n")
+        cache = self._getConfigCache()
+        if cache is not None:
+            text = ''.join(buf)
+            cache.store(text, self._getStructHash())
+            buf = [text,]
+        self._writeOutput(buf)
         return True
 
     def suggest(self):
@@ -746,30 +1322,116 @@ class MuninPlugin:
         Prints out measured values.
 
         """
-        self.retrieveVals()
-        for parent_name in self._graphNames:
-            graph = self._graphDict[parent_name]
-            if self.isMultigraph:
-                print "multigraph %s" % self._getMultigraphID(parent_name)
-            print self._formatVals(graph.getVals())
-            print
-        if (self.isMultigraph and self._nestedGraphs 
-            and self._subgraphDict and self._subgraphNames):
-            for (parent_name, subgraph_names) in self._subgraphNames.iteritems():
-                for graph_name in subgraph_names:
-                    graph = self._subgraphDict[parent_name][graph_name]
-                    print "multigraph %s" % self.getMultigraphID(parent_name, 
-                                                                 graph_name)
-                    print self._formatVals(graph.getVals())
-                    print
+        instr = self._instrument
+        if instr is None:
+            self._collectVals()
+            buf = []
+            for (graph_id, graph) in self._iterGraphs():
+                if graph_id is not None:
+                    buf.append("multigraph %s\n" % graph_id)
+                self._renderVals(graph.getVals(), buf)
+                buf.append("\n")
+            self._writeOutput(buf)
+        else:
+            enable_call_stats()
+            instr.begin('retrieve')
+            self._collectVals()
+            instr.end('retrieve')
+            instr.begin('format')
+            buf = []
+            graph_count = 0
+            field_count = 0
+            for (graph_id, graph) in self._iterGraphs():
+                if graph_id is not None:
+                    buf.append("multigraph %s\n" % graph_id)
+                self._renderVals(graph.getVals(), buf)
+                buf.append("\n")
+                graph_count += 1
+                field_count += graph.getFieldCount()
+            instr.end('format')
+            for (graph_id, graph) in self._getInternalGraphs(graph_count, 
+                                                             field_count):
+                buf.append("multigraph %s\n" % graph_id)
+                self._renderVals(graph.getVals(), buf)
+                buf.append("\n")
+            instr.begin('output')
+            self._writeOutput(buf)
+            instr.end('output')
+            (wall, cpu) = instr.getTimes('output')
+            self._getStateStore('internal').save({'wall': wall, 'cpu': cpu})
+        cache = self._getConfigCache()
+        if cache is not None:
+            cache.check(self._getStructHash())
+        return True
+    
+    def sample(self, count=None):
+        """Implements Munin Plugin Sampler Mode.
+        
+        Retrieves values on the interval defined by the sample_interval 
+        environment variable (Default: 10 seconds) and appends the timestamped 
+        values to the spool for later retrieval by spoolfetch.
+        
+        Reusable plugin instances collect all samples; a new instance is 
+        created for each sample for plugins that are not reusable, so that 
+        no values cached on the instance are spooled again.
+        
+        @param count: Number of samples to collect. Collection continues 
+                      indefinitely if None.
+        
+        """
+        interval = self.envGet('sample_interval', defaultSampleInterval, int)
+        spool = self._getSpool()
+        num = 0
+        plugin = self
+        while count is None or num < count:
+            start = time.time()
+            if num > 0 and not self.isReusable:
+                plugin = self.__class__(self._argv, self._env, self._debug)
+            plugin._collectVals()
+            graph_vals = []
+            for (graph_id, graph) in plugin._iterGraphs():
+                graph_vals.append((graph_id or self.plugin_name, 
+                                   graph.getVals()))
+            spool.append(int(start), graph_vals)
+            spool.prune(int(start))
+            num += 1
+            if count is None or num < count:
+                delay = interval - (time.time() - start)
+                if delay > 0:
+                    time.sleep(delay)
+        return True
+    
+    def spoolfetch(self, timestamp):
+        """Implements Munin Plugin Spoolfetch Option.
+        
+        Prints out configuration for graphs followed by the values stored in
+        the spool that are newer than timestamp in munin-async format.
+        
+        @param timestamp: Time in seconds since the epoch.
+        
+        """
+        graph_vals = {}
+        for (ts, graph_id, val_list) in self._getSpool().iterSince(timestamp):
+            if not graph_vals.has_key(graph_id):
+                graph_vals[graph_id] = []
+            graph_vals[graph_id].extend([(name, "%d:%s" % (ts, val))
+                                         for (name, val) in val_list])
+        buf = []
+        for (graph_id, graph) in self._iterGraphs():
+            graph_id = graph_id or self.plugin_name
+            buf.append("multigraph %s\n" % graph_id)
+            self._renderConfig(graph.getConfig(), buf)
+            vals = graph_vals.get(graph_id)
+            if vals:
+                self._renderVals(vals, buf)
+            buf.append("\n")
+        self._writeOutput(buf)
         return True
 
     def run(self):
         """Implements main entry point for plugin execution."""
-        if len(self._argv) > 1 and len(self._argv[1]) > 0:
-            oper = self._argv[1]
-        else:
-            oper = 'fetch'
+        self.endInit()
+        oper = self._oper
         if oper == 'fetch':
             ret = self.fetch()
         elif oper == 'config':
@@ -779,12 +1441,19 @@ class MuninPlugin:
         elif oper == 'autoconf':
             ret = self.autoconf()
             if ret:
-                print "yes"
+                self._writeOutput(["yes\n",])
             else:
-                print "no"
+                self._writeOutput(["no\n",])
             ret = True
         elif oper == 'suggest':
             ret = self.suggest()
+        elif oper == 'sample':
+            ret = self.sample(self.envGet('sample_count', None, int))
+        elif oper == 'spoolfetch':
+            if len(self._argv) > 2:
+                ret = self.spoolfetch(int(self._argv[2]))
+            else:
+                ret = self.spoolfetch(0)
         else:
             raise AttributeError("Invalid command argument: %s" % oper)
         return ret
@@ -930,8 +1599,115 @@ class MuninGraph:
             @return:     Fixed name.
             
         """        
-        return re.sub('[^A-Za-z0-9_]', '_',
-                      re.sub('^[^A-Za-z_]', '_', name))
+        return _reFieldNameChars.sub('_', _reFieldNameStart.sub('_', name))
+
+
+class MuninGraphSpec:
+    """Class for Munin Graphs with deferred construction.
+    
+    The specification keeps only the ordered list of field names and the 
+    values, which is all that is needed for fetch. The MuninGraph instance 
+    is built by the builder function when the config of the graph is 
+    requested.
+    
+    """
+    
+    def __init__(self, field_names, builder, autoFixNames=False):
+        """Initialize Munin Graph Specification.
+        
+        @param field_names:  List of field names in output order.
+        @param builder:      Function without arguments that returns the 
+                             MuninGraph instance for the graph.
+        @param autoFixNames: Automatically fix invalid characters in field 
+                             names by replacing them with '_'.
+        
+        """
+        self._autoFixNames = autoFixNames
+        if autoFixNames:
+            self._fieldNameList = [self._fixName(name) for name in field_names]
+        else:
+            self._fieldNameList = list(field_names)
+        self._fieldNameSet = set(self._fieldNameList)
+        self._fieldValDict = {}
+        self._builder = builder
+        self._graph = None
+        
+    def getGraph(self):
+        """Returns MuninGraph instance built from specification.
+        
+        @return: MuninGraph instance.
+        
+        """
+        if self._graph is None:
+            graph = self._builder()
+            if graph.getFieldList() != self._fieldNameList:
+                raise AttributeError("Fields of graph do not match the fields "
+                                     "in graph specification.")
+            self._graph = graph
+        return self._graph
+    
+    def hasField(self, name):
+        """Returns true if field with field_name exists.
+        
+        @param name: Field Name
+        @return:     Boolean
+        
+        """
+        if self._autoFixNames:
+            name = self._fixName(name)
+        return name in self._fieldNameSet
+    
+    def getFieldList(self):
+        """Returns list of field names registered to Munin Graph.
+        
+        @return: List of field names registered to Munin Graph.
+        
+        """
+        return self._fieldNameList
+    
+    def getFieldCount(self):
+        """Returns the number of fields for Munin Graph.
+        
+        @return: Number of fields.
+        
+        """
+        return len(self._fieldNameList)
+    
+    def getConfig(self):
+        """Returns dictionary of config entries for Munin Graph.
+        
+        @return: Dictionary of config entries. 
+        
+        """
+        return self.getGraph().getConfig()
+    
+    def setVal(self, name, val):
+        """Set value for field in graph.
+        
+        @param name   : Graph Name
+        @param value  : Value for field. 
+        
+        """
+        if self._autoFixNames:
+            name = self._fixName(name)
+        self._fieldValDict[name] = val
+        
+    def getVals(self):
+        """Returns value list for Munin Graph
+        
+        @return: List of name-value pairs.
+        
+        """
+        get = self._fieldValDict.get
+        return [(name, get(name)) for name in self._fieldNameList]
+    
+    def _fixName(self, name):
+        """Replace invalid characters in field names with underscore.
+            @param name: Original name.
+            @return:     Fixed name.
+            
+        """        
+        return _reFieldNameChars.sub('_', _reFieldNameStart.sub('_', name))
 
 
 def muninMain(pluginClass, argv=None, env=None, debug=False):
@@ -953,6 +1729,13 @@ def muninMain(pluginClass, argv=None, env=None, debug=False):
     else:
         autoconf = False
     try:
+        if (len(argv) > 1 and argv[1] == 'config' 
+            and config_cache_enabled(env)
+            and not env.has_key('MUNIN_CAP_DIRTY_CONFIG')):
+            text = MuninConfigCache(pluginClass, argv, env).retrieve()
+            if text is not None:
+                sys.stdout.write(text)
+                return 0
         plugin = pluginClass(argv, env, debug)
         ret = plugin.run()
         if ret:
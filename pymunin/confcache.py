@@ -0,0 +1,161 @@
+"""Implements MuninConfigCache Class for caching the config output of plugins.
+
+    - The rendered config output is stored together with a fingerprint of the
+      inputs that determine it: plugin name and version, command line, plugin
+      environment variables and an optional cache key provided by the plugin
+      class.
+    - The cached output is served without instantiating the plugin as long as
+      the fingerprint matches and the entry has not expired.
+    - A hash of the graph / field structure is stored with the entry; the entry
+      is invalidated as soon as a fetch run detects a different structure.
+
+"""
+
+import os
+import sys
+import time
+import hashlib
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+defaultConfigCacheTTL = 3600
+
+
+def config_cache_enabled(env):
+    """Returns True if config caching is enabled through the config_cache
+    environment variable.
+
+    @param env: Dictionary of environment variables.
+    @return:    Boolean
+
+    """
+    return env.get('config_cache', '').lower() in ('yes', 'on')
+
+
+class MuninConfigCache:
+    """Class for storing and retrieving the config output of Munin Plugins."""
+
+    def __init__(self, plugin_class, argv, env):
+        """Initialize Config Cache.
+
+        @param plugin_class: Child class of MuninPlugin that implements plugin.
+        @param argv:         List of command line arguments to Munin Plugin.
+        @param env:          Dictionary of environment variables passed to
+                             Munin Plugin.
+
+        """
+        if argv is not None and len(argv) > 0:
+            name = os.path.basename(argv[0])
+        else:
+            name = plugin_class.plugin_name
+        self._path = (env.get('config_cache_file')
+                      or '/tmp/munin-config-%s' % name)
+        self._ttl = int(env.get('config_cache_ttl', defaultConfigCacheTTL))
+        self._fingerprint = self._calcFingerprint(plugin_class, name, env)
+
+    def _calcFingerprint(self, plugin_class, name, env):
+        """Calculate fingerprint for inputs of config output.
+
+        Only the plugin specific environment variables, which are lower case by
+        convention, are taken into account.
+
+        @param plugin_class: Child class of MuninPlugin that implements plugin.
+        @param name:         Plugin name.
+        @param env:          Dictionary of environment variables.
+        @return:             Fingerprint string.
+
+        """
+        module = sys.modules.get(plugin_class.__module__)
+        items = [plugin_class.plugin_name, name,
+                 getattr(module, '__version__', None)]
+        items.extend(sorted([(k, v) for (k, v) in env.items() if k.islower()]))
+        items.append(plugin_class.getConfigCacheKey(env))
+        return hashlib.sha1(repr(items)).hexdigest()
+
+    def _readEntry(self):
+        """Read cache entry.
+
+        @return: Tuple of (fingerprint, structure hash, timestamp, text) or
+                 None if the entry does not exist or cannot be parsed.
+
+        """
+        try:
+            fp = open(self._path, 'r')
+            try:
+                data = fp.read()
+            finally:
+                fp.close()
+        except IOError:
+            return None
+        (header, sep, text) = data.partition('\n')
+        cols = header.split()
+        if sep != '\n' or len(cols) != 3 or not cols[2].isdigit():
+            return None
+        return (cols[0], cols[1], int(cols[2]), text)
+
+    def retrieve(self):
+        """Returns cached config output if the fingerprint of the inputs
+        matches and the entry has not expired.
+
+        @return: Config output text or None.
+
+        """
+        entry = self._readEntry()
+        if entry is not None:
+            (fingerprint, struct_hash, timestamp, text) = entry #@UnusedVariable
+            if (fingerprint == self._fingerprint
+                and time.time() - timestamp < self._ttl):
+                return text
+        return None
+
+    def store(self, text, struct_hash):
+        """Store config output in cache atomically.
+
+        @param text:        Config output text.
+        @param struct_hash: Hash of graph / field structure of plugin.
+
+        """
+        tmp_path = "%s.%d.tmp" % (self._path, os.getpid())
+        try:
+            fp = open(tmp_path, 'w')
+            try:
+                fp.write("%s %s %d\n%s" % (self._fingerprint, struct_hash,
+                                           int(time.time()), text))
+            finally:
+                fp.close()
+            os.rename(tmp_path, self._path)
+        except (IOError, OSError):
+            raise IOError("Failure in storing plugin config in file: %s"
+                          % self._path)
+
+    def check(self, struct_hash):
+        """Invalidate cache entry if the graph / field structure of the plugin
+        differs from the structure of the cached config.
+
+        @param struct_hash: Hash of graph / field structure of plugin.
+        @return:            True if the cache entry is valid.
+
+        """
+        entry = self._readEntry()
+        if entry is None:
+            return False
+        if entry[0] != self._fingerprint or entry[1] != struct_hash:
+            self.invalidate()
+            return False
+        return True
+
+    def invalidate(self):
+        """Remove cache entry."""
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
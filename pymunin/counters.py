@@ -0,0 +1,194 @@
+"""Implements MuninRateEngine Class for calculating rates and ratios of
+counters locally in plugins.
+
+    - The previous raw values of counters are kept together with a monotonic
+      timestamp and the boot id of the system in the plugin state.
+    - Counter wraps are detected for counters of known width; any other
+      decrease of a counter or a reboot of the system is handled as a counter
+      reset, which yields undefined values until the next run.
+
+"""
+
+import time
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+uptimeFile = '/proc/uptime'
+bootIdFile = '/proc/sys/kernel/random/boot_id'
+
+counterWrap32 = 2 ** 32
+counterWrap64 = 2 ** 64
+
+_keyTime = '__time__'
+_keyBoot = '__boot__'
+_clockMonotonic = 1
+
+
+try:
+    import ctypes
+    import ctypes.util
+
+    class _timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    _librt = ctypes.CDLL(ctypes.util.find_library('rt')
+                         or ctypes.util.find_library('c'), use_errno=True)
+    _clock_gettime = _librt.clock_gettime
+    _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+except (ImportError, OSError, AttributeError, TypeError):
+    _clock_gettime = None
+
+
+def monotonic_time():
+    """Returns the time in seconds from a clock that is not affected by
+    changes of the system time.
+
+    CLOCK_MONOTONIC is used when available. The uptime of the system and the
+    system time are used as fallbacks.
+
+    @return: Time in seconds as float.
+
+    """
+    if _clock_gettime is not None:
+        ts = _timespec()
+        if _clock_gettime(_clockMonotonic, ctypes.byref(ts)) == 0:
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+    try:
+        fp = open(uptimeFile, 'r')
+        try:
+            return float(fp.read().split()[0])
+        finally:
+            fp.close()
+    except (IOError, ValueError, IndexError):
+        return time.time()
+
+
+def boot_id():
+    """Returns identifier of the current boot of the system, which determines
+    the validity of monotonic timestamps.
+
+    @return: Integer boot id or 0 if the boot id cannot be determined.
+
+    """
+    try:
+        fp = open(bootIdFile, 'r')
+        try:
+            return int(fp.read().strip().replace('-', '')[:15], 16)
+        finally:
+            fp.close()
+    except (IOError, ValueError):
+        return 0
+
+
+class MuninRateEngine:
+    """Class for calculating rates and ratios from the raw values of counters
+    using the values stored in the previous run.
+
+    """
+
+    def __init__(self, state=None):
+        """Initialize Rate Engine.
+
+        @param state: Dictionary with the state of the previous run as
+                      returned by getState() or None.
+
+        """
+        self._time = monotonic_time()
+        self._boot = boot_id()
+        self._prev = {}
+        self._interval = None
+        if isinstance(state, dict) and state.get(_keyBoot) == self._boot:
+            prev_time = state.get(_keyTime)
+            if prev_time is not None and prev_time < self._time:
+                self._prev = state
+                self._interval = self._time - prev_time
+        self._curr = {_keyTime: self._time, _keyBoot: self._boot}
+
+    def getInterval(self):
+        """Returns the time elapsed since the previous run.
+
+        @return: Interval in seconds or None if there is no valid previous
+                 state.
+
+        """
+        return self._interval
+
+    def getState(self):
+        """Returns state to be stored for the next run.
+
+        @return: Dictionary that maps counter keys to numeric values.
+
+        """
+        return self._curr
+
+    def delta(self, key, val, wrap=None):
+        """Returns the increment of counter since the previous run.
+
+        @param key:  Unique key for counter.
+        @param val:  Current raw value of counter.
+        @param wrap: Counter width as modulus (counterWrap32, counterWrap64)
+                     for detecting counter wraps. Any decrease of the counter
+                     is handled as a reset if None.
+        @return:     Increment or None if there is no previous value or the
+                     counter has been reset.
+
+        """
+        if val is None:
+            return None
+        self._curr[key] = val
+        prev = self._prev.get(key)
+        if prev is None:
+            return None
+        diff = val - prev
+        if diff < 0:
+            if wrap is not None and 0 <= prev < wrap:
+                diff += wrap
+                if diff >= wrap / 2:
+                    return None
+            else:
+                return None
+        return diff
+
+    def rate(self, key, val, wrap=None):
+        """Returns the increment per second of counter since the previous run.
+
+        @param key:  Unique key for counter.
+        @param val:  Current raw value of counter.
+        @param wrap: Counter width as modulus for detecting counter wraps.
+        @return:     Rate as float or None.
+
+        """
+        diff = self.delta(key, val, wrap)
+        if diff is None or not self._interval:
+            return None
+        return float(diff) / self._interval
+
+    def ratio(self, key, num, den, scale=1, default=None, wrap=None):
+        """Returns the ratio of the increments of two counters since the
+        previous run.
+
+        @param key:     Unique key for pair of counters.
+        @param num:     Current raw value of numerator counter.
+        @param den:     Current raw value of denominator counter.
+        @param scale:   Multiplier for ratio. (Use 100 for percentages.)
+        @param default: Value returned if the denominator did not change.
+        @param wrap:    Counter width as modulus for detecting counter wraps.
+        @return:        Ratio as float or None.
+
+        """
+        num_diff = self.delta(key + ':n', num, wrap)
+        den_diff = self.delta(key + ':d', den, wrap)
+        if num_diff is None or den_diff is None:
+            return None
+        if den_diff == 0:
+            return default
+        return scale * float(num_diff) / den_diff
@@ -0,0 +1,87 @@
+"""Implements MuninInstrument Class for measuring the runtime cost of plugins.
+
+    - Wall time and CPU time (user + system) of the process are recorded for
+      the phases of a plugin run: construction, value retrieval, formatting
+      and output.
+    - The measurements are reported by the plugin in a multigraph of its own.
+
+"""
+
+import time
+import resource
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+instrumentPhases = ('init', 'retrieve', 'format', 'output')
+
+
+def cpu_time():
+    """Returns the user and system CPU time consumed by the process.
+
+    getrusage() is used instead of os.times(), which is limited to the
+    resolution of the clock ticks of the system.
+
+    @return: CPU time in seconds.
+
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class MuninInstrument:
+    """Class for recording wall time and CPU time for phases of plugin
+    runs.
+
+    """
+
+    def __init__(self):
+        """Initialize instrumentation."""
+        self._start = {}
+        self._times = {}
+
+    def begin(self, phase):
+        """Start measurement for phase.
+
+        @param phase: Name of phase.
+
+        """
+        self._start[phase] = (time.time(), cpu_time())
+
+    def end(self, phase):
+        """Stop measurement for phase and record the elapsed times.
+
+        @param phase: Name of phase.
+
+        """
+        start = self._start.pop(phase, None)
+        if start is not None:
+            self._times[phase] = (time.time() - start[0],
+                                  cpu_time() - start[1])
+
+    def setTimes(self, phase, wall, cpu):
+        """Set recorded times for phase.
+
+        @param phase: Name of phase.
+        @param wall:  Wall time in seconds.
+        @param cpu:   CPU time in seconds.
+
+        """
+        self._times[phase] = (wall, cpu)
+
+    def getTimes(self, phase):
+        """Returns recorded times for phase.
+
+        @param phase: Name of phase.
+        @return:      Tuple of wall time and CPU time in seconds or None if
+                      the phase has not been measured.
+
+        """
+        return self._times.get(phase)
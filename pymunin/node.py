@@ -0,0 +1,465 @@
+"""Persistent Munin Node for serving PyMunin Plugins from a single process.
+
+    - The MuninNode Class loads the PyMunin plugin modules once and serves the
+      Munin Node text protocol (list, nodes, config, fetch, version, cap, quit)
+      on a TCP or UNIX socket.
+    - Plugin instances of plugin classes flagged as reusable are kept alive
+      between polls, so the collector objects they hold remain warm.
+    - Plugins configured with the sample_interval environment variable are 
+      sampled in-process by a background thread and the spooled values are 
+      served with the spoolfetch command of munin-async.
+    - The main function implements the entry point for the pymunin-node script.
+
+    The plugins to be served and their environment are configured using a file
+    with the same format used by Munin Node in plugin-conf.d:
+
+        [*]
+            env.include_graphs ...
+        [memcachedstats]
+            env.host 127.0.0.1
+        [ntphostoffset_192.168.1.1]
+
+    Sections with literal names define the plugins to be served; sections with
+    wildcard names only contribute environment variables. The names of wildcard
+    plugins (ending with underscore) are matched by prefix.
+
+"""
+
+import os
+import sys
+import socket
+import fnmatch
+import optparse
+import pkgutil
+import time
+import threading
+import SocketServer
+import cStringIO
+import pymunin
+import pymunin.plugins
+from pymunin import MuninPlugin
+from pymunin.confcache import MuninConfigCache, config_cache_enabled
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+defaultNodeHost = '127.0.0.1'
+defaultNodePort = 4950
+defaultConfFile = '/etc/pymunin/node.conf'
+nodeCapabilities = ('multigraph', 'dirtyconfig', 'spool')
+
+
+def load_plugin_classes(package=pymunin.plugins):
+    """Import plugin modules in package and return dictionary mapping plugin
+    names to MuninPlugin child classes.
+
+    @param package: Package containing the plugin modules.
+    @return:        Dictionary of plugin classes indexed by plugin name.
+
+    """
+    classes = {}
+    for (importer, modname, ispkg) in pkgutil.iter_modules(package.__path__): #@UnusedVariable
+        modpath = "%s.%s" % (package.__name__, modname)
+        try:
+            __import__(modpath)
+        except Exception:
+            # Plugins with unavailable dependencies are not served.
+            continue
+        module = sys.modules[modpath]
+        for obj in module.__dict__.values():
+            if (isinstance(obj, type(MuninPlugin)) and issubclass(obj, MuninPlugin)
+                and obj.__module__ == modpath and obj.plugin_name is not None):
+                classes[obj.plugin_name] = obj
+    return classes
+
+
+def parse_conf(path):
+    """Parse Munin Node plugin configuration file.
+
+    @param path: Path of configuration file.
+    @return:     List of (section, env) pairs in file order.
+
+    """
+    sections = []
+    env = None
+    try:
+        fp = open(path, 'r')
+        data = fp.read()
+        fp.close()
+    except:
+        raise IOError('Failed reading configuration from file: %s' % path)
+    for line in data.splitlines():
+        line = line.strip()
+        if len(line) == 0 or line.startswith('#'):
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            env = {}
+            sections.append((line[1:-1].strip(), env))
+        elif env is not None and line.startswith('env.'):
+            elems = line[len('env.'):].split(None, 1)
+            if len(elems) == 2:
+                env[elems[0]] = elems[1]
+            else:
+                env[elems[0]] = ''
+    return sections
+
+
+class MuninNode:
+    """Class that serves multiple PyMunin Plugins from one process."""
+
+    def __init__(self, conf_sections=None, plugin_names=None, debug=False):
+        """Initialize Munin Node.
+
+        @param conf_sections: List of (section, env) pairs parsed from the
+                              plugin configuration file.
+        @param plugin_names:  List of plugin names to serve. The plugins
+                              defined in the configuration are served if None.
+        @param debug:         Print debugging messages if True.
+
+        """
+        self._debug = debug
+        self._lock = threading.Lock()
+        self._classes = load_plugin_classes()
+        self._confSections = conf_sections or []
+        self._hostname = socket.getfqdn()
+        self._plugins = {}
+        self._instances = {}
+        self._samplers = {}
+        if plugin_names is None:
+            plugin_names = [name for (name, env) in self._confSections #@UnusedVariable
+                            if not self._isGlob(name)]
+        for name in plugin_names:
+            cls = self._getPluginClass(name)
+            if cls is not None:
+                self._plugins[name] = cls
+                interval = self._getPluginEnv(name).get('sample_interval')
+                if interval is not None:
+                    self._samplers[name] = int(interval)
+
+    def _isGlob(self, name):
+        """Returns True if section name contains wildcard characters.
+
+        @param name: Section name.
+        @return:     Boolean
+
+        """
+        for char in '*?[':
+            if char in name:
+                return True
+        return False
+
+    def _getPluginClass(self, name):
+        """Returns plugin class for plugin name, resolving wildcard plugins by
+        prefix.
+
+        @param name: Plugin name.
+        @return:     MuninPlugin child class or None.
+
+        """
+        cls = self._classes.get(name)
+        if cls is None:
+            for (plugin_name, plugin_cls) in self._classes.iteritems():
+                if plugin_name.endswith('_') and name.startswith(plugin_name):
+                    return plugin_cls
+        return cls
+
+    def _getPluginEnv(self, name):
+        """Returns environment for plugin, merging the base environment of the
+        node with the variables from matching configuration sections.
+
+        @param name: Plugin name.
+        @return:     Dictionary of environment variables.
+
+        """
+        env = dict(os.environ)
+        # The state file of the node process must not be shared by plugins.
+        env.pop('MUNIN_STATEFILE', None)
+        for (section, section_env) in self._confSections:
+            if self._isGlob(section) and fnmatch.fnmatch(name, section):
+                env.update(section_env)
+        for (section, section_env) in self._confSections:
+            if section == name:
+                env.update(section_env)
+        return env
+
+    def _getPlugin(self, name):
+        """Returns plugin instance, reusing previously created instances for
+        reusable plugin classes.
+
+        @param name: Plugin name.
+        @return:     MuninPlugin instance.
+
+        """
+        plugin = self._instances.get(name)
+        if plugin is None:
+            cls = self._plugins[name]
+            plugin = cls([name,], self._getPluginEnv(name), self._debug)
+            plugin.endInit()
+            if cls.isReusable:
+                self._instances[name] = plugin
+        return plugin
+
+    def getHostname(self):
+        """Returns host name for node.
+
+        @return: Host name.
+
+        """
+        return self._hostname
+
+    def getPluginList(self, multigraph=True):
+        """Returns list of served plugin names.
+
+        @param multigraph: Include multigraph plugins if True.
+        @return:           List of plugin names.
+
+        """
+        return sorted([name for (name, cls) in self._plugins.iteritems()
+                       if multigraph or not cls.isMultigraph])
+
+    def hasPlugin(self, name):
+        """Returns True if plugin with name is served by node.
+
+        @param name: Plugin name.
+        @return:     Boolean
+
+        """
+        return self._plugins.has_key(name)
+
+    def runPlugin(self, name, oper, dirty_config=False, timestamp=0):
+        """Execute config, fetch, sample or spoolfetch operation for plugin and 
+        return output.
+
+        @param name:         Plugin name.
+        @param oper:         Operation: config, fetch, sample or spoolfetch.
+        @param dirty_config: Append values to config output if True.
+        @param timestamp:    Start time for spoolfetch operation.
+        @return:             Plugin output text.
+
+        """
+        if oper == 'config' and not dirty_config:
+            env = self._getPluginEnv(name)
+            if config_cache_enabled(env):
+                text = MuninConfigCache(self._plugins[name], [name,], 
+                                        env).retrieve()
+                if text is not None:
+                    return text
+        self._lock.acquire()
+        try:
+            out = cStringIO.StringIO()
+            try:
+                plugin = self._getPlugin(name)
+                plugin.setOutput(out)
+                if oper == 'config':
+                    plugin.config()
+                    if dirty_config:
+                        plugin.fetch()
+                elif oper == 'sample':
+                    plugin.sample(1)
+                elif oper == 'spoolfetch':
+                    plugin.spoolfetch(timestamp)
+                else:
+                    plugin.fetch()
+                return out.getvalue()
+            except:
+                # Discard instances in inconsistent state.
+                self._instances.pop(name, None)
+                raise
+        finally:
+            self._lock.release()
+
+    def getSampledPluginList(self):
+        """Returns list of names of plugins sampled by the node.
+        
+        @return: List of plugin names.
+        
+        """
+        return sorted(self._samplers.keys())
+    
+    def startSampler(self):
+        """Start background thread for sampling plugins configured with the 
+        sample_interval environment variable.
+        
+        """
+        if self._samplers:
+            thread = threading.Thread(target=self._runSampler)
+            thread.setDaemon(True)
+            thread.start()
+    
+    def _runSampler(self):
+        """Sample plugins on their configured intervals until the process
+        terminates.
+        
+        """
+        next_run = dict.fromkeys(self._samplers.keys(), time.time())
+        while True:
+            now = time.time()
+            for (name, interval) in self._samplers.iteritems():
+                if next_run[name] <= now:
+                    next_run[name] = now + interval
+                    try:
+                        self.runPlugin(name, 'sample')
+                    except Exception, e:
+                        if self._debug:
+                            print >> sys.stderr, ("Sampling of plugin %s "
+                                                  "failed: %s" % (name, str(e)))
+            time.sleep(max(min(next_run.values()) - time.time(), 0.1))
+
+
+class MuninNodeHandler(SocketServer.StreamRequestHandler):
+    """Handler implementing the Munin Node text protocol."""
+
+    def handle(self):
+        """Serve commands from Munin Master connection."""
+        node = self.server.node
+        caps = ()
+        self._write("# munin node at %s\n" % node.getHostname())
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            args = line.split()
+            if len(args) == 0:
+                continue
+            cmd = args[0].lower()
+            if cmd in ('quit', '.'):
+                break
+            elif cmd == 'cap':
+                caps = [cap for cap in args[1:] if cap in nodeCapabilities]
+                self._write("cap %s\n" % ' '.join(nodeCapabilities))
+            elif cmd == 'list':
+                self._write("%s\n" % ' '.join(
+                            node.getPluginList('multigraph' in caps)))
+            elif cmd == 'nodes':
+                self._write("%s\n.\n" % node.getHostname())
+            elif cmd == 'version':
+                self._write("munins node on %s version: %s (pymunin)\n"
+                            % (node.getHostname(), pymunin.__version__))
+            elif cmd == 'spoolfetch':
+                if len(args) < 2 or not args[1].isdigit():
+                    self._write("# Invalid timestamp\n.\n")
+                    continue
+                lines = []
+                for name in node.getSampledPluginList():
+                    try:
+                        out = node.runPlugin(name, cmd, timestamp=int(args[1]))
+                    except Exception, e:
+                        lines.append("# Error: %s" 
+                                     % str(e).replace('\n', ' '))
+                        continue
+                    lines.extend([line for line in out.splitlines() if line])
+                lines.append('.')
+                self._write("\n".join(lines) + "\n")
+            elif cmd in ('config', 'fetch'):
+                if len(args) < 2 or not node.hasPlugin(args[1]):
+                    self._write("# Unknown service\n.\n")
+                    continue
+                try:
+                    out = node.runPlugin(args[1], cmd, 'dirtyconfig' in caps)
+                except Exception, e:
+                    self._write("# Error: %s\n.\n" % str(e).replace('\n', ' '))
+                    continue
+                lines = [line for line in out.splitlines() if line]
+                lines.append('.')
+                self._write("\n".join(lines) + "\n")
+            else:
+                self._write("# Unknown command. Try cap, list, nodes, config, "
+                            "fetch, spoolfetch, version or quit\n")
+
+    def _write(self, text):
+        """Write response to Munin Master.
+
+        @param text: Response text.
+
+        """
+        self.wfile.write(text)
+        self.wfile.flush()
+
+
+class MuninNodeServer(SocketServer.TCPServer):
+    """TCP Server for Munin Node."""
+    allow_reuse_address = True
+
+    def __init__(self, address, node):
+        """Initialize server.
+
+        @param address: (host, port) tuple.
+        @param node:    MuninNode instance.
+
+        """
+        self.node = node
+        SocketServer.TCPServer.__init__(self, address, MuninNodeHandler)
+
+
+class MuninNodeUnixServer(SocketServer.UnixStreamServer):
+    """UNIX Socket Server for Munin Node."""
+
+    def __init__(self, socket_file, node):
+        """Initialize server.
+
+        @param socket_file: Path of UNIX socket file.
+        @param node:        MuninNode instance.
+
+        """
+        self.node = node
+        if os.path.exists(socket_file):
+            os.unlink(socket_file)
+        SocketServer.UnixStreamServer.__init__(self, socket_file,
+                                               MuninNodeHandler)
+
+
+def main(argv=None):
+    """Main Block for pymunin-node daemon.
+
+    @param argv: List of command line arguments.
+
+    """
+    if argv is None:
+        argv = sys.argv
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--config', dest='config', default=defaultConfFile,
+                      help="Plugin configuration file. (Default: %default)")
+    parser.add_option('-H', '--host', dest='host', default=defaultNodeHost,
+                      help="Listen address. (Default: %default)")
+    parser.add_option('-p', '--port', dest='port', type='int',
+                      default=defaultNodePort,
+                      help="Listen port. (Default: %default)")
+    parser.add_option('-s', '--socket', dest='socket_file', default=None,
+                      help="Listen on UNIX socket file instead of TCP port.")
+    parser.add_option('-P', '--plugins', dest='plugins', default=None,
+                      help="Comma separated list of plugins to serve. "
+                           "(Default: plugins defined in configuration.)")
+    parser.add_option('-d', '--debug', dest='debug', action='store_true',
+                      default=False, help="Print debugging messages.")
+    (opts, args) = parser.parse_args(argv[1:]) #@UnusedVariable
+    if os.path.exists(opts.config):
+        sections = parse_conf(opts.config)
+    else:
+        sections = []
+    if opts.plugins is not None:
+        plugin_names = [name.strip() for name in opts.plugins.split(',')]
+    else:
+        plugin_names = None
+    node = MuninNode(sections, plugin_names, opts.debug)
+    node.startSampler()
+    if opts.socket_file is not None:
+        server = MuninNodeUnixServer(opts.socket_file, node)
+    else:
+        server = MuninNodeServer((opts.host, opts.port), node)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -72,6 +72,7 @@ class MuninApachePlugin(MuninPlugin):
     plugin_name = 'apachestats'
     isMultigraph = True
     isMultiInstance = True
+    isReusable = True
 
     def __init__(self, argv=(), env=None, debug=False):
         """Populate Munin Plugin with MuninGraph instances.
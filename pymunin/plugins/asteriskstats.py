@@ -218,13 +218,9 @@ class MuninAsteriskPlugin(MuninPlugin):
             self.appendGraph('asterisk_voicemail', graph)
 
         if self.graphEnabled('asterisk_trunks') and len(self._trunkList) > 0:
-            graph = MuninGraph('Asterisk - Trunks', self._category,
-                info='Asterisk - Active calls on trunks.',
-                args='--base 1000 --lower-limit 0',
-                autoFixNames = True)
-            for trunk in self._trunkList:
-                graph.addField(trunk[0], trunk[0], type='GAUGE', draw='AREASTACK')
-            self.appendGraph('asterisk_trunks', graph)
+            self.appendGraphSpec('asterisk_trunks', 
+                                 [trunk[0] for trunk in self._trunkList],
+                                 self._buildTrunksGraph, autoFixNames = True)
         
         self._queues = None
         self._queue_list = None
@@ -238,39 +234,26 @@ class MuninAsteriskPlugin(MuninPlugin):
             self._queue_list = [queue for queue in self._queues.keys()
                                 if self.envCheckFilter('queues', queue)]
             self._queue_list.sort()
-            if self.graphEnabled('asterisk_queue_abandon_pcent'):
-                self._queues_prev = self.restoreState()
-                if self._queues_prev is None:
-                    self._queues_prev = self._queues
-                self.saveState(self._queues)
         
         if self._queues is not None and len(self._queue_list) > 0:
             if self.graphEnabled('asterisk_queue_len'):
-                graph = MuninGraph('Asterisk - Queues - Calls in Queue', self._category,
-                    info='Asterisk - Queues - Number of calls in queues.',
-                    args='--base 1000 --lower-limit 0')
-                for queue in self._queue_list:
-                    graph.addField(queue, queue, type='GAUGE', draw='AREASTACK',
-                                   info='Number of calls in queue %s.' % queue)
-                self.appendGraph('asterisk_queue_len', graph)
+                self.appendGraphSpec('asterisk_queue_len', self._queue_list,
+                    lambda: self._buildQueueGraph(
+                        'Asterisk - Queues - Calls in Queue',
+                        'Asterisk - Queues - Number of calls in queues.',
+                        'AREASTACK', 'Number of calls in queue %s.'))
             if self.graphEnabled('asterisk_queue_avg_hold'):
-                graph = MuninGraph('Asterisk - Queues - Average Hold Time (sec)', 
-                    self._category,
-                    info='Asterisk - Queues - Average Hold Time.',
-                    args='--base 1000 --lower-limit 0')
-                for queue in self._queue_list:
-                    graph.addField(queue, queue, type='GAUGE', draw='LINE2',
-                                   info='Average hold time for queue %s.' % queue)
-                self.appendGraph('asterisk_queue_avg_hold', graph)
+                self.appendGraphSpec('asterisk_queue_avg_hold', self._queue_list,
+                    lambda: self._buildQueueGraph(
+                        'Asterisk - Queues - Average Hold Time (sec)',
+                        'Asterisk - Queues - Average Hold Time.',
+                        'LINE2', 'Average hold time for queue %s.'))
             if self.graphEnabled('asterisk_queue_avg_talk'):
-                graph = MuninGraph('Asterisk - Queues - Average Talk Time (sec)', 
-                    self._category,
-                    info='Asterisk - Queues - Average Talk Time.).',
-                    args='--base 1000 --lower-limit 0')
-                for queue in self._queue_list:
-                    graph.addField(queue, queue, type='GAUGE', draw='LINE2',
-                                   info='Average talk time for queue %s.' % queue)
-                self.appendGraph('asterisk_queue_avg_talk', graph)
+                self.appendGraphSpec('asterisk_queue_avg_talk', self._queue_list,
+                    lambda: self._buildQueueGraph(
+                        'Asterisk - Queues - Average Talk Time (sec)',
+                        'Asterisk - Queues - Average Talk Time.).',
+                        'LINE2', 'Average talk time for queue %s.'))
             if self.graphEnabled('asterisk_queue_calls'):
                 graph = MuninGraph('Asterisk - Queues - Calls per Minute', 
                     self._category, period='minute',
@@ -282,15 +265,15 @@ class MuninAsteriskPlugin(MuninPlugin):
                                info='Answered calls per minute.')
                 self.appendGraph('asterisk_queue_calls', graph)
             if self.graphEnabled('asterisk_queue_abandon_pcent'):
-                graph = MuninGraph('Asterisk - Queues - Abandoned Calls (%)', 
-                    self._category,
-                    info='Asterisk - Queues - Abandoned calls vs, total calls.',
-                    args='--base 1000 --lower-limit 0')
+                self.appendGraphSpec('asterisk_queue_abandon_pcent', 
+                                     self._queue_list,
+                    lambda: self._buildQueueGraph(
+                        'Asterisk - Queues - Abandoned Calls (%)',
+                        'Asterisk - Queues - Abandoned calls vs, total calls.',
+                        'LINE2', 'Abandoned vs. total calls for queue %s.'))
                 for queue in self._queue_list:
-                    graph.addField(queue, queue, type='GAUGE', draw='LINE2',
-                                   info='Abandoned vs. total calls for queue %s.' 
-                                        % queue)
-                self.appendGraph('asterisk_queue_abandon_pcent', graph)
+                    self.declareRatioField('asterisk_queue_abandon_pcent', 
+                                           queue, scale=100, default=0)
         
         if self._ami.hasFax():
             if self.graphEnabled('asterisk_fax_attempts'):
@@ -306,6 +289,37 @@ class MuninAsteriskPlugin(MuninPlugin):
                                info='Failed fax attempts per minute.')
                 self.appendGraph('asterisk_fax_attempts', graph)
 
+    def _buildTrunksGraph(self):
+        """Build graph for active calls on trunks.
+        
+        @return: MuninGraph instance.
+        
+        """
+        graph = MuninGraph('Asterisk - Trunks', self._category,
+            info='Asterisk - Active calls on trunks.',
+            args='--base 1000 --lower-limit 0',
+            autoFixNames = True)
+        for trunk in self._trunkList:
+            graph.addField(trunk[0], trunk[0], type='GAUGE', draw='AREASTACK')
+        return graph
+    
+    def _buildQueueGraph(self, title, info, draw, field_info):
+        """Build graph with one field for each queue.
+        
+        @param title:      Graph title.
+        @param info:       Graph info.
+        @param draw:       Graph type for fields.
+        @param field_info: Field info format string with placeholder for queue.
+        @return:           MuninGraph instance.
+        
+        """
+        graph = MuninGraph(title, self._category, info=info,
+                           args='--base 1000 --lower-limit 0')
+        for queue in self._queue_list:
+            graph.addField(queue, queue, type='GAUGE', draw=draw,
+                           info=field_info % queue)
+        return graph
+
     def retrieveVals(self):
         """Retrieve values for graphs."""
         if self.hasGraph('asterisk_calls') or self.hasGraph('asterisk_channels'):
@@ -395,19 +409,10 @@ class MuninAsteriskPlugin(MuninPlugin):
                     total_abandon += stats.get('calls_abandoned')
                     total_answer += stats.get('calls_completed')
                 if self.hasGraph('asterisk_queue_abandon_pcent'):
-                    prev_stats = self._queues_prev.get(queue)
-                    val = 0
-                    if prev_stats is not None:
-                        abandon = (stats.get('calls_abandoned', 0) -
-                                   prev_stats.get('calls_abandoned', 0))
-                        answer = (stats.get('calls_completed', 0) -
-                                  prev_stats.get('calls_completed', 0))
-                        if answer >= 0 and abandon >= 0:
-                            total = abandon + answer
-                            if total > 0:
-                                val = 100.0 * float(abandon) / float(total)
-                    self.setGraphVal('asterisk_queue_abandon_pcent', 
-                                     queue, val)
+                    abandon = stats.get('calls_abandoned', 0)
+                    answer = stats.get('calls_completed', 0)
+                    self.setGraphVal('asterisk_queue_abandon_pcent', queue, 
+                                     (abandon, abandon + answer))
             if self.hasGraph('asterisk_queue_calls'):
                     self.setGraphVal('asterisk_queue_calls', 'abandon', 
                                      total_abandon)
@@ -44,10 +44,12 @@ Environment Variables
 #%# family=auto
 #%# capabilities=autoconf nosuggest
 
+import os
 import sys
 from pymunin import (MuninGraph, MuninPlugin, muninMain, 
                      fixLabel, maxLabelLenGraphSimple, maxLabelLenGraphDual)
-from pysysinfo.diskio import DiskIOinfo
+from pysysinfo.diskio import (DiskIOinfo, diskStatsFile, devmapperDir)
+from pysysinfo.filesystem import mountsFile
 
 __author__ = "Ali Onur Uyar"
 __copyright__ = "Copyright 2011, Ali Onur Uyar"
@@ -85,24 +87,21 @@ class MuninDiskIOplugin(MuninPlugin):
         self._diskList = self._info.getDiskList()
         if self._diskList:
             self._diskList.sort()
-            self._configDevRequests('disk', 'Disk', self._diskList)
-            self._configDevBytes('disk', 'Disk', self._diskList)
-            self._configDevActive('disk', 'Disk', self._diskList)
+            self._configDevAll('disk', 'Disk', self._diskList, 
+                               'getDiskStats')
             
         self._mdList = self._info.getMDlist()
         if self._mdList:
             self._mdList.sort()
-            self._configDevRequests('md', 'MD', self._mdList)
-            self._configDevBytes('md', 'MD', self._mdList)
-            self._configDevActive('md', 'MD', self._mdList)
+            self._configDevAll('md', 'MD', self._mdList, 
+                               'getMDstats')
             
         devlist = self._info.getPartitionList()
         if devlist:
             devlist.sort()
             self._partList = [x[1] for x in devlist]
-            self._configDevRequests('part', 'Partition', self._partList)
-            self._configDevBytes('part', 'Partition', self._partList)
-            self._configDevActive('part', 'Partition', self._partList)
+            self._configDevAll('part', 'Partition', self._partList, 
+                               'getPartitionStats')
         else:
             self._partList = None
             
@@ -110,35 +109,65 @@ class MuninDiskIOplugin(MuninPlugin):
         if devlist:
             devlist.sort()
             self._lvList = ["-".join(x) for x in devlist]
-            self._configDevRequests('lv', 'LV', self._lvList)
-            self._configDevBytes('lv', 'LV', self._lvList)
-            self._configDevActive('lv', 'LV', self._lvList)
+            self._configDevAll('lv', 'LV', self._lvList, 
+                               'getLVstats')
         else:
             self._lvList = None
         
         self._fsList = self._info.getFilesystemList()
         self._fsList.sort()
-        self._configDevRequests('fs', 'Filesystem', self._fsList)
-        self._configDevBytes('fs', 'Filesystem', self._fsList)
-        self._configDevActive('fs', 'Filesystem', self._fsList)
+        self._configDevAll('fs', 'Filesystem', self._fsList, 
+                           'getFilesystemStats')
         
                 
-    def retrieveVals(self):
-        """Retrieve values for graphs."""
-        if self._diskList:
-            self._fetchDevAll('disk', self._diskList, 
-                              self._info.getDiskStats)
-        if self._mdList:
-            self._fetchDevAll('md', self._mdList, 
-                              self._info.getMDstats)
-        if self._partList:
-            self._fetchDevAll('part', self._partList, 
-                              self._info.getPartitionStats) 
-        if self._lvList:
-            self._fetchDevAll('lv', self._lvList, 
-                              self._info.getLVstats)
-        self._fetchDevAll('fs', self._fsList, 
-                          self._info.getFilesystemStats)
+    def getConfigCacheKey(cls, env):
+        """Returns the block devices, device-mapper devices and mounted 
+        filesystems, which determine the graphs of the plugin.
+        
+        @param env: Dictionary of environment variables.
+        @return:    Nested list of device and filesystem names.
+        
+        """
+        key = []
+        for path in (diskStatsFile, mountsFile):
+            try:
+                fp = open(path, 'r')
+                data = fp.read()
+                fp.close()
+            except IOError:
+                data = ''
+            key.append([line.split()[:3] for line in data.splitlines()])
+        if os.path.isdir(devmapperDir):
+            key.append(sorted(os.listdir(devmapperDir)))
+        return key
+    getConfigCacheKey = classmethod(getConfigCacheKey)
+                
+    def _configDevAll(self, namestr, titlestr, devlist, statsfunc):
+        """Generate configuration for all I/O stats of device type and register
+        fetch task for retrieving the stats.
+        
+        The graphs are not registered for commands that do not require them.
+        
+        @param namestr:   Field name component indicating device type.
+        @param titlestr:  Title component indicating device type.
+        @param devlist:   List of devices.
+        @param statsfunc: Name of DiskIOinfo method for retrieving stats for 
+                          device.
+        
+        """
+        if self.graphsRequired():
+            self._configDevRequests(namestr, titlestr, devlist)
+            self._configDevBytes(namestr, titlestr, devlist)
+            self._configDevActive(namestr, titlestr, devlist)
+            graphs = [name for name in ('diskio_%s_requests' % namestr,
+                                        'diskio_%s_bytes' % namestr,
+                                        'diskio_%s_active' % namestr)
+                      if self.hasGraph(name)]
+            if graphs:
+                self.registerFetchTask(namestr,
+                    lambda: self._retrieveDevAll(statsfunc, devlist),
+                    lambda dev_stats: self._fetchDevAll(namestr, dev_stats),
+                    graphs)
                 
     def _configDevRequests(self, namestr, titlestr, devlist):
         """Generate configuration for I/O Request stats.
@@ -150,25 +179,43 @@ class MuninDiskIOplugin(MuninPlugin):
         """
         name = 'diskio_%s_requests' % namestr
         if self.graphEnabled(name):
-            graph = MuninGraph('Disk I/O - %s - Requests' % titlestr, self._category,
-                info='Disk I/O - %s Throughput, Read / write requests per second.' 
-                     % titlestr,
-                args='--base 1000 --lower-limit 0',
-                vlabel='reqs/sec read (-) / write (+)', printf='%6.1lf',
-                autoFixNames = True)
+            fields = []
             for dev in devlist:
-                graph.addField(dev + '_read',
-                               fixLabel(dev, maxLabelLenGraphDual, 
-                                        repl = '..', truncend=False,
-                                        delim = self._labelDelim.get(namestr)), 
-                               draw='LINE2', type='DERIVE', min=0, graph=False)
-                graph.addField(dev + '_write',
-                               fixLabel(dev, maxLabelLenGraphDual, 
-                                        repl = '..', truncend=False,
-                                        delim = self._labelDelim.get(namestr)),
-                               draw='LINE2', type='DERIVE', min=0, 
-                               negative=(dev + '_read'),info=dev)
-            self.appendGraph(name, graph)
+                fields.extend((dev + '_read', dev + '_write'))
+            self.appendGraphSpec(name, fields, 
+                                 lambda: self._buildDevRequests(namestr, 
+                                                                titlestr, 
+                                                                devlist),
+                                 autoFixNames = True)
+            
+    def _buildDevRequests(self, namestr, titlestr, devlist):
+        """Build graph for I/O Request stats.
+        
+        @param namestr:  Field name component indicating device type.
+        @param titlestr: Title component indicating device type.
+        @param devlist:  List of devices.
+        @return:         MuninGraph instance.
+        
+        """
+        graph = MuninGraph('Disk I/O - %s - Requests' % titlestr, self._category,
+            info='Disk I/O - %s Throughput, Read / write requests per second.' 
+                 % titlestr,
+            args='--base 1000 --lower-limit 0',
+            vlabel='reqs/sec read (-) / write (+)', printf='%6.1lf',
+            autoFixNames = True)
+        for dev in devlist:
+            graph.addField(dev + '_read',
+                           fixLabel(dev, maxLabelLenGraphDual, 
+                                    repl = '..', truncend=False,
+                                    delim = self._labelDelim.get(namestr)), 
+                           draw='LINE2', type='DERIVE', min=0, graph=False)
+            graph.addField(dev + '_write',
+                           fixLabel(dev, maxLabelLenGraphDual, 
+                                    repl = '..', truncend=False,
+                                    delim = self._labelDelim.get(namestr)),
+                           draw='LINE2', type='DERIVE', min=0, 
+                           negative=(dev + '_read'),info=dev)
+        return graph
 
     def _configDevBytes(self, namestr, titlestr, devlist):
         """Generate configuration for I/O Throughput stats.
@@ -180,25 +227,43 @@ class MuninDiskIOplugin(MuninPlugin):
         """
         name = 'diskio_%s_bytes' % namestr
         if self.graphEnabled(name):
-            graph = MuninGraph('Disk I/O - %s - Throughput' % titlestr, self._category,
-                info='Disk I/O - %s Throughput, bytes read / written per second.'
-                     % titlestr,
-                args='--base 1000 --lower-limit 0', printf='%6.1lf',
-                vlabel='bytes/sec read (-) / write (+)',
-                autoFixNames = True)
+            fields = []
             for dev in devlist:
-                graph.addField(dev + '_read', 
-                               fixLabel(dev, maxLabelLenGraphDual, 
-                                        repl = '..', truncend=False,
-                                        delim = self._labelDelim.get(namestr)),
-                               draw='LINE2', type='DERIVE', min=0, graph=False)
-                graph.addField(dev + '_write', 
-                               fixLabel(dev, maxLabelLenGraphDual, 
-                                        repl = '..', truncend=False,
-                                        delim = self._labelDelim.get(namestr)),
-                               draw='LINE2', type='DERIVE', min=0, 
-                               negative=(dev + '_read'), info=dev)
-            self.appendGraph(name, graph)
+                fields.extend((dev + '_read', dev + '_write'))
+            self.appendGraphSpec(name, fields, 
+                                 lambda: self._buildDevBytes(namestr, 
+                                                             titlestr, 
+                                                             devlist),
+                                 autoFixNames = True)
+            
+    def _buildDevBytes(self, namestr, titlestr, devlist):
+        """Build graph for I/O Throughput stats.
+        
+        @param namestr:  Field name component indicating device type.
+        @param titlestr: Title component indicating device type.
+        @param devlist:  List of devices.
+        @return:         MuninGraph instance.
+        
+        """
+        graph = MuninGraph('Disk I/O - %s - Throughput' % titlestr, self._category,
+            info='Disk I/O - %s Throughput, bytes read / written per second.'
+                 % titlestr,
+            args='--base 1000 --lower-limit 0', printf='%6.1lf',
+            vlabel='bytes/sec read (-) / write (+)',
+            autoFixNames = True)
+        for dev in devlist:
+            graph.addField(dev + '_read', 
+                           fixLabel(dev, maxLabelLenGraphDual, 
+                                    repl = '..', truncend=False,
+                                    delim = self._labelDelim.get(namestr)),
+                           draw='LINE2', type='DERIVE', min=0, graph=False)
+            graph.addField(dev + '_write', 
+                           fixLabel(dev, maxLabelLenGraphDual, 
+                                    repl = '..', truncend=False,
+                                    delim = self._labelDelim.get(namestr)),
+                           draw='LINE2', type='DERIVE', min=0, 
+                           negative=(dev + '_read'), info=dev)
+        return graph
             
     def _configDevActive(self, namestr, titlestr, devlist):
         """Generate configuration for I/O Queue Length.
@@ -210,30 +275,61 @@ class MuninDiskIOplugin(MuninPlugin):
         """
         name = 'diskio_%s_active' % namestr
         if self.graphEnabled(name):
-            graph = MuninGraph('Disk I/O - %s - Queue Length' % titlestr, 
-                self._category,
-                info='Disk I/O - Number  of I/O Operations in Progress for every %s.'
-                     % titlestr,
-                args='--base 1000 --lower-limit 0', printf='%6.1lf',
-                autoFixNames = True)
-            for dev in devlist:
-                graph.addField(dev, 
-                               fixLabel(dev, maxLabelLenGraphSimple, 
-                                        repl = '..', truncend=False,
-                                        delim = self._labelDelim.get(namestr)), 
-                               draw='AREASTACK', type='GAUGE', info=dev)
-            self.appendGraph(name, graph)
+            self.appendGraphSpec(name, devlist, 
+                                 lambda: self._buildDevActive(namestr, 
+                                                              titlestr, 
+                                                              devlist),
+                                 autoFixNames = True)
+            
+    def _buildDevActive(self, namestr, titlestr, devlist):
+        """Build graph for I/O Queue Length.
+        
+        @param namestr:  Field name component indicating device type.
+        @param titlestr: Title component indicating device type.
+        @param devlist:  List of devices.
+        @return:         MuninGraph instance.
+        
+        """
+        graph = MuninGraph('Disk I/O - %s - Queue Length' % titlestr, 
+            self._category,
+            info='Disk I/O - Number  of I/O Operations in Progress for every %s.'
+                 % titlestr,
+            args='--base 1000 --lower-limit 0', printf='%6.1lf',
+            autoFixNames = True)
+        for dev in devlist:
+            graph.addField(dev, 
+                           fixLabel(dev, maxLabelLenGraphSimple, 
+                                    repl = '..', truncend=False,
+                                    delim = self._labelDelim.get(namestr)), 
+                           draw='AREASTACK', type='GAUGE', info=dev)
+        return graph
 
-    def _fetchDevAll(self, namestr, devlist, statsfunc):
+    def _retrieveDevAll(self, statsfunc, devlist):
+        """Retrieve I/O stats for devices in fetch task.
+        
+        The stats and the device mappings needed for the device type (LVM and 
+        device-mapper devices, mounted filesystems) are read by the task, so 
+        that a slow source only delays the graphs of the device type.
+        
+        @param statsfunc: Name of DiskIOinfo method for retrieving stats for 
+                          device.
+        @param devlist:   List of devices.
+        @return:          List of (device, stats) pairs.
+        
+        """
+        func = getattr(DiskIOinfo(), statsfunc)
+        return [(dev, func(dev)) for dev in devlist]
+
+    def _fetchDevAll(self, namestr, dev_stats):
         """Initialize I/O stats for devices.
         
         @param namestr:   Field name component indicating device type.
-        @param devlist:   List of devices.
-        @param statsfunc: Function for retrieving stats for device.
+        @param dev_stats: List of (device, stats) pairs.
         
         """
-        for dev in devlist:
-            stats = statsfunc(dev)
+        for (dev, stats) in dev_stats:
+            if stats is None:
+                continue
             name = 'diskio_%s_requests' % namestr
             if self.hasGraph(name):
                 self.setGraphVal(name, dev + '_read', stats['rios'])
@@ -72,6 +72,7 @@ class MuninLighttpdPlugin(MuninPlugin):
     plugin_name = 'lighttpdstats'
     isMultigraph = True
     isMultiInstance = True
+    isReusable = True
 
     def __init__(self, argv=(), env=None, debug=False):
         """Populate Munin Plugin with MuninGraph instances.
@@ -77,6 +77,7 @@ class MuninMemcachedPlugin(MuninPlugin):
     plugin_name = 'memcachedstats'
     isMultigraph = True
     isMultiInstance = True
+    isReusable = True
 
     def __init__(self, argv=(), env=None, debug=False):
         """Populate Munin Plugin with MuninGraph instances.
@@ -93,17 +94,20 @@ class MuninMemcachedPlugin(MuninPlugin):
         self._socket_file = self.envGet('socket_file', None)
         self._category = 'Memcached'
         
+        # The graphs are built from the stats stored in the previous run; 
+        # the server is queried only if no stats have been stored.
         self._stats = None
-        self._prev_stats = self.restoreState()
-        if self._prev_stats is None:
+        stats = self.restoreState()
+        if not isinstance(stats, dict) or not stats:
             serverInfo = MemcachedInfo(self._host,  self._port, 
                                        self._socket_file)
             self._stats = serverInfo.getStats()
             stats = self._stats
+            if stats is None:
+                raise Exception("Undetermined error accesing stats.")
+            self._statNames = set(self._getCounterStats(stats))
         else:
-            stats = self._prev_stats
-        if stats is None:
-            raise Exception("Undetermined error accesing stats.")
+            self._statNames = set(stats)
         
         if (self.graphEnabled('memcached_connections')  
             and stats.has_key('curr_connections')):
@@ -301,7 +305,21 @@ class MuninMemcachedPlugin(MuninPlugin):
                     graph.addField(fname, fname, draw='LINE2', type='GAUGE', 
                                    info='%s requests - hits vs total.' % fstr)
             self.appendGraph('memcached_hitpct', graph)
+            for fname in graph.getFieldList():
+                self.declareRatioField('memcached_hitpct', fname, 
+                                       scale=100, default=100.0)
             
+    def _getCounterStats(self, stats):
+        """Returns the stats with numeric values.
+        
+        @param stats: Dictionary of stats.
+        @return:      Dictionary of numeric stats.
+        
+        """
+        return dict((key, val) for (key, val) in stats.iteritems()
+                    if isinstance(val, (int, long, float)) 
+                    and not isinstance(val, bool))
+    
     def retrieveVals(self):
         """Retrieve values for graphs."""
         if self._stats is None:
@@ -309,12 +327,18 @@ class MuninMemcachedPlugin(MuninPlugin):
             stats = serverInfo.getStats()
         else:
             stats = self._stats
+            self._stats = None
         if stats is None:
             raise Exception("Undetermined error accesing stats.")        
         stats['set_hits'] = stats.get('total_items')
         if stats.has_key('cmd_set') and stats.has_key('total_items'): 
             stats['set_misses'] = stats['cmd_set'] - stats['total_items']
-        self.saveState(stats)
+        # The stats are stored only when the set of available stats changes,
+        # for building the graphs in the next run.
+        counter_stats = self._getCounterStats(stats)
+        if set(counter_stats) != self._statNames:
+            self.saveState(counter_stats)
+            self._statNames = set(counter_stats)
         if self.hasGraph('memcached_connections'):
             self.setGraphVal('memcached_connections', 'conn', 
                              stats.get('curr_connections'))
@@ -415,7 +439,6 @@ class MuninMemcachedPlugin(MuninPlugin):
             self.setGraphVal('memcached_statauth', 'errors', 
                              stats.get('auth_errors'))
         if self.hasGraph('memcached_hitpct'):
-            prev_stats = self._prev_stats
             for (field_name,  field_hits,  field_misses) in (
                     ('set',  'set_hits',  'set_misses'),
                     ('get',  'get_hits',  'get_misses'), 
@@ -424,19 +447,12 @@ class MuninMemcachedPlugin(MuninPlugin):
                     ('incr',  'incr_hits',  'incr_misses'), 
                     ('decr',  'decr_hits',  'decr_misses')
                 ):
-                val = float(100)
-                if prev_stats:
-                    if (stats.has_key(field_hits) 
-                        and prev_stats.has_key(field_hits)
-                        and stats.has_key(field_misses) 
-                        and prev_stats.has_key(field_misses)):
-                        hits = stats[field_hits] - prev_stats[field_hits]
-                        misses = stats[field_misses] - prev_stats[field_misses]
-                        total = hits + misses
-                        if total > 0:
-                            val = 100.0 * hits / total
-                        self.setGraphVal('memcached_hitpct',  field_name, 
-                                         round(val,  2))
+                hits = stats.get(field_hits)
+                misses = stats.get(field_misses)
+                if (self.graphHasField('memcached_hitpct', field_name)
+                    and hits is not None and misses is not None):
+                    self.setGraphVal('memcached_hitpct',  field_name, 
+                                     (hits, hits + misses))
                         
     def autoconf(self):
         """Implements Munin Plugin Auto-Configuration Option.
@@ -285,14 +285,8 @@ class MuninMySQLplugin(MuninPlugin):
             if self._dbList is None:
                 self._dbList = self._dbconn.getDatabases()
                 self._dbList.sort()
-            graph = MuninGraph('MySQL - Processes per Database', 
-                self._category,
-                info='Number of Threads discriminated by database.',
-                args='--base 1000 --lower-limit 0', autoFixNames=True)
-            for db in self._dbList:
-                graph.addField(db, db, draw='AREASTACK', type='GAUGE', 
-                info="Number of threads attending connections for database %s." % db)
-            self.appendGraph('mysql_proc_db', graph)
+            self.appendGraphSpec('mysql_proc_db', self._dbList, 
+                                 self._buildProcDBgraph, autoFixNames=True)
                 
         if self.graphEnabled('mysql_commits_rollbacks'):
             graph = MuninGraph('MySQL - Commits and Rollbacks', 
@@ -448,6 +442,21 @@ class MuninMySQLplugin(MuninPlugin):
                                    info="Rows %s per second." % field)
                 self.appendGraph('mysql_innodb_row_ops', graph)
                     
+    def _buildProcDBgraph(self):
+        """Build graph for threads discriminated by database.
+        
+        @return: MuninGraph instance.
+        
+        """
+        graph = MuninGraph('MySQL - Processes per Database', 
+            self._category,
+            info='Number of Threads discriminated by database.',
+            args='--base 1000 --lower-limit 0', autoFixNames=True)
+        for db in self._dbList:
+            graph.addField(db, db, draw='AREASTACK', type='GAUGE', 
+            info="Number of threads attending connections for database %s." % db)
+        return graph
+        
     def retrieveVals(self):
         """Retrieve values for graphs."""
         if self._genStats is None:
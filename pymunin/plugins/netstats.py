@@ -4,7 +4,8 @@
 
 Requirements
 
-  - netstat command
+  - NETLINK_SOCK_DIAG support in kernel, /proc/net filesystem or netstat 
+    command
 
 Wild Card Plugin - No
 
@@ -13,6 +14,14 @@ Multigraph Plugin - Graph Structure
 
     - netstat_conn_status
     - netstat_conn_server
+    - netstat_sockets
+    - netstat_sock_memory
+    - netstat_tcp_conn
+    - netstat_tcp_segments
+    - netstat_tcp_listen
+    - netstat_tcp_memory
+    - netstat_udp
+    - netstat_ip_traffic
 
 
 Environment Variables
@@ -36,9 +45,12 @@ Environment Variables
 #%# family=auto
 #%# capabilities=autoconf nosuggest
 
+import os
 import sys
 from pymunin import MuninGraph, MuninPlugin, muninMain
-from pysysinfo.netstat import NetstatInfo
+from pysysinfo.sockdiag import SockDiagInfo
+from pysysinfo import netproto
+from pysysinfo.netproto import NetProtoInfo
 
 __author__ = "Ali Onur Uyar"
 __copyright__ = "Copyright 2011, Ali Onur Uyar"
@@ -56,6 +68,7 @@ class MuninNetstatsPlugin(MuninPlugin):
     """
     plugin_name = 'netstats'
     isMultigraph = True
+    isReusable = True
 
     def __init__(self, argv=(), env=None, debug=False):
         """Populate Munin Plugin with MuninGraph instances.
@@ -118,10 +131,143 @@ class MuninNetstatsPlugin(MuninPlugin):
                         info=('Number of connections for service %s on ports: %s' 
                               % (srv, ','.join(self._srv_dict[srv]))))
                 self.appendGraph('netstat_conn_server', graph)
+        
+        self._protoInfo = NetProtoInfo()
+        self._protoFields = {}
+        self._protoStats = None
+        proto_stats = None
+        for (graph_name, graph_title, graph_info, vlabel, fields) in (
+            ('netstat_tcp_conn', 'TCP - Connection Openings',
+             'TCP connections opened and failed.', 'connections per second',
+             (('Tcp', 'ActiveOpens', 'active', 
+               'Connections opened actively (SYN sent).'),
+              ('Tcp', 'PassiveOpens', 'passive', 
+               'Connections opened passively (SYN received).'),
+              ('Tcp', 'AttemptFails', 'failed', 
+               'Failed connection attempts.'),
+              ('Tcp', 'EstabResets', 'resets', 
+               'Resets of established connections.'))),
+            ('netstat_tcp_segments', 'TCP - Segments',
+             'TCP segments received, sent and retransmitted.',
+             'segments per second',
+             (('Tcp', 'InSegs', 'in', 'Segments received.'),
+              ('Tcp', 'OutSegs', 'out', 'Segments sent.'),
+              ('Tcp', 'RetransSegs', 'retrans', 'Segments retransmitted.'),
+              ('Tcp', 'InErrs', 'inerrs', 'Segments received in error.'),
+              ('Tcp', 'OutRsts', 'outrsts', 'Segments sent with RST flag.'))),
+            ('netstat_tcp_listen', 'TCP - Listen Queue',
+             'Overflows of the accept queue of listening sockets and SYN '
+             'cookies.', 'events per second',
+             (('TcpExt', 'ListenOverflows', 'overflows',
+               'Accept queue overflows.'),
+              ('TcpExt', 'ListenDrops', 'drops',
+               'Connection requests dropped by listening sockets.'),
+              ('TcpExt', 'SyncookiesSent', 'cookiessent', 
+               'SYN cookies sent.'),
+              ('TcpExt', 'SyncookiesRecv', 'cookiesrecv',
+               'SYN cookies received.'),
+              ('TcpExt', 'SyncookiesFailed', 'cookiesfailed',
+               'Invalid SYN cookies received.'))),
+            ('netstat_tcp_memory', 'TCP - Memory Pressure',
+             'Events caused by TCP memory pressure.', 'events per second',
+             (('TcpExt', 'TCPMemoryPressures', 'pressure',
+               'Times TCP entered memory pressure.'),
+              ('TcpExt', 'TCPAbortOnMemory', 'aborts',
+               'Connections aborted due to memory pressure.'),
+              ('TcpExt', 'PruneCalled', 'prunes',
+               'Receive queue prunes due to memory pressure.'),
+              ('TcpExt', 'RcvPruned', 'rcvpruned',
+               'Packets dropped from receive queue after pruning.'),
+              ('TcpExt', 'OfoPruned', 'ofopruned',
+               'Packets dropped from out-of-order queue.'))),
+            ('netstat_udp', 'UDP - Datagrams',
+             'UDP datagrams received and sent and errors.',
+             'datagrams per second',
+             (('Udp', 'InDatagrams', 'in', 'Datagrams received.'),
+              ('Udp', 'OutDatagrams', 'out', 'Datagrams sent.'),
+              ('Udp', 'NoPorts', 'noports', 
+               'Datagrams received for ports without listener.'),
+              ('Udp', 'InErrors', 'inerrs', 'Datagrams received in error.'),
+              ('Udp', 'RcvbufErrors', 'rcvbuferrs',
+               'Datagrams dropped due to full receive buffer.'),
+              ('Udp', 'SndbufErrors', 'sndbuferrs',
+               'Datagrams dropped due to full send buffer.'))),
+            ('netstat_ip_traffic', 'IP - Traffic',
+             'IP traffic received and sent in bytes.',
+             'bytes in (-) / out (+) per second',
+             (('IpExt', 'InOctets', 'in', 'Bytes received.'),
+              ('IpExt', 'OutOctets', 'out', 'Bytes sent.'))),
+            ):
+            if self.graphEnabled(graph_name):
+                if proto_stats is None:
+                    try:
+                        proto_stats = self._protoInfo.getProtoStats()
+                    except IOError:
+                        # No protocol counters; the protocol graphs are 
+                        # skipped.
+                        proto_stats = {}
+                graph = MuninGraph(graph_title, self._category, 
+                                   info=graph_info, vlabel=vlabel,
+                                   args='--base 1000 --lower-limit 0')
+                graph_fields = []
+                for (proto, counter, fname, fdesc) in fields:
+                    if proto_stats.get(proto, {}).has_key(counter):
+                        if graph_name == 'netstat_ip_traffic':
+                            if fname == 'in':
+                                graph.addField(fname, 'bytes', type='DERIVE',
+                                               draw='LINE2', min=0, 
+                                               graph=False, info=fdesc)
+                            else:
+                                graph.addField(fname, 'bytes', type='DERIVE',
+                                               draw='LINE2', min=0, 
+                                               negative='in', info=fdesc)
+                        else:
+                            graph.addField(fname, fname, type='DERIVE', 
+                                           draw='LINE2', min=0, info=fdesc)
+                        graph_fields.append((proto, counter, fname))
+                if graph_fields:
+                    self.appendGraph(graph_name, graph)
+                    self._protoFields[graph_name] = graph_fields
+        
+        # The counters read for populating the graphs are reused in the first
+        # collection.
+        if proto_stats:
+            self._protoStats = proto_stats
+        
+        sockstat_avail = os.access(netproto.sockstatFile, os.R_OK)
+        if sockstat_avail and self.graphEnabled('netstat_sockets'):
+            graph = MuninGraph('Network - Sockets', self._category,
+                               info='Number of sockets in use.',
+                               args='--base 1000 --lower-limit 0')
+            for (fname, fdesc) in (
+                ('tcp', 'IPv4 TCP sockets in use.'),
+                ('tcp6', 'IPv6 TCP sockets in use.'),
+                ('udp', 'IPv4 UDP sockets in use.'),
+                ('udp6', 'IPv6 UDP sockets in use.'),
+                ('orphan', 'TCP sockets not attached to any process.'),
+                ('tw', 'TCP sockets in TIME_WAIT state.')):
+                graph.addField(fname, fname, type='GAUGE', draw='LINE2',
+                               info=fdesc)
+            self.appendGraph('netstat_sockets', graph)
+            
+        if sockstat_avail and self.graphEnabled('netstat_sock_memory'):
+            graph = MuninGraph('Network - Socket Memory', self._category,
+                               info='Memory used by socket buffers in bytes.',
+                               args='--base 1024 --lower-limit 0')
+            for (fname, fdesc) in (
+                ('tcp', 'Memory used by TCP sockets.'),
+                ('udp', 'Memory used by UDP sockets.')):
+                graph.addField(fname, fname, type='GAUGE', draw='LINE2',
+                               info=fdesc)
+            self.appendGraph('netstat_sock_memory', graph)
+
+    def resetVals(self):
+        """Discard the protocol counters cached in the previous collection."""
+        self._protoStats = None
 
     def retrieveVals(self):
         """Retrieve values for graphs."""
-        net_info = NetstatInfo()
+        net_info = SockDiagInfo(exec_cache=self.getExecCache())
         if self.hasGraph('netstat_conn_status'):
             stats = net_info.getTCPportConnStatus(include_listen=True)
             for fname in ('listen', 'established', 'syn_sent', 'syn_recv',
@@ -137,6 +283,31 @@ class MuninNetstatsPlugin(MuninPlugin):
                 for port in self._srv_dict[srv]:
                     numconn += stats.get(port, 0)
                 self.setGraphVal('netstat_conn_server', srv, numconn)
+        if self._protoFields:
+            if self._protoStats is None:
+                self._protoStats = self._protoInfo.getProtoStats()
+            for (graph_name, graph_fields) in self._protoFields.iteritems():
+                for (proto, counter, fname) in graph_fields:
+                    self.setGraphVal(graph_name, fname,
+                                     self._protoStats.get(proto, {}).get(counter))
+        if self.hasGraph('netstat_sockets') or self.hasGraph('netstat_sock_memory'):
+            sock_stats = self._protoInfo.getSockStats()
+            if self.hasGraph('netstat_sockets'):
+                for (fname, proto, key) in (('tcp', 'TCP', 'inuse'),
+                                            ('tcp6', 'TCP6', 'inuse'),
+                                            ('udp', 'UDP', 'inuse'),
+                                            ('udp6', 'UDP6', 'inuse'),
+                                            ('orphan', 'TCP', 'orphan'),
+                                            ('tw', 'TCP', 'tw')):
+                    self.setGraphVal('netstat_sockets', fname,
+                                     sock_stats.get(proto, {}).get(key))
+            if self.hasGraph('netstat_sock_memory'):
+                page_size = os.sysconf('SC_PAGE_SIZE')
+                for (fname, proto) in (('tcp', 'TCP'), ('udp', 'UDP')):
+                    pages = sock_stats.get(proto, {}).get('mem')
+                    if pages is not None:
+                        self.setGraphVal('netstat_sock_memory', fname,
+                                         pages * page_size)
                 
     def autoconf(self):
         """Implements Munin Plugin Auto-Configuration Option.
@@ -144,7 +315,7 @@ class MuninNetstatsPlugin(MuninPlugin):
         @return: True if plugin can be  auto-configured, False otherwise.
                  
         """
-        net_info = NetstatInfo()
+        net_info = SockDiagInfo(exec_cache=self.getExecCache())
         return len(net_info.getStats()) > 0
 
 
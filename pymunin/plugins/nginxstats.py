@@ -81,6 +81,7 @@ class MuninNginxPlugin(MuninPlugin):
     plugin_name = 'nginxstats'
     isMultigraph = True
     isMultiInstance = True
+    isReusable = True
 
     def __init__(self, argv=(), env=None, debug=False):
         """Populate Munin Plugin with MuninGraph instances.
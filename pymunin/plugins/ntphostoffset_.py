@@ -104,7 +104,7 @@ class MuninNTPhostOffsetPlugin(MuninPlugin):
 
     def retrieveVals(self):
         """Retrieve values for graphs."""
-        ntpinfo = NTPinfo()
+        ntpinfo = NTPinfo(exec_cache=self.getExecCache())
         stats = ntpinfo.getHostOffset(self._remoteHost)
         if stats:
             graph_name = 'ntp_host_stratum_%s' % self._remoteHost
@@ -118,7 +118,7 @@ class MuninNTPhostOffsetsPlugin(MuninPlugin):
 
     def retrieveVals(self):
         """Retrieve values for graphs."""
-        ntpinfo = NTPinfo()
+        ntpinfo = NTPinfo(exec_cache=self.getExecCache())
         ntpstats = ntpinfo.getHostOffsets(self._remoteHosts)
         if ntpstats:
             for host in self._remoteHosts:
@@ -141,7 +141,7 @@ class MuninNTPhostOffsetsPlugin(MuninPlugin):
         @return: True if plugin can be  auto-configured, False otherwise.
                  
         """
-        ntpinfo = NTPinfo()
+        ntpinfo = NTPinfo(exec_cache=self.getExecCache())
         ntpstats = ntpinfo.getHostOffsets(self._remoteHosts)
         return len(ntpstats) > 0
 
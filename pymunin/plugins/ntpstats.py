@@ -83,7 +83,7 @@ class MuninNTPstatsPlugin(MuninPlugin):
 
     def retrieveVals(self):
         """Retrieve values for graphs."""
-        ntpinfo = NTPinfo()
+        ntpinfo = NTPinfo(exec_cache=self.getExecCache())
         stats = ntpinfo.getPeerStats()
         if stats:
             if self.hasGraph('ntp_peer_stratum'):
@@ -103,7 +103,7 @@ class MuninNTPstatsPlugin(MuninPlugin):
         @return: True if plugin can be  auto-configured, False otherwise.
                  
         """
-        ntpinfo = NTPinfo()
+        ntpinfo = NTPinfo(exec_cache=self.getExecCache())
         stats = ntpinfo.getPeerStats()
         return len(stats) > 0
 
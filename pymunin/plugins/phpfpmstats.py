@@ -71,6 +71,7 @@ class MuninPHPfpmPlugin(MuninPlugin):
     plugin_name = 'phpfpmstats'
     isMultigraph = True
     isMultiInstance = True
+    isReusable = True
 
     def __init__(self, argv=(), env=None, debug=False):
         """Populate Munin Plugin with MuninGraph instances.
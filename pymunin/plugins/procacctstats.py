@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+"""procacctstats - Munin Plugin to monitor CPU, memory and I/O usage of groups
+of processes.
+
+
+Requirements
+
+  - /proc filesystem
+  - Reading the I/O counters of processes (/proc/[pid]/io) requires the
+    permissions of the owner of the processes; the plugin must be run as root
+    for monitoring I/O of processes of other users.
+
+Wild Card Plugin - No
+
+
+Multigraph Plugin - Graph Structure
+
+    - procacct_cpu
+    - procacct_rss
+    - procacct_majflt
+    - procacct_io
+
+
+Environment Variables
+
+  list_groups:    Comma separated list of process groups. The processes of
+                  each group are selected by filters defined through
+                  group_<group>_<field> variables, where field is one of pid,
+                  user, comm or cmd with an optional suffix _ic for case
+                  insensitive matching and _regex for regular expressions.
+                  The value is a comma separated list of values or patterns.
+                  Processes are assigned to the first matching group.
+  group_by:       Field used for grouping the processes if no groups are
+                  defined: comm or user. (Default: comm)
+  top_n:          Number of groups with highest usage included in each graph.
+                  (Default: 10)
+  include_graphs: Comma separated list of enabled graphs.
+                  (All graphs enabled by default.)
+  exclude_graphs: Comma separated list of disabled graphs.
+
+  The CPU time, page faults and I/O are calculated from the counters stored
+  in the previous run. The groups included in the graphs are the groups with
+  the highest usage in the previous run; the groups with the highest RSS are
+  used until the previous counters are available.
+
+  Example:
+    [procacctstats]
+        user root
+        env.list_groups web,db
+        env.group_web_comm nginx,php-fpm
+        env.group_db_user_regex ^(mysql|postgres)$
+
+"""
+# Munin  - Magic Markers
+#%# family=auto
+#%# capabilities=autoconf nosuggest
+
+import sys
+from pymunin import MuninGraph, MuninPlugin, muninMain
+from pysysinfo.process import ProcessAcctInfo, procAcctHeaders
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+defaultTopN = 10
+
+
+class MuninProcAcctStatsPlugin(MuninPlugin):
+    """Multigraph Munin Plugin for monitoring resource usage of groups of
+    processes.
+
+    """
+    plugin_name = 'procacctstats'
+    isMultigraph = True
+
+    def __init__(self, argv=(), env=None, debug=False):
+        """Populate Munin Plugin with MuninGraph instances.
+
+        @param argv:  List of command line arguments.
+        @param env:   Dictionary of environment variables.
+        @param debug: Print debugging messages if True. (Default: False)
+
+        """
+        MuninPlugin.__init__(self, argv, env, debug)
+
+        self._category = 'Processes'
+        self._topN = self.envGet('top_n', defaultTopN, int)
+        groups = []
+        for name in self.envGetList('groups'):
+            filters = {}
+            for field in procAcctHeaders:
+                for suffix in ('', '_ic', '_regex', '_ic_regex'):
+                    key = "%s%s" % (field, suffix)
+                    val = self.envGet("group_%s_%s" % (name, key))
+                    if val is not None:
+                        filters[key] = [patt.strip()
+                                        for patt in val.split(',')]
+            if filters:
+                groups.append((name, filters))
+        self._acctInfo = ProcessAcctInfo(groups,
+                                         self.envGet('group_by', 'comm'),
+                                         self.getExecCache())
+
+        self._state = self.restoreState()
+        if isinstance(self._state, dict) and self._state.has_key('top'):
+            self._top = self._state['top']
+        else:
+            self._state = None
+            result = self._acctInfo.getGroupStats()
+            if result is not None:
+                self._top = self._rankGroups(result[0])
+            else:
+                self._top = {}
+
+        for (graph_name, title, vlabel, desc) in (
+            ('procacct_cpu', 'CPU Utilization', '%',
+             'CPU utilization (user + system) of processes in percent.'),
+            ('procacct_rss', 'Memory (RSS)', 'bytes',
+             'Resident memory (RSS) of processes in bytes.'),
+            ('procacct_majflt', 'Major Page Faults', 'faults per second',
+             'Major page faults of processes per second.')):
+            if self.graphEnabled(graph_name):
+                graph = MuninGraph('Process Groups - %s' % title,
+                    self._category, info=desc, vlabel=vlabel,
+                    args='--base 1000 --lower-limit 0', autoFixNames=True)
+                for group in self._top.get(graph_name, ()):
+                    graph.addField(group, group, type='GAUGE', draw='LINE2',
+                                   min=0)
+                self.appendGraph(graph_name, graph)
+
+        graph_name = 'procacct_io'
+        if self.graphEnabled(graph_name):
+            graph = MuninGraph('Process Groups - Storage I/O', self._category,
+                info='Bytes read from and written to storage by processes '
+                     'per second.',
+                vlabel='bytes read (-) / write (+) per second',
+                args='--base 1024', autoFixNames=True)
+            for group in self._top.get(graph_name, ()):
+                graph.addField('%s_read' % group, group, type='GAUGE',
+                               draw='LINE2', min=0, graph=False)
+                graph.addField('%s_write' % group, group, type='GAUGE',
+                               draw='LINE2', min=0,
+                               negative='%s_read' % group)
+            self.appendGraph(graph_name, graph)
+
+    def _rankGroups(self, stats):
+        """Select the groups with highest usage for each graph.
+
+        Groups are ranked by RSS for all graphs if the usage rates are not
+        available.
+
+        @param stats: Dictionary of stats per group.
+        @return:      Dictionary that maps graph names to sorted list of
+                      groups.
+
+        """
+        top = {}
+        for (graph_name, keys) in (('procacct_cpu', ('cpu',)),
+                                   ('procacct_rss', ('rss',)),
+                                   ('procacct_majflt', ('majflt',)),
+                                   ('procacct_io', ('read', 'write'))):
+            ranking = []
+            for (group, group_stats) in stats.iteritems():
+                if group_stats.has_key(keys[0]):
+                    val = sum([group_stats[key] for key in keys])
+                else:
+                    val = group_stats['rss']
+                ranking.append((val, group))
+            ranking.sort(reverse=True)
+            top[graph_name] = sorted([group for (val, group) #@UnusedVariable
+                                      in ranking[:self._topN]])
+        return top
+
+    def retrieveVals(self):
+        """Retrieve values for graphs."""
+        result = self._acctInfo.getGroupStats(self._state)
+        if result is None:
+            return
+        (stats, table) = result
+        # Rates are reported as zero for groups without live processes once
+        # the counters of the previous run are available.
+        if self._state is not None:
+            idle_stats = {'rss': 0, 'cpu': 0, 'majflt': 0, 
+                          'read': 0, 'write': 0}
+        else:
+            idle_stats = {'rss': 0}
+        for graph_name in ('procacct_cpu', 'procacct_rss', 'procacct_majflt'):
+            if self.hasGraph(graph_name):
+                key = graph_name[len('procacct_'):]
+                for group in self._top.get(graph_name, ()):
+                    group_stats = stats.get(group, idle_stats)
+                    self.setGraphVal(graph_name, group, group_stats.get(key))
+        graph_name = 'procacct_io'
+        if self.hasGraph(graph_name):
+            for group in self._top.get(graph_name, ()):
+                group_stats = stats.get(group, idle_stats)
+                for key in ('read', 'write'):
+                    self.setGraphVal(graph_name, "%s_%s" % (group, key), 
+                                     group_stats.get(key))
+        table['top'] = self._rankGroups(stats)
+        self.saveState(table)
+        self._state = table
+        self._top = table['top']
+
+    def autoconf(self):
+        """Implements Munin Plugin Auto-Configuration Option.
+
+        @return: True if plugin can be  auto-configured, False otherwise.
+
+        """
+        return self._acctInfo.getAcctTable() is not None
+
+
+def main():
+    sys.exit(muninMain(MuninProcAcctStatsPlugin))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@
 
 Requirements
 
-  - ps command
+  - /proc filesystem or ps command
 
 Wild Card Plugin - No
 
@@ -52,6 +52,7 @@ class MuninProcStatsPlugin(MuninPlugin):
     """
     plugin_name = 'procstats'
     isMultigraph = True
+    isReusable = True
 
     def __init__(self, argv=(), env=None, debug=False):
         """Populate Munin Plugin with MuninGraph instances.
@@ -81,7 +82,8 @@ class MuninProcStatsPlugin(MuninPlugin):
                                 'Terminated but not reaped by parent.'),
                     ('running', 'Running or runnable (on run queue).'),
                     ('sleep', 'Interruptable sleep. '
-                              'Waiting for an event to complete.')): 
+                              'Waiting for an event to complete.'),
+                    ('idle', 'Idle kernel thread.')): 
                     graph.addField(fname, fname, type='GAUGE', draw='AREA',
                                    info=fdesc)
                 self.appendGraph(graph_name, graph)
@@ -104,8 +106,8 @@ class MuninProcStatsPlugin(MuninPlugin):
 
     def retrieveVals(self):
         """Retrieve values for graphs."""
-        proc_info = ProcessInfo()
-        stats = {}
+        proc_info = ProcessInfo(exec_cache=self.getExecCache())
+        stats = proc_info.getProcStatCounts() or {}
         for (prefix, is_thread) in (('proc', False), 
                                     ('thread', True)):
             graph_name = '%s_status' % prefix
@@ -117,7 +119,8 @@ class MuninProcStatsPlugin(MuninPlugin):
                     ('stopped', 'stopped'),
                     ('defunct', 'defunct'),
                     ('running', 'running'),
-                    ('sleep', 'sleep')):
+                    ('sleep', 'sleep'),
+                    ('idle', 'idle')):
                     self.setGraphVal(graph_name, fname, 
                                      stats[prefix]['status'].get(stat_key))
             graph_name = '%s_prio' % prefix
@@ -138,7 +141,7 @@ class MuninProcStatsPlugin(MuninPlugin):
         @return: True if plugin can be  auto-configured, False otherwise.
                  
         """
-        proc_info = ProcessInfo()
+        proc_info = ProcessInfo(exec_cache=self.getExecCache())
         return len(proc_info.getProcList()) > 0
         
 
@@ -14,17 +14,26 @@ Multigraph Plugin - Graph Structure
 
     - sys_loadavg
     - sys_cpu_util
+    - sys_cpu_percore
     - sys_memory_util
     - sys_memory_avail
     - sys_processes
     - sys_forks
     - sys_intr_ctxt
+    - sys_irq_percore
+    - sys_irq_top
+    - sys_softirq
+    - sys_softirq_net
     - sys_vm_paging
     - sys_vm_swapping
 
 
 Environment Variables
 
+  irq_top_n:      Number of IRQs with the highest interrupt rates included in
+                  the sys_irq_top graph. The IRQs are ranked by the interrupts
+                  since the previous run; the total counts are used until
+                  the counts of the previous run are available. (Default: 10)
   include_graphs: Comma separated list of enabled graphs.
                   (All graphs enabled by default.)
   exclude_graphs: Comma separated list of disabled graphs.
@@ -39,8 +48,10 @@ Environment Variables
 #%# capabilities=autoconf nosuggest
 
 import sys
+from array import array
 from pymunin import MuninGraph, MuninPlugin, muninMain
-from pysysinfo.system import SystemInfo
+from pysysinfo.system import SystemInfo, calc_counter_deltas
+from pysysinfo.snapshot import ProcSnapshot
 
 __author__ = "Ali Onur Uyar"
 __copyright__ = "Copyright 2011, Ali Onur Uyar"
@@ -52,12 +63,17 @@ __email__ = "aouyar at gmail.com"
 __status__ = "Development"
 
 
+# Defaults
+defaultIRQtopN = 10
+
+
 class MuninSysStatsPlugin(MuninPlugin):
     """Multigraph Munin Plugin for monitoring System Resource Usage Stats.
 
     """
     plugin_name = 'sysstats'
     isMultigraph = True
+    isReusable = True
 
     def __init__(self, argv=(), env=None, debug=False):
         """Populate Munin Plugin with MuninGraph instances.
@@ -70,12 +86,16 @@ class MuninSysStatsPlugin(MuninPlugin):
         MuninPlugin.__init__(self, argv, env, debug)
         
         self._category = 'System'
-        self._sysinfo = SystemInfo()
+        self._snapshot = ProcSnapshot()
+        self._sysinfo = SystemInfo(self._snapshot)
         self._loadstats = None
         self._cpustats = None
         self._memstats = None
         self._procstats = None
         self._vmstats = None
+        self._irqTopN = self.envGet('irq_top_n', defaultIRQtopN, int)
+        self._irqState = None
+        self._irqTop = []
 
         if self.graphEnabled('sys_loadavg'):
             graph = MuninGraph('Load Average', self._category,
@@ -98,15 +118,17 @@ class MuninSysStatsPlugin(MuninPlugin):
                                    cdef='%s,10,/' % field, draw='AREASTACK')
             self.appendGraph('sys_cpu_util', graph)
             
+        if self.graphEnabled('sys_cpu_percore'):
+            graph = MuninGraph('CPU Utilization per Core (%)', self._category,
+                info='CPU Utilization (non-idle time) of each core.',
+                args='--base 1000 --lower-limit 0')
+            for (cpu, times) in self._sysinfo.getCPUuseList(): #@UnusedVariable
+                graph.addField(cpu, cpu, type='DERIVE', min=0, 
+                               cdef='%s,10,/' % cpu, draw='LINE1')
+            self.appendGraph('sys_cpu_percore', graph)
+            
         if self.graphEnabled('sys_mem_util'):
-            if self._memstats is None:
-                self._memstats = self._sysinfo.getMemoryUse()
-            self._memstats['MemUsed'] = self._memstats['MemTotal']
-            for field in ['MemFree', 'SwapCached', 'Buffers', 'Cached']:
-                if self._memstats.has_key(field):
-                    self._memstats['MemUsed'] -= self._memstats[field]
-            self._memstats['SwapUsed'] = (self._memstats['SwapTotal'] 
-                                          - self._memstats['SwapFree'])
+            self._getMemStats()
             graph = MuninGraph('Memory Utilization (bytes)', self._category,
                 info='System Memory Utilization in bytes.',
                 args='--base 1000 --lower-limit 0')
@@ -117,15 +139,7 @@ class MuninSysStatsPlugin(MuninPlugin):
             self.appendGraph('sys_mem_util', graph)
         
         if self.graphEnabled('sys_mem_avail'):
-            if self._memstats is None:
-                self._memstats = self._sysinfo.getMemoryUse()
-            if self._memstats.has_key('Hugepagesize'):
-                self._memstats['MemHugePages'] = (self._memstats['HugePages_Total'] 
-                                                  * self._memstats['Hugepagesize']) 
-            self._memstats['MemKernel'] = self._memstats['MemTotal']
-            for field in ['MemHugePages', 'Active', 'Inactive', 'MemFree']:
-                if self._memstats.has_key(field):
-                    self._memstats['MemKernel'] -= self._memstats[field]
+            self._getMemStats()
             graph = MuninGraph('Memory Utilization - Active/Inactive (bytes)', 
                 self._category,
                 info='System Memory Utilization (Active/Inactive) in bytes.',
@@ -137,8 +151,7 @@ class MuninSysStatsPlugin(MuninPlugin):
             self.appendGraph('sys_mem_avail', graph)
         
         if self.graphEnabled('sys_mem_huge'):
-            if self._memstats is None:
-                self._memstats = self._sysinfo.getMemoryUse()
+            self._getMemStats()
             if (self._memstats.has_key('Hugepagesize') 
                 and self._memstats['HugePages_Total'] > 0):
                 graph = MuninGraph('Memory Utilization - Huge Pages (bytes)', 
@@ -186,6 +199,49 @@ class MuninSysStatsPlugin(MuninPlugin):
                     idx += 1
             self.appendGraph('sys_intr_ctxt', graph)
         
+        if self.graphEnabled('sys_irq_percore'):
+            (cpus, counts) = self._sysinfo.getInterruptCPUstats() #@UnusedVariable
+            graph = MuninGraph('Interrupts per Second per Core', 
+                self._category,
+                info='Hardware Interrupts per second handled by each core.',
+                args='--base 1000 --lower-limit 0')
+            for cpu in cpus:
+                graph.addField(cpu, cpu, type='DERIVE', min=0, draw='LINE1')
+            self.appendGraph('sys_irq_percore', graph)
+        
+        if self.graphEnabled('sys_irq_top'):
+            state = self.restoreState()
+            if isinstance(state, dict) and state.has_key('top_irq'):
+                self._irqState = state
+            self.appendGraph('sys_irq_top', self._buildIRQtopGraph())
+        
+        if self.graphEnabled('sys_softirq'):
+            (names, counts) = self._sysinfo.getSoftirqStats() #@UnusedVariable
+            graph = MuninGraph('Software Interrupts per Second', 
+                self._category,
+                info='Software Interrupts per second by type.',
+                args='--base 1000 --lower-limit 0', autoFixNames=True)
+            for name in names:
+                graph.addField(name, name, type='DERIVE', min=0, draw='LINE2')
+            self.appendGraph('sys_softirq', graph)
+        
+        if self.graphEnabled('sys_softirq_net'):
+            (cpus, cpu_stats) = self._sysinfo.getSoftirqCPUstats()
+            if cpu_stats.has_key('NET_RX') and cpu_stats.has_key('NET_TX'):
+                graph = MuninGraph('Network Software Interrupts per Core', 
+                    self._category,
+                    info='Network receive (NET_RX) and transmit (NET_TX) '
+                         'software interrupts per second handled by each '
+                         'core.',
+                    args='--base 1000',
+                    vlabel='rx (-) / tx (+) per second')
+                for cpu in cpus:
+                    graph.addField('%s_rx' % cpu, cpu, type='DERIVE', min=0, 
+                                   draw='LINE1', graph=False)
+                    graph.addField('%s_tx' % cpu, cpu, type='DERIVE', min=0, 
+                                   draw='LINE1', negative='%s_rx' % cpu)
+                self.appendGraph('sys_softirq_net', graph)
+        
         if self.graphEnabled('sys_vm_paging'):
             graph = MuninGraph('VM - Paging', self._category,
                 info='Virtual Memory Paging: Pages In (-) / Out (+) per Second.',
@@ -208,6 +264,127 @@ class MuninSysStatsPlugin(MuninPlugin):
                            negative='in')
             self.appendGraph('sys_vm_swapping', graph)
 
+    def _getMemStats(self):
+        """Return memory stats including the derived values (MemUsed, 
+        SwapUsed, MemHugePages and MemKernel), retrieving them on the first 
+        call of the collection.
+        
+        @return: Dictionary of stats.
+        
+        """
+        if self._memstats is None:
+            stats = self._sysinfo.getMemoryUse()
+            stats['MemUsed'] = stats['MemTotal']
+            for field in ['MemFree', 'SwapCached', 'Buffers', 'Cached']:
+                if stats.has_key(field):
+                    stats['MemUsed'] -= stats[field]
+            stats['SwapUsed'] = stats['SwapTotal'] - stats['SwapFree']
+            if stats.has_key('Hugepagesize'):
+                stats['MemHugePages'] = (stats['HugePages_Total'] 
+                                         * stats['Hugepagesize']) 
+            stats['MemKernel'] = stats['MemTotal']
+            for field in ['MemHugePages', 'Active', 'Inactive', 'MemFree']:
+                if stats.has_key(field):
+                    stats['MemKernel'] -= stats[field]
+            self._memstats = stats
+        return self._memstats
+    
+    def _rankIRQs(self, names, counts, deltas=None):
+        """Select the IRQs with highest interrupt counts.
+        
+        @param names:  List of IRQ names.
+        @param counts: Array of total counts.
+        @param deltas: Array of counts since previous run. IRQs are ranked by 
+                       the total counts if None and ties are broken by the 
+                       total counts otherwise.
+        @return:       List of IRQ names.
+        
+        """
+        if deltas is None:
+            deltas = counts
+        ranking = sorted(zip(deltas, counts, names), reverse=True)
+        return sorted([name for (delta, count, name) #@UnusedVariable
+                       in ranking[:self._irqTopN] if count > 0])
+
+    def _buildIRQtopGraph(self):
+        """Build the sys_irq_top graph for the IRQs ranked in the stored 
+        state, or for the IRQs with the highest total counts if no ranking 
+        has been stored yet.
+        
+        @return: MuninGraph instance.
+        
+        """
+        (names, descs, counts) = self._sysinfo.getInterruptStats()
+        if self._irqState is not None:
+            top = self._irqState['top_irq']
+        else:
+            top = self._rankIRQs(names, counts)
+        graph = MuninGraph('Interrupts per Second - Top IRQs', 
+            self._category,
+            info='Hardware Interrupts per second for the IRQs with the '
+                 'highest interrupt rates.',
+            args='--base 1000 --lower-limit 0', autoFixNames=True)
+        irq_descs = dict(zip(names, descs))
+        self._irqTop = []
+        for name in top:
+            desc = irq_descs.get(name)
+            if desc is not None:
+                self._irqTop.append(name)
+                if desc and name.isdigit():
+                    label = "%s %s" % (name, desc.split()[-1])
+                else:
+                    label = name
+                graph.addField('irq_%s' % name, label, type='DERIVE', 
+                               min=0, draw='LINE2', info=desc or None)
+        return graph
+    
+    def _updateIRQtop(self):
+        """Rank the IRQs by the interrupts since the previous ranking, store 
+        the ranking and rebuild the sys_irq_top graph for the new ranking.
+        
+        The ranking is updated only after the values have been fetched or 
+        the spooled values have been output, so that the fields in the graph
+        configuration always match the fields of the values.
+        
+        """
+        (names, descs, counts) = self._sysinfo.getInterruptStats() #@UnusedVariable
+        if self._irqState is not None:
+            prev_counts = array('d')
+            prev_counts.fromstring(self._irqState['counts'])
+            deltas = calc_counter_deltas(names, counts, 
+                                         self._irqState['names'],
+                                         prev_counts)
+        else:
+            deltas = None
+        # The counts are stored in binary format for compactness.
+        self._irqState = {'names': names, 'counts': counts.tostring(),
+                          'top_irq': self._rankIRQs(names, counts, deltas)}
+        self.saveState(self._irqState)
+        self.replaceGraph('sys_irq_top', self._buildIRQtopGraph())
+
+    def resetVals(self):
+        """Discard the stats cached in the previous collection and refresh 
+        the /proc snapshot.
+        
+        The sys_irq_top graph is rebuilt if the ranking of IRQs has been 
+        updated by another instance of the plugin since the previous 
+        collection.
+        
+        """
+        self._snapshot.refresh()
+        if self.hasGraph('sys_irq_top'):
+            state = self.restoreState()
+            if (isinstance(state, dict) and state.has_key('top_irq')
+                and (self._irqState is None 
+                     or state['top_irq'] != self._irqState['top_irq'])):
+                self._irqState = state
+                self.replaceGraph('sys_irq_top', self._buildIRQtopGraph())
+        self._loadstats = None
+        self._cpustats = None
+        self._memstats = None
+        self._procstats = None
+        self._vmstats = None
+
     def retrieveVals(self):
         """Retrieve values for graphs."""
         if self.hasGraph('sys_loadavg'):
@@ -216,11 +393,15 @@ class MuninSysStatsPlugin(MuninPlugin):
                 self.setGraphVal('sys_loadavg', 'load15min', self._loadstats[2])
                 self.setGraphVal('sys_loadavg', 'load5min', self._loadstats[1])
                 self.setGraphVal('sys_loadavg', 'load1min', self._loadstats[0])
-        if self._cpustats and self.hasGraph('sys_cpu_util'):
+        if self.hasGraph('sys_cpu_util'):
+            if self._cpustats is None:
+                self._cpustats = self._sysinfo.getCPUuse()
             for field in self.getGraphFieldList('sys_cpu_util'):
                 self.setGraphVal('sys_cpu_util', 
                                  field, int(self._cpustats[field] * 1000))
-        if self._memstats:
+        if (self.hasGraph('sys_mem_util') or self.hasGraph('sys_mem_avail')
+            or self.hasGraph('sys_mem_huge')):
+            self._getMemStats()
             if self.hasGraph('sys_mem_util'):
                 for field in self.getGraphFieldList('sys_mem_util'):
                     self.setGraphVal('sys_mem_util', 
@@ -256,6 +437,36 @@ class MuninSysStatsPlugin(MuninPlugin):
                 for field in self.getGraphFieldList('sys_intr_ctxt'):
                     self.setGraphVal('sys_intr_ctxt', field, 
                                      self._procstats[field])
+        if self.hasGraph('sys_cpu_percore'):
+            for (cpu, times) in self._sysinfo.getCPUuseList():
+                # Guest time is already accounted for in user time; idle 
+                # and iowait are excluded.
+                busy = sum(times[:8]) - sum(times[3:5])
+                self.setGraphVal('sys_cpu_percore', cpu, int(busy * 1000))
+        if self.hasGraph('sys_irq_percore'):
+            (cpus, counts) = self._sysinfo.getInterruptCPUstats()
+            for (cpu, count) in zip(cpus, counts):
+                if self.graphHasField('sys_irq_percore', cpu):
+                    self.setGraphVal('sys_irq_percore', cpu, int(count))
+        if self.hasGraph('sys_irq_top'):
+            (names, descs, counts) = self._sysinfo.getInterruptStats() #@UnusedVariable
+            irq_counts = dict(zip(names, counts))
+            for name in self._irqTop:
+                count = irq_counts.get(name)
+                if count is not None:
+                    self.setGraphVal('sys_irq_top', 'irq_%s' % name, 
+                                     int(count))
+        if self.hasGraph('sys_softirq'):
+            (names, counts) = self._sysinfo.getSoftirqStats()
+            for (name, count) in zip(names, counts):
+                self.setGraphVal('sys_softirq', name, int(count))
+        if self.hasGraph('sys_softirq_net'):
+            (cpus, cpu_stats) = self._sysinfo.getSoftirqCPUstats()
+            for (key, name) in (('rx', 'NET_RX'), ('tx', 'NET_TX')):
+                for (cpu, count) in zip(cpus, cpu_stats[name]):
+                    field = '%s_%s' % (cpu, key)
+                    if self.graphHasField('sys_softirq_net', field):
+                        self.setGraphVal('sys_softirq_net', field, int(count))
         if self.hasGraph('sys_vm_paging'):
             if self._vmstats is None:
                 self._vmstats = self._sysinfo.getVMstats()
@@ -273,6 +484,34 @@ class MuninSysStatsPlugin(MuninPlugin):
                 self.setGraphVal('sys_vm_swapping', 'out', 
                                  self._vmstats['pswpout'])
     
+    def fetch(self):
+        """Implements Munin Plugin Fetch Option.
+
+        The ranking of IRQs for the sys_irq_top graph is updated after the
+        values have been output; values collected in sampler mode do not
+        update the ranking.
+
+        """
+        MuninPlugin.fetch(self)
+        if self.hasGraph('sys_irq_top'):
+            self._updateIRQtop()
+        return True
+
+    def spoolfetch(self, timestamp):
+        """Implements Munin Plugin Spoolfetch Option.
+
+        The ranking of IRQs for the sys_irq_top graph is updated after the
+        spooled values have been output; the sampler picks up the new ranking
+        for the following samples.
+
+        @param timestamp: Time in seconds since the epoch.
+
+        """
+        MuninPlugin.spoolfetch(self, timestamp)
+        if self.hasGraph('sys_irq_top'):
+            self._updateIRQtop()
+        return True
+
     def autoconf(self):
         """Implements Munin Plugin Auto-Configuration Option.
         
@@ -82,7 +82,7 @@ class MuninVarnishPlugin(MuninPlugin):
         
         self._instance = self.envGet('instance')
         self._category = 'Varnish'
-        varnish_info = VarnishInfo(self._instance)
+        varnish_info = VarnishInfo(self._instance, self.getExecCache())
         self._stats = varnish_info.getStats()
         self._desc = varnish_info.getDescDict()
         
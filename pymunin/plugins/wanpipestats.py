@@ -72,7 +72,7 @@ class MuninWanpipePlugin(MuninPlugin):
         self.envRegisterFilter('ifaces', '^[\w\d]+$')
         self._category = 'Wanpipe'
 
-        self._wanpipeInfo = WanpipeInfo()
+        self._wanpipeInfo = WanpipeInfo(self.getExecCache())
         self._ifaceStats = self._wanpipeInfo.getIfaceStats()
         self._ifaceList = []
         for iface in list(self._ifaceStats):
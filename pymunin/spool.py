@@ -0,0 +1,130 @@
+"""Implements MuninSpool Class for storing timestamped values of Munin Graphs.
+
+    - Samples collected by plugins in sampler mode are appended to the spool.
+    - Samples newer than a timestamp are retrieved from the spool to answer the
+      spoolfetch command of munin-async.
+
+    Each line in the spool file stores the values of one graph for one sample:
+
+        <timestamp> <graph id> <field>=<value> <field>=<value> ...
+
+"""
+
+import os
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+defaultSpoolMaxAge = 86400
+
+
+class MuninSpool:
+    """Class for appending and retrieving timestamped values of Munin Graphs
+    to and from a spool file.
+
+    """
+
+    def __init__(self, path, max_age=defaultSpoolMaxAge):
+        """Initialize Munin Spool.
+
+        @param path:    Path of spool file.
+        @param max_age: Samples older than max_age seconds are pruned.
+
+        """
+        self._path = path
+        self._maxAge = max_age
+
+    def append(self, timestamp, graph_vals):
+        """Append sample to spool.
+
+        @param timestamp:  Sample time in seconds since the epoch.
+        @param graph_vals: List of (graph id, list of (field, value) pairs).
+
+        """
+        lines = []
+        for (graph_id, val_list) in graph_vals:
+            items = []
+            for (name, val) in val_list:
+                if val is None:
+                    items.append("%s=U" % name)
+                elif isinstance(val, float):
+                    items.append("%s=%f" % (name, val))
+                else:
+                    items.append("%s=%s" % (name, val))
+            lines.append("%d %s %s\n" % (timestamp, graph_id, ' '.join(items)))
+        try:
+            fp = open(self._path, 'a')
+            try:
+                fp.write(''.join(lines))
+            finally:
+                fp.close()
+        except:
+            raise IOError("Failure in appending sample to spool file: %s"
+                          % self._path)
+
+    def iterSince(self, timestamp):
+        """Iterate through samples newer than timestamp.
+
+        @param timestamp: Time in seconds since the epoch.
+        @return:          Iterator of (timestamp, graph id, list of
+                          (field, value) pairs).
+
+        """
+        if not os.path.exists(self._path):
+            return
+        fp = open(self._path, 'r')
+        try:
+            for line in fp:
+                cols = line.split()
+                if len(cols) < 2:
+                    continue
+                try:
+                    ts = int(cols[0])
+                except ValueError:
+                    continue
+                if ts > timestamp:
+                    yield (ts, cols[1], [tuple(item.split('=', 1))
+                                         for item in cols[2:]])
+        finally:
+            fp.close()
+
+    def prune(self, now):
+        """Remove samples older than the maximum age from spool.
+
+        The spool file is replaced atomically only when the oldest sample in
+        the file has expired.
+
+        @param now: Current time in seconds since the epoch.
+
+        """
+        if not os.path.exists(self._path):
+            return
+        cutoff = now - self._maxAge
+        fp = open(self._path, 'r')
+        try:
+            first = fp.readline()
+            cols = first.split(None, 1)
+            if len(cols) > 0 and cols[0].isdigit() and int(cols[0]) > cutoff:
+                return
+            lines = []
+            for line in fp:
+                cols = line.split(None, 1)
+                if len(cols) > 1 and cols[0].isdigit() and int(cols[0]) > cutoff:
+                    lines.append(line)
+        finally:
+            fp.close()
+        tmp_path = "%s.%d.tmp" % (self._path, os.getpid())
+        fp = open(tmp_path, 'w')
+        try:
+            fp.write(''.join(lines))
+        finally:
+            fp.close()
+        os.rename(tmp_path, self._path)
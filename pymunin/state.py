@@ -0,0 +1,212 @@
+"""Implements MuninStateStore Class for persistent storage of plugin state.
+
+    - The state is written to a temporary file that atomically replaces the
+      state file; an interrupted write never leaves a truncated state file
+      behind.
+    - Dictionaries that map names to numeric counters are stored in a compact
+      typed binary encoding. Other objects composed of builtin types are
+      stored with marshal, and arbitrary objects are stored with pickle.
+    - The state file can optionally be read through mmap.
+    - Missing or corrupted state files are treated as absence of state.
+
+"""
+
+import os
+import mmap
+import struct
+import marshal
+import cPickle as pickle
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+defaultStateDir = '/tmp'
+
+stateMagic = 'PMS1'
+encCounters = 'C'
+encMarshal = 'M'
+encPickle = 'P'
+_headerLen = len(stateMagic) + 1
+_countersHeader = struct.Struct('<II')
+_maxInt64 = 2 ** 63 - 1
+_minInt64 = -2 ** 63
+
+
+def _encodeCounters(obj):
+    """Encodes dictionary of numeric counters in compact typed binary format.
+
+    The payload consists of the number of counters, the length of the name
+    block, the NUL separated counter names, one type code per counter ('q'
+    for 64 bit integers, 'd' for floats) and the packed values.
+
+    @param obj: Dictionary that maps counter names to numbers.
+    @return:    Encoded string or None if obj is not a dictionary of counters.
+
+    """
+    if not isinstance(obj, dict):
+        return None
+    names = []
+    codes = []
+    vals = []
+    for (name, val) in obj.iteritems():
+        if not isinstance(name, str) or '\0' in name:
+            return None
+        if isinstance(val, bool):
+            return None
+        elif isinstance(val, (int, long)):
+            if val > _maxInt64 or val < _minInt64:
+                return None
+            codes.append('q')
+        elif isinstance(val, float):
+            codes.append('d')
+        else:
+            return None
+        names.append(name)
+        vals.append(val)
+    name_block = '\0'.join(names)
+    code_block = ''.join(codes)
+    return ''.join((_countersHeader.pack(len(names), len(name_block)),
+                    name_block, code_block,
+                    struct.pack('<' + code_block, *vals)))
+
+
+def _decodeCounters(data, offset):
+    """Decodes dictionary of numeric counters encoded by _encodeCounters.
+
+    @param data:   String or mmap object.
+    @param offset: Offset of payload in data.
+    @return:       Dictionary that maps counter names to numbers.
+
+    """
+    (count, name_len) = _countersHeader.unpack_from(data, offset)
+    offset += _countersHeader.size
+    if count == 0:
+        return {}
+    names = data[offset:offset + name_len].split('\0')
+    offset += name_len
+    code_block = data[offset:offset + count]
+    offset += count
+    if len(names) != count or len(code_block) != count:
+        raise ValueError("Invalid counter block.")
+    return dict(zip(names, struct.unpack_from('<' + code_block, data, offset)))
+
+
+class MuninStateStore:
+    """Class for storing and restoring the state of Munin Plugins."""
+
+    def __init__(self, path, use_mmap=False):
+        """Initialize State Store.
+
+        @param path:     Path of state file.
+        @param use_mmap: Read state file through mmap if True.
+
+        """
+        self._path = path
+        self._useMmap = use_mmap
+
+    def getPath(self):
+        """Returns path of state file.
+
+        @return: Path of state file.
+
+        """
+        return self._path
+
+    def save(self, obj):
+        """Save object to state file atomically.
+
+        @param obj: Object that stores plugin state.
+
+        """
+        payload = _encodeCounters(obj)
+        if payload is not None:
+            enc = encCounters
+        else:
+            try:
+                payload = marshal.dumps(obj, 2)
+                enc = encMarshal
+            except ValueError:
+                payload = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+                enc = encPickle
+        tmp_path = "%s.%d.tmp" % (self._path, os.getpid())
+        try:
+            fp = open(tmp_path, 'wb')
+            try:
+                fp.write(stateMagic + enc + payload)
+            finally:
+                fp.close()
+            os.rename(tmp_path, self._path)
+        except (IOError, OSError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise IOError("Failure in storing plugin state in file: %s"
+                          % self._path)
+        return True
+
+    def restore(self):
+        """Restore object from state file.
+
+        @return: Object that stores plugin state or None if the state file
+                 does not exist or cannot be decoded.
+
+        """
+        try:
+            fp = open(self._path, 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                if self._useMmap:
+                    size = os.fstat(fp.fileno()).st_size
+                    if size < _headerLen:
+                        return None
+                    data = mmap.mmap(fp.fileno(), size,
+                                     access=mmap.ACCESS_READ)
+                    try:
+                        return self._decode(data)
+                    finally:
+                        data.close()
+                else:
+                    return self._decode(fp.read())
+            except (ValueError, TypeError, EOFError, IndexError, KeyError,
+                    struct.error, pickle.UnpicklingError, ImportError,
+                    AttributeError, EnvironmentError, mmap.error):
+                return None
+        finally:
+            fp.close()
+
+    def remove(self):
+        """Remove state file."""
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+
+    def _decode(self, data):
+        """Decode contents of state file.
+
+        @param data: String or mmap object.
+        @return:     Object that stores plugin state or None.
+
+        """
+        if data[:len(stateMagic)] != stateMagic:
+            return None
+        enc = data[len(stateMagic)]
+        if enc == encCounters:
+            return _decodeCounters(data, _headerLen)
+        elif enc == encMarshal:
+            return marshal.loads(data[_headerLen:])
+        elif enc == encPickle:
+            return pickle.loads(data[_headerLen:])
+        else:
+            return None
@@ -0,0 +1,118 @@
+"""Implements MuninTaskPool Class for running independent fetch tasks of
+plugins concurrently.
+
+    - Tasks are executed by a bounded number of daemon worker threads.
+    - The pool waits for the tasks until an overall deadline expires; the
+      results of the tasks that finished in time are returned and the tasks
+      that are still running are reported as late.
+
+"""
+
+import sys
+import time
+import threading
+import Queue
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+defaultMaxWorkers = 4
+defaultDeadline = 8
+
+
+class MuninTaskPool:
+    """Class for running tasks concurrently on a bounded thread pool with an
+    overall deadline.
+
+    """
+
+    def __init__(self, max_workers=defaultMaxWorkers, deadline=defaultDeadline):
+        """Initialize Task Pool.
+
+        @param max_workers: Maximum number of worker threads.
+        @param deadline:    Maximum time in seconds to wait for the tasks.
+                            No deadline is enforced if None.
+
+        """
+        self._maxWorkers = max(1, max_workers)
+        self._deadline = deadline
+
+    def run(self, tasks):
+        """Run tasks concurrently and wait for completion until the deadline.
+
+        @param tasks: List of (name, function) pairs. The functions are called
+                      without arguments.
+        @return:      Tuple of three items:
+                      - Dictionary that maps names of finished tasks to the
+                        values returned by the functions.
+                      - Dictionary that maps names of failed tasks to the
+                        exception info tuples.
+                      - List of names of the tasks that did not finish before
+                        the deadline.
+
+        """
+        results = {}
+        errors = {}
+        if len(tasks) == 0:
+            return (results, errors, [])
+        queue = Queue.Queue()
+        for task in tasks:
+            queue.put(task)
+        cond = threading.Condition()
+        pending = [len(tasks)]
+
+        def worker():
+            while True:
+                try:
+                    (name, func) = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    val = func()
+                    cond.acquire()
+                    try:
+                        results[name] = val
+                    finally:
+                        cond.release()
+                except:
+                    cond.acquire()
+                    try:
+                        errors[name] = sys.exc_info()
+                    finally:
+                        cond.release()
+                cond.acquire()
+                try:
+                    pending[0] -= 1
+                    cond.notify()
+                finally:
+                    cond.release()
+
+        for i in range(min(self._maxWorkers, len(tasks))): #@UnusedVariable
+            thread = threading.Thread(target=worker)
+            thread.setDaemon(True)
+            thread.start()
+        if self._deadline is not None:
+            end = time.time() + self._deadline
+        cond.acquire()
+        try:
+            while pending[0] > 0:
+                if self._deadline is None:
+                    cond.wait()
+                else:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        break
+                    cond.wait(remaining)
+            late = [name for (name, func) in tasks #@UnusedVariable
+                    if not results.has_key(name) and not errors.has_key(name)]
+            return (dict(results), dict(errors), late)
+        finally:
+            cond.release()
@@ -9,10 +9,8 @@ for setting the connection parameters for AMI:
 
 """
 
-import sys
 import os.path
 import re
-import telnetlib
 import util
 
 __author__ = "Ali Onur Uyar"
@@ -137,11 +135,8 @@ class AsteriskInfo:
     def _connect(self):
         """Connect to Asterisk Manager Interface."""
         try:
-            if sys.version_info[:2] >= (2,6):
-                self._conn = telnetlib.Telnet(self._amihost, self._amiport, 
-                                              connTimeout)
-            else:
-                self._conn = telnetlib.Telnet(self._amihost, self._amiport)
+            self._conn = util.LineClient(self._amihost, self._amiport, 
+                                         timeout=connTimeout)
         except:
             raise Exception(
                 "Connection to Asterisk Manager Interface on "
@@ -157,14 +152,15 @@ class AsteriskInfo:
         @param chan_vars: Tuple of key-value pairs for channel variables.
 
         """
-        self._conn.write("Action: %s\r\n" % action)
+        buf = ["Action: %s\r\n" % action]
         if attrs:
             for (key,val) in attrs:
-                self._conn.write("%s: %s\r\n" % (key, val))
+                buf.append("%s: %s\r\n" % (key, val))
         if chan_vars:
             for (key,val) in chan_vars:
-                self._conn.write("Variable: %s=%s\r\n" % (key, val))
-        self._conn.write("\r\n")
+                buf.append("Variable: %s=%s\r\n" % (key, val))
+        buf.append("\r\n")
+        self._conn.send(''.join(buf))
 
     def _getResponse(self):
         """Read and parse response from Asterisk Manager Interface.
@@ -173,7 +169,7 @@ class AsteriskInfo:
 
         """
         resp_dict= dict()
-        resp_str = self._conn.read_until("\r\n\r\n", connTimeout)
+        resp_str = self._conn.read("\r\n\r\n")
         for line in resp_str.split("\r\n"):
             mobj = re.match('(\w+):\s*(\S.*)$', line);
             if mobj:
@@ -186,7 +182,7 @@ class AsteriskInfo:
         
     def _printResponse(self):
         """Read and print response from Asterisk Manager Interface."""
-        resp_str = self._conn.read_until("\r\n\r\n", connTimeout)
+        resp_str = self._conn.read("\r\n\r\n")
         print resp_str
 
     def _getGreeting(self):
@@ -194,7 +190,7 @@ class AsteriskInfo:
         set Manager Interface version.
 
         """
-        greeting = self._conn.read_until("\r\n", connTimeout)
+        greeting = self._conn.read("\r\n")
         mobj = re.match('Asterisk Call Manager\/([\d\.]+)\s*$', greeting)
         if mobj:
             self._ami_version = util.SoftwareVersion(mobj.group(1))
@@ -28,12 +28,15 @@ sysfsBlockdevDir = '/sys/block'
 class DiskIOinfo:
     """Class to retrieve I/O stats for Block Devices."""
     
-    def __init__(self):
+    def __init__(self, snapshot=None):
         """Initialization
         
-        @param autoInit: If True parse stats on initization.
+        @param snapshot: ProcSnapshot instance shared with other collectors. 
+                         The files in /proc are read through the snapshot if 
+                         defined.
         
         """
+        self._snapshot = snapshot
         self._diskStats = None
         self._mapMajorDevclass = None
         self._mapMinorLV = None
@@ -48,19 +51,30 @@ class DiskIOinfo:
         self._partList = None
         self._swapList = None
 
-    def _initBlockMajorMap(self):
-        """Parses /proc/devices to initialize device class - major number map
-        for block devices.
+    def _readFile(self, path):
+        """Read the contents of a file in /proc.
+        
+        @param path: File path.
+        @return:     File contents.
         
         """
-        self._mapMajorDevclass = {}
+        if self._snapshot is not None:
+            return self._snapshot.read(path)
         try:
-            fp = open(devicesFile, 'r')
+            fp = open(path, 'r')
             data = fp.read()
             fp.close()
         except:
-            raise IOError('Failed reading interface stats from file: %s'
-                          % devicesFile)
+            raise IOError('Failed reading stats from file: %s' % path)
+        return data
+
+    def _initBlockMajorMap(self):
+        """Parses /proc/devices to initialize device class - major number map
+        for block devices.
+        
+        """
+        self._mapMajorDevclass = {}
+        data = self._readFile(devicesFile)
         skip = True
         for line in data.splitlines():
             if skip:
@@ -120,7 +134,7 @@ class DiskIOinfo:
     def _initSwapInfo(self):
         """Initialize swap partition to device mappings."""
         self._swapList = []
-        sysinfo = SystemInfo()
+        sysinfo = SystemInfo(self._snapshot)
         for (swap,attrs) in sysinfo.getSwapStats().iteritems():
             if attrs['type'] == 'partition':
                 mobj = re.match('\/dev\/(.*)$', os.path.realpath(swap))
@@ -130,13 +144,7 @@ class DiskIOinfo:
     def _initDiskStats(self):
         """Parse and initialize block device I/O stats in /proc/diskstats."""
         self._diskStats = {}
-        try:
-            fp = open(diskStatsFile, 'r')
-            data = fp.read()
-            fp.close()
-        except:
-            raise IOError('Failed reading interface stats from file: %s'
-                          % diskStatsFile)
+        data = self._readFile(diskStatsFile)
         for line in data.splitlines():
             cols = line.split()
             dev = cols.pop(2)
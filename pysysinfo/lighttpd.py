@@ -5,7 +5,6 @@ page of local and/or remote Lighttpd Web Servers.
 
 """
 
-import re
 import util
 
 __author__ = "Ali Onur Uyar"
@@ -70,11 +69,7 @@ class LighttpdInfo:
         url = "%s://%s:%d/%s?auto"  % (self._proto, self._host, self._port, 
                                        self._statuspath)
         response = util.get_url(url, self._user, self._password)
-        self._statusDict = {}
-        for line in response.splitlines():
-            mobj = re.match('(\S.*\S)\s*:\s*(\S+)\s*$', line)
-            if mobj:
-                self._statusDict[mobj.group(1)] = util.parse_value(mobj.group(2))
+        self._statusDict = util.parse_stats(response, 'colon')
         if self._statusDict.has_key('Scoreboard'):
             self._statusDict['MaxServers'] = len(self._statusDict['Scoreboard'])
     
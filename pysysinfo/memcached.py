@@ -6,6 +6,7 @@ The statistics are obtained by connecting to and querying the Memcached.
 
 import re
 import os
+import socket
 import util
 
 __author__ = "Ali Onur Uyar"
@@ -19,6 +20,7 @@ __status__ = "Development"
 
 
 defaultMemcachedPort = 11211
+statsTerminator = re.compile('(END|ERROR|CLIENT_ERROR.*|SERVER_ERROR.*)\r?\n$')
 
 
 class MemcachedInfo:
@@ -70,57 +72,49 @@ class MemcachedInfo:
                 raise Exception("Socket file (%s) for Memcached Instance not found."
                                 % self._socketFile)
         try:
-            if self._timeout is not None:
-                self._conn = util.Telnet(self._host, self._port, self._socketFile, 
-                                         timeout)
-            else:
-                self._conn = util.Telnet(self._host, self._port, self._socketFile)
+            self._conn = util.LineClient(self._host, self._port, 
+                                         self._socketFile, self._timeout)
         except:     
             raise Exception("Connection to %s failed." % self._instanceName)
             
     def _sendStatCmd(self,  cmd):
-        """Send stat command to Memcached Server and return response lines.
+        """Send stat command to Memcached Server and return response text.
         
         @param cmd: Command string.
-        @return:    Array of strings.
+        @return:    Response text without the END line.
         
         """
         try:
-            self._conn.write("%s\r\n" % cmd)
-            regex = re.compile('^(END|ERROR)\r\n', re.MULTILINE)
-            (idx, mobj, text) = self._conn.expect([regex,], self._timeout) #@UnusedVariable
+            text = self._conn.request("%s\r\n" % cmd, statsTerminator)
+        except socket.timeout:
+            raise Exception("Connection with %s timed out." % self._instanceName)
         except:
             raise Exception("Communication with %s failed" % self._instanceName)
-        if mobj is not None:
-            if mobj.group(1) == 'END':
-                return text.splitlines()[:-1]
-            elif mobj.group(1) == 'ERROR':
-                raise Exception("Protocol error in communication with %s."
-                                % self._instanceName)
+        idx = text.rfind('\n', 0, -1) + 1
+        if text[idx:].rstrip() == 'END':
+            return text[:idx]
         else:
-            raise Exception("Connection with %s timed out." % self._instanceName)
-    def _parseStats(self, lines, parse_slabs = False):
+            raise Exception("Protocol error in communication with %s."
+                            % self._instanceName)
+        
+    def _parseStats(self, data, parse_slabs = False):
         """Parse stats output from memcached and return dictionary of stats-
         
-        @param lines:       Array of lines of input text.
+        @param data:        Response text.
         @param parse_slabs: Parse slab stats if True.
         @return:            Stats dictionary.
         
         """
         info_dict = {}
         info_dict['slabs'] = {}
-        for line in lines:
-            mobj = re.match('^STAT\s(\w+)\s(\S+)$',  line)
-            if mobj:
-                info_dict[mobj.group(1)] = util.parse_value(mobj.group(2), True)
-                continue
+        stats = util.parse_stats(data, 'stat', parsebool=True)
+        for (key, val) in stats.iteritems():
+            if ':' not in key:
+                info_dict[key] = val
             elif parse_slabs:
-                mobj = re.match('STAT\s(\w+:)?(\d+):(\w+)\s(\S+)$',  line)
-                if mobj:
-                    (slab, key, val) = mobj.groups()[-3:]      
-                    if not info_dict['slabs'].has_key(slab):
-                        info_dict['slabs'][slab] = {}
-                    info_dict['slabs'][slab][key] = util.parse_value(val, True)
+                parts = key.split(':')
+                if len(parts) <= 3 and parts[-2].isdigit():
+                    info_dict['slabs'].setdefault(parts[-2], {})[parts[-1]] = val
         return info_dict
         
     def getStats(self):
@@ -129,8 +123,8 @@ class MemcachedInfo:
         @return: Dictionary of stats.
         
         """
-        lines = self._sendStatCmd('stats')
-        return self._parseStats(lines, False)
+        data = self._sendStatCmd('stats')
+        return self._parseStats(data, False)
     
     def getStatsItems(self):
         """Query Memcached and return stats on items broken down by slab.
@@ -138,8 +132,8 @@ class MemcachedInfo:
         @return: Dictionary of stats.
         
         """
-        lines = self._sendStatCmd('stats items')
-        return self._parseStats(lines, True)
+        data = self._sendStatCmd('stats items')
+        return self._parseStats(data, True)
     
     def getStatsSlabs(self):
         """Query Memcached and return stats on slabs.
@@ -147,8 +141,8 @@ class MemcachedInfo:
         @return: Dictionary of stats.
         
         """
-        lines = self._sendStatCmd('stats slabs')
-        return self._parseStats(lines, True)
+        data = self._sendStatCmd('stats slabs')
+        return self._parseStats(data, True)
 
     def getSettings(self):
         """Query Memcached and return settings.
@@ -156,6 +150,6 @@ class MemcachedInfo:
         @return: Dictionary of settings.
         
         """
-        lines = self._sendStatCmd('stats settings')
-        return self._parseStats(lines, False)
+        data = self._sendStatCmd('stats settings')
+        return self._parseStats(data, False)
     
\ No newline at end of file
@@ -64,9 +64,10 @@ class MySQLinfo:
     def _connect(self):
         """Establish connection to MySQL Database."""
         if self._connParams:
-            self._conn = MySQLdb.connect(**self._connParams)
+            conn = MySQLdb.connect(**self._connParams)
         else:
-            self._conn = MySQLdb.connect('')
+            conn = MySQLdb.connect('')
+        self._conn = util.timed_connection(conn)
 
     def getStorageEngines(self):
         """Returns list of supported storage engines.
@@ -0,0 +1,134 @@
+"""Implements NetProtoInfo Class for gathering the counters of the TCP/IP stack
+of the Linux kernel.
+
+"""
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+snmpFile = '/proc/net/snmp'
+netstatFile = '/proc/net/netstat'
+sockstatFile = '/proc/net/sockstat'
+sockstat6File = '/proc/net/sockstat6'
+
+
+def parse_proto_counters(data):
+    """Parse protocol counters in the format of /proc/net/snmp and
+    /proc/net/netstat, where a line with the names of the counters of a
+    protocol is followed by a line with the values.
+
+    @param data: File contents.
+    @return:     Nested dictionary of counters indexed by protocol and counter
+                 name.
+
+    """
+    stats = {}
+    lines = data.splitlines()
+    idx = 0
+    while idx < len(lines) - 1:
+        (proto, sep, names) = lines[idx].partition(':')
+        (val_proto, val_sep, vals) = lines[idx + 1].partition(':') #@UnusedVariable
+        if sep and val_proto == proto:
+            stats[proto] = dict(zip(names.split(), 
+                                    [int(val) for val in vals.split()]))
+            idx += 2
+        else:
+            idx += 1
+    return stats
+
+
+def parse_sockstat(data):
+    """Parse socket usage stats in the format of /proc/net/sockstat, where
+    each line consists of the protocol followed by name value pairs.
+
+    @param data: File contents.
+    @return:     Nested dictionary of stats indexed by protocol and stat name.
+
+    """
+    stats = {}
+    for line in data.splitlines():
+        (proto, sep, pairs) = line.partition(':')
+        if not sep:
+            continue
+        cols = pairs.split()
+        stats[proto] = dict(zip(cols[0::2], [int(val) for val in cols[1::2]]))
+    return stats
+
+
+class NetProtoInfo:
+    """Class to retrieve the counters of the TCP/IP protocols."""
+
+    def _readFile(self, path):
+        """Read the contents of a file in /proc/net.
+
+        @param path: File path.
+        @return:     File contents.
+
+        """
+        try:
+            fp = open(path, 'r')
+            try:
+                return fp.read()
+            finally:
+                fp.close()
+        except IOError:
+            raise IOError('Failed reading protocol stats from file: %s'
+                          % path)
+
+    def getSNMPstats(self):
+        """Return SNMP MIB counters of the IP, ICMP, TCP and UDP protocols from
+        /proc/net/snmp.
+
+        @return: Nested dictionary of counters indexed by protocol (Ip, Icmp,
+                 IcmpMsg, Tcp, Udp, UdpLite) and counter name.
+
+        """
+        return parse_proto_counters(self._readFile(snmpFile))
+
+    def getNetstatStats(self):
+        """Return extended counters of the IP and TCP protocols from
+        /proc/net/netstat.
+
+        @return: Nested dictionary of counters indexed by protocol (TcpExt,
+                 IpExt, etc.) and counter name.
+
+        """
+        return parse_proto_counters(self._readFile(netstatFile))
+
+    def getProtoStats(self):
+        """Return counters from /proc/net/snmp and /proc/net/netstat.
+
+        @return: Nested dictionary of counters indexed by protocol (Ip, Tcp,
+                 Udp, TcpExt, IpExt, etc.) and counter name.
+
+        """
+        stats = self.getSNMPstats()
+        stats.update(self.getNetstatStats())
+        return stats
+
+    def getSockStats(self):
+        """Return socket usage stats from /proc/net/sockstat and
+        /proc/net/sockstat6.
+
+        The memory usage of TCP and UDP sockets (mem) is reported in pages.
+
+        @return: Nested dictionary of stats indexed by protocol (sockets, TCP,
+                 UDP, TCP6, UDP6, etc.) and stat name (inuse, orphan, tw,
+                 alloc, mem).
+
+        """
+        stats = parse_sockstat(self._readFile(sockstatFile))
+        try:
+            stats.update(parse_sockstat(self._readFile(sockstat6File)))
+        except IOError:
+            # IPv6 disabled.
+            pass
+        return stats
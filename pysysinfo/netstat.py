@@ -3,6 +3,10 @@
 """
 
 import re
+import os
+import pwd
+import socket
+import struct
 import util
 
 __author__ = "Ali Onur Uyar"
@@ -17,15 +21,310 @@ __status__ = "Development"
 
 # Defaults
 netstatCmd = '/bin/netstat'
+procNetDir = '/proc/net'
 
-             
+
+# Maps
+tcpStates = {'01': 'ESTABLISHED',
+             '02': 'SYN_SENT',
+             '03': 'SYN_RECV',
+             '04': 'FIN_WAIT1',
+             '05': 'FIN_WAIT2',
+             '06': 'TIME_WAIT',
+             '07': 'CLOSE',
+             '08': 'CLOSE_WAIT',
+             '09': 'LAST_ACK',
+             '0A': 'LISTEN',
+             '0B': 'CLOSING',
+             '0C': 'SYN_RECV',}
+tcpStateEstablished = '01'
+tcpStateListen = '0A'
+tcpStateClose = '07'
+
+netstatHeaders = ['proto', 'ipversion', 'recvq', 'sendq', 
+                  'localaddr', 'localport','foreignaddr', 'foreignport', 
+                  'state']
+netstatUserHeaders = ['user', 'inode']
+
+
+def decode_addr(hexaddr):
+    """Decode IPv4 or IPv6 address in hexadecimal notation of /proc/net/tcp 
+    and udp tables.
+    
+    @param hexaddr: Address as hexadecimal string of 32 bit words in host 
+                    byte order.
+    @return:        Address in numeric notation.
     
+    """
+    if len(hexaddr) == 8:
+        return socket.inet_ntop(socket.AF_INET, 
+                                struct.pack('=I', int(hexaddr, 16)))
+    addr = socket.inet_ntop(socket.AF_INET6,
+                            struct.pack('=IIII', *[int(hexaddr[i:i+8], 16)
+                                                   for i in range(0, 32, 8)]))
+    if addr.startswith('::ffff:') and '.' in addr:
+        # IPv4-mapped addresses are shown in IPv4 notation like netstat does.
+        return addr[7:]
+    return addr
+
+
+def decode_port(hexport):
+    """Decode port number in hexadecimal notation of /proc/net/tcp and udp 
+    tables.
+    
+    @param hexport: Port number as hexadecimal string.
+    @return:        Port number as string or * for port 0.
+    
+    """
+    port = int(hexport, 16)
+    if port == 0:
+        return '*'
+    else:
+        return str(port)
+
+
+class ProcNetRow:
+    """Row of /proc/net/tcp, tcp6, udp or udp6 table in the format of the 
+    rows returned by NetstatInfo.parseNetstatCmd.
+    
+    The columns are decoded when they are accessed, so that filters only 
+    decode the columns they test.
+    
+    """
+    
+    def __init__(self, proto, ipversion, cols, user_func=str):
+        """Initialize Row.
+        
+        @param proto:     Protocol: tcp or udp
+        @param ipversion: IP Version: 4 or 6
+        @param cols:      List of the columns of the line of the table.
+        @param user_func: Function for converting user IDs to user names.
+        
+        """
+        self._userFunc = user_func
+        self._proto = proto
+        self._ipversion = ipversion
+        self._cols = cols
+        
+    def __getitem__(self, idx):
+        """Returns decoded column.
+        
+        @param idx: Column index in netstatHeaders + netstatUserHeaders.
+        @return:    Column value.
+        
+        """
+        cols = self._cols
+        if idx == 0:
+            return self._proto
+        elif idx == 1:
+            return self._ipversion
+        elif idx == 2:
+            return str(int(cols[4][9:], 16))
+        elif idx == 3:
+            return str(int(cols[4][:8], 16))
+        elif idx == 4:
+            return decode_addr(cols[1][:-5])
+        elif idx == 5:
+            return decode_port(cols[1][-4:])
+        elif idx == 6:
+            return decode_addr(cols[2][:-5])
+        elif idx == 7:
+            return decode_port(cols[2][-4:])
+        elif idx == 8:
+            if self._proto == 'tcp':
+                return tcpStates.get(cols[3], 'UNKNOWN')
+            elif cols[3] == tcpStateEstablished:
+                return 'ESTABLISHED'
+            elif cols[3] == tcpStateClose:
+                return None
+            else:
+                return 'UNKNOWN'
+        elif idx == 9:
+            return self._userFunc(int(cols[7]))
+        elif idx == 10:
+            return cols[9]
+        else:
+            raise IndexError("Column index out of range.")
+        
+    def getCols(self, num_cols):
+        """Returns list of decoded columns.
+        
+        @param num_cols: Number of columns.
+        @return:         List of columns.
+        
+        """
+        return [self[idx] for idx in range(num_cols)]
+
+
 class NetstatInfo:
     """Class to retrieve network stats."""
     
-    def __init__(self):
-        """Initialize Process Stats."""
-        pass
+    def __init__(self, use_procfs=True, exec_cache=None):
+        """Initialize Network Stats.
+        
+        @param use_procfs: Read the socket tables in /proc/net if True; the 
+                           netstat command is used if False or if the 
+                           requested options are not supported with /proc.
+        @param exec_cache: ExecCache instance for the output of commands.
+        
+        """
+        self._useProcfs = use_procfs
+        self._execCache = exec_cache
+        self._users = {}
+    
+    def getUserName(self, uid):
+        """Returns user name for user ID. The user ID is returned if no user 
+        name is defined.
+        
+        @param uid: User ID.
+        @return:    User name.
+        
+        """
+        name = self._users.get(uid)
+        if name is None:
+            try:
+                name = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                name = str(uid)
+            self._users[uid] = name
+        return name
+    
+    def _getProcNetFiles(self, tcp=True, udp=True, ipv4=True, ipv6=True):
+        """Returns the socket tables in /proc/net for protocols.
+        
+        @param tcp:  Include TCP sockets if True.
+        @param udp:  Include UDP sockets if True.
+        @param ipv4: Include IPv4 sockets if True.
+        @param ipv6: Include IPv6 sockets if True.
+        @return:     List of tuples of protocol, IP version and file path, or 
+                     None if /proc/net is not available.
+        
+        """
+        if not os.path.isfile(os.path.join(procNetDir, 'tcp')):
+            return None
+        files = []
+        for (proto, enabled) in (('tcp', tcp), ('udp', udp)):
+            if enabled:
+                for (ipversion, suffix, ver_enabled) in (('4', '', ipv4), 
+                                                         ('6', '6', ipv6)):
+                    if ver_enabled:
+                        path = os.path.join(procNetDir, proto + suffix)
+                        if os.path.exists(path):
+                            files.append((proto, ipversion, path))
+        return files
+    
+    def iterProcNet(self, tcp=True, udp=True, ipv4=True, ipv6=True,
+                    include_listen=True, only_listen=False):
+        """Generator for streaming the lines of the socket tables in /proc/net
+        without decoding the columns.
+        
+        TCP sockets in LISTEN state and UDP sockets without remote address 
+        (in CLOSE state) are considered as listening sockets.
+        
+        @param tcp:            Include TCP sockets if True.
+        @param udp:            Include UDP sockets if True.
+        @param ipv4:           Include IPv4 sockets if True.
+        @param ipv6:           Include IPv6 sockets if True.
+        @param include_listen: Include listening sockets if True.
+        @param only_listen:    Include only listening sockets if True.
+        @return:               Iterator of tuples of protocol, IP version and 
+                               list of columns of lines.
+        
+        """
+        files = self._getProcNetFiles(tcp, udp, ipv4, ipv6)
+        if files is None:
+            return
+        for (proto, ipversion, path) in files:
+            if proto == 'tcp':
+                listen_state = tcpStateListen
+            else:
+                listen_state = tcpStateClose
+            try:
+                fp = open(path, 'r')
+            except IOError:
+                continue
+            try:
+                fp.readline()
+                for line in fp:
+                    cols = line.split(None, 10)
+                    if len(cols) < 10:
+                        continue
+                    if cols[3] == listen_state:
+                        if not (include_listen or only_listen):
+                            continue
+                    elif only_listen:
+                        continue
+                    yield (proto, ipversion, cols)
+            finally:
+                fp.close()
+    
+    def parseProcNet(self, tcp=True, udp=True, ipv4=True, ipv6=True, 
+                     include_listen=True, only_listen=False, 
+                     show_users=False, resolve_users=True):
+        """Read socket tables in /proc/net and return the result in the same 
+        format as parseNetstatCmd.
+        
+        @param tcp:            Include TCP ports in ouput if True.
+        @param udp:            Include UDP ports in ouput if True.
+        @param ipv4:           Include IPv4 ports in output if True.
+        @param ipv6:           Include IPv6 ports in output if True.
+        @param include_listen: Include listening ports in output if True.
+        @param only_listen:    Include only listening ports in output if True.
+        @param show_users:     Show info on owning users for ports if True.
+        @param resolve_users:  Resolve numeric user IDs to user names if True.
+        @return:               List of headers and list of rows and columns or
+                               None if /proc/net is not available.
+        
+        """
+        if self._getProcNetFiles(tcp, udp, ipv4, ipv6) is None:
+            return None
+        headers = list(netstatHeaders)
+        if show_users:
+            headers.extend(netstatUserHeaders)
+        if resolve_users:
+            user_func = self.getUserName
+        else:
+            user_func = str
+        num_cols = len(headers)
+        stats = [ProcNetRow(proto, ipversion, cols, user_func).getCols(num_cols)
+                 for (proto, ipversion, cols) 
+                 in self.iterProcNet(tcp, udp, ipv4, ipv6, 
+                                     include_listen, only_listen)]
+        return {'headers': headers, 'stats': stats}
+    
+    def _useProcNet(self, show_procs=False, resolve_hosts=False, 
+                    resolve_ports=False):
+        """Returns True if the socket tables in /proc/net can be used instead 
+        of the netstat command for the options.
+        
+        @param show_procs:    Show info on PID and Program Name attached to
+                              ports if True.
+        @param resolve_hosts: Resolve IP addresses into names if True.
+        @param resolve_ports: Resolve numeric ports to names if True.
+        @return:              Boolean
+        
+        """
+        return (self._useProcfs 
+                and not (show_procs or resolve_hosts or resolve_ports)
+                and self._getProcNetFiles() is not None)
+    
+    def _getRowFilter(self, **kwargs):
+        """Returns filter for lines of socket tables.
+        
+        @param **kwargs: Filters in the format of the keyword arguments of 
+                         getStats.
+        @return:         Function that returns True for lines passing the 
+                         filters or None if there are no filters.
+        
+        """
+        if not kwargs:
+            return None
+        headers = netstatHeaders + netstatUserHeaders
+        pfilter = util.TableFilter()
+        pfilter.registerFilters(**kwargs)
+        return (lambda proto, ipversion, cols: 
+                pfilter.checkRow(headers, ProcNetRow(proto, ipversion, cols,
+                                                     self.getUserName)))
     
     def execNetstatCmd(self, *args):
         """Execute ps command with positional params args and return result as 
@@ -35,7 +334,8 @@ class NetstatInfo:
         @return:      List of output lines
         
         """
-        out = util.exec_command([netstatCmd,] + list(args))
+        out = util.exec_command([netstatCmd,] + list(args),
+                                cache=self._execCache)
         return out.splitlines()
     
     def parseNetstatCmd(self, tcp=True, udp=True, ipv4=True, ipv6=True, 
@@ -103,7 +403,7 @@ class NetstatInfo:
             mobj = regexp.match(line)
             if mobj is not None:
                 stat = list(mobj.groups())
-                if stat[1] == '0':
+                if stat[1] in ('', '0'):
                     stat[1] = '4'
                 if stat[8] == '':
                     stat[8] = None
@@ -154,10 +454,16 @@ class NetstatInfo:
         @return:               List of headers and list of rows and columns.
         
         """
-        pinfo = self.parseNetstatCmd(tcp, udp, ipv4, ipv6, 
-                                     include_listen, only_listen,
-                                     show_users, show_procs, 
-                                     resolve_hosts, resolve_ports, resolve_users)
+        if self._useProcNet(show_procs, resolve_hosts, resolve_ports):
+            pinfo = self.parseProcNet(tcp, udp, ipv4, ipv6, 
+                                      include_listen, only_listen,
+                                      show_users, resolve_users)
+        else:
+            pinfo = self.parseNetstatCmd(tcp, udp, ipv4, ipv6, 
+                                         include_listen, only_listen,
+                                         show_users, show_procs, 
+                                         resolve_hosts, resolve_ports, 
+                                         resolve_users)
         if pinfo:
             if len(kwargs) > 0:
                 pfilter = util.TableFilter()
@@ -197,6 +503,18 @@ class NetstatInfo:
         
         """
         status_dict = {}
+        if self._useProcNet():
+            row_filter = self._getRowFilter(**kwargs)
+            counts = {}
+            for (proto, ipversion, cols) in self.iterProcNet(
+                    tcp=True, udp=False, ipv4=ipv4, ipv6=ipv6, 
+                    include_listen=include_listen):
+                if row_filter is None or row_filter(proto, ipversion, cols):
+                    counts[cols[3]] = counts.get(cols[3], 0) + 1
+            for (code, count) in counts.iteritems():
+                status = tcpStates.get(code, 'UNKNOWN').lower()
+                status_dict[status] = status_dict.get(status, 0) + count
+            return status_dict
         result = self.getStats(tcp=True, udp=False, 
                                include_listen=include_listen, 
                                ipv4=ipv4, ipv6=ipv6, 
@@ -236,6 +554,21 @@ class NetstatInfo:
         
         """
         port_dict = {}
+        if self._useProcNet(resolve_ports=resolve_ports):
+            row_filter = self._getRowFilter(**kwargs)
+            counts = {}
+            for (proto, ipversion, cols) in self.iterProcNet(
+                    tcp=True, udp=False, ipv4=ipv4, ipv6=ipv6, 
+                    include_listen=False):
+                if cols[3] == tcpStateEstablished:
+                    if row_filter is None or row_filter(proto, ipversion, 
+                                                        cols):
+                        port = cols[1][-4:]
+                        counts[port] = counts.get(port, 0) + 1
+            for (port, count) in counts.iteritems():
+                port = decode_port(port)
+                port_dict[port] = port_dict.get(port, 0) + count
+            return port_dict
         result = self.getStats(tcp=True, udp=False, 
                                include_listen=False, ipv4=ipv4, 
                                ipv6=ipv6, resolve_ports=resolve_ports,
@@ -243,6 +576,6 @@ class NetstatInfo:
         stats = result['stats']
         for stat in stats:
             if stat[8] == 'ESTABLISHED':
-                port_dict[stat[5]] = port_dict.get(5, 0) + 1
+                port_dict[stat[5]] = port_dict.get(stat[5], 0) + 1
         return port_dict
     
\ No newline at end of file
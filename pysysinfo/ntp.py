@@ -25,6 +25,14 @@ ntpdateCmd = "ntpdate"
 
 class NTPinfo:
     """Class to retrieve stats for Time Synchronization from NTP Service"""
+    
+    def __init__(self, exec_cache=None):
+        """Initialize NTP Stats.
+        
+        @param exec_cache: ExecCache instance for the output of commands.
+        
+        """
+        self._execCache = exec_cache
 
     def getPeerStats(self):
         """Get NTP Peer Stats for localhost by querying local NTP Server.
@@ -33,7 +41,8 @@ class NTPinfo:
 
         """
         info_dict = {}
-        output = util.exec_command([ntpqCmd, '-n', '-c', 'peers'])
+        output = util.exec_command([ntpqCmd, '-n', '-c', 'peers'],
+                                   cache=self._execCache)
         for line in output.splitlines():
             mobj = re.match('\*(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s+', line)
             if mobj:
@@ -57,7 +66,8 @@ class NTPinfo:
 
         """
         info_dict = {}
-        output = util.exec_command([ntpdateCmd, '-u', '-q', host])
+        output = util.exec_command([ntpdateCmd, '-u', '-q', host],
+                                   cache=self._execCache)
         for line in output.splitlines():
             mobj = re.match('server.*,\s*stratum\s+(\d),.*'
                             'offset\s+([\d\.-]+),.*delay\s+([\d\.]+)\s*$', 
@@ -78,7 +88,8 @@ class NTPinfo:
 
         """
         info_dict = {}
-        output = util.exec_command([ntpdateCmd, '-u', '-q'] + list(hosts))
+        output = util.exec_command([ntpdateCmd, '-u', '-q'] + list(hosts),
+                                   cache=self._execCache)
         for line in output.splitlines():
             mobj = re.match('server\s+(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}),'
                             '\s*stratum\s+(\d),.*offset\s+([\d\.-]+),'
@@ -5,7 +5,6 @@ The status interface of PHP FastCGI Process Manager must be enabled.
 
 """
 
-import re
 import util
 
 __author__ = "Ali Onur Uyar"
@@ -69,12 +68,7 @@ class PHPfpmInfo:
         url = "%s://%s:%d/%s" % (self._proto, self._host, self._port, 
                                  self._monpath)
         response = util.get_url(url, self._user, self._password)
-        stats = {}
-        for line in response.splitlines():
-            mobj = re.match('([\w\s]+):\s+(\w+)$', line)
-            if mobj:
-                stats[mobj.group(1)] = util.parse_value(mobj.group(2))
-        return stats
+        return util.parse_stats(response, 'colon')
     
                 
             
@@ -76,9 +76,10 @@ class PgInfo:
     def _connect(self):
         """Establish connection to PostgreSQL Database."""
         if self._connParams:
-            self._conn = psycopg2.connect(**self._connParams)
+            conn = psycopg2.connect(**self._connParams)
         else:
-            self._conn = psycopg2.connect('')
+            conn = psycopg2.connect('')
+        self._conn = util.timed_connection(conn)
         try:
             ver_str = self._conn.get_parameter_status('server_version')
         except AttributeError:
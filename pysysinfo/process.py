@@ -2,7 +2,9 @@
 
 """
 
+import os
 import re
+import pwd
 import util
 
 __author__ = "Ali Onur Uyar"
@@ -17,17 +19,45 @@ __status__ = "Development"
 
 # Defaults
 psCmd = '/bin/ps'
+procDir = '/proc'
+procReadSize = 4096
 
 
 # Maps
 procStatusNames = {'D': 'uninterruptable_sleep',
+                   'I': 'idle',
                    'R': 'running',
                    'S': 'sleep',
                    'T': 'stopped',
+                   't': 'stopped',
                    'W': 'paging',
                    'X': 'dead',
                    'Z': 'defunct'}
 
+# Maps ps format specifiers to the position of the field in /proc/[pid]/stat
+# after the command name or to the name of the field computed by the /proc 
+# scanner.
+procStatFields = {'pid': 'pid',
+                  'tid': 'tid', 'spid': 'tid', 'lwp': 'tid',
+                  'comm': 'comm', 'ucmd': 'comm', 'ucomm': 'comm',
+                  'cmd': 'cmd', 'args': 'cmd', 'command': 'cmd',
+                  'user': 'user', 'euser': 'user', 'uname': 'user',
+                  'uid': 'uid', 'euid': 'uid',
+                  'stat': 'stat',
+                  's': 0, 'state': 0,
+                  'ppid': 1,
+                  'pgid': 2, 'pgrp': 2,
+                  'sid': 3, 'sess': 3, 'session': 3,
+                  'tpgid': 5,
+                  'ni': 'nice', 'nice': 'nice',
+                  'nlwp': 17, 'thcount': 17,
+                  'vsz': 'vsz', 'vsize': 'vsz',
+                  'rss': 'rss', 'rssize': 'rss', 'rsz': 'rss',
+                  'psr': 36,}
+
+# Fields of processes available for the filters of groups in ProcessAcctInfo.
+procAcctHeaders = ('pid', 'user', 'comm', 'cmd')
+
 psFieldWidth = {'args': 128,
                 'cmd': 128,
                 'command': 128,
@@ -40,9 +70,18 @@ psDefaultFieldWidth = 16
 class ProcessInfo:
     """Class to retrieve stats for processes."""
     
-    def __init__(self):
-        """Initialize Process Stats."""
-        pass
+    def __init__(self, use_procfs=True, exec_cache=None):
+        """Initialize Process Stats.
+        
+        @param use_procfs: Scan the /proc filesystem for process stats if 
+                           True; the ps command is used if False or if the 
+                           requested fields are not available in /proc.
+        @param exec_cache: ExecCache instance for the output of commands.
+        
+        """
+        self._useProcfs = use_procfs
+        self._execCache = exec_cache
+        self._users = {}
     
     def execProcCmd(self, *args):
         """Execute ps command with positional params args and return result as 
@@ -52,7 +91,7 @@ class ProcessInfo:
         @return:      List of output lines
         
         """
-        out = util.exec_command([psCmd,] + list(args))
+        out = util.exec_command([psCmd,] + list(args), cache=self._execCache)
         return out.splitlines()
     
     def parseProcCmd(self, fields=('pid', 'user', 'cmd',), threads=False):
@@ -97,14 +136,217 @@ class ProcessInfo:
         else:
             return None
         
+    def parseProcDir(self, fields=('pid', 'user', 'cmd',), threads=False):
+        """Scan /proc/[pid]/stat or /proc/[pid]/task/[tid]/stat files and 
+        return the fields as nested list in the same format as parseProcCmd.
+        
+        The fields are designated using the Standard Format Specifiers from ps 
+        man page; only the files needed for the requested fields are read. 
+        Processes and threads that exit during the scan are skipped.
+        
+        @param fields:  List of fields included in the output.
+                        Default: pid, user, cmd
+        @param threads: If True, include threads in output. 
+        @return:        List of headers and list of rows and columns or None 
+                        if /proc is not available or some of the fields are 
+                        not supported.
+        
+        """
+        headers = [f.lower() for f in fields]
+        sources = []
+        for header in headers:
+            source = procStatFields.get(header)
+            if source is None:
+                return None
+            sources.append(source)
+        need_uid = 'user' in sources or 'uid' in sources
+        need_cmd = 'cmd' in sources
+        need_lock = 'stat' in sources
+        try:
+            entries = os.listdir(procDir)
+        except OSError:
+            return None
+        page_kb = os.sysconf('SC_PAGE_SIZE') / 1024
+        stats = []
+        for pid in entries:
+            if not pid.isdigit():
+                continue
+            pid_dir = "%s/%s" % (procDir, pid)
+            try:
+                if need_uid:
+                    uid = os.stat(pid_dir).st_uid
+                else:
+                    uid = None
+                if need_cmd:
+                    cmdline = self._readProcFile(pid_dir, 'cmdline')
+                else:
+                    cmdline = None
+                if need_lock:
+                    locked = self._isLocked(pid_dir)
+                else:
+                    locked = False
+                if threads:
+                    task_dir = "%s/task" % pid_dir
+                    tasks = [(tid, "%s/%s" % (task_dir, tid)) 
+                             for tid in os.listdir(task_dir)]
+                else:
+                    tasks = ((pid, pid_dir),)
+            except (IOError, OSError):
+                continue
+            for (tid, path) in tasks:
+                try:
+                    data = self._readProcFile(path, 'stat')
+                except (IOError, OSError):
+                    continue
+                idx = data.rfind(')')
+                if idx < 0:
+                    continue
+                comm = data[data.find('(') + 1:idx]
+                cols = data[idx + 2:].split()
+                row = []
+                for source in sources:
+                    if isinstance(source, int):
+                        if source < len(cols):
+                            row.append(cols[source])
+                        else:
+                            row.append('-')
+                    elif source == 'pid':
+                        row.append(pid)
+                    elif source == 'tid':
+                        row.append(tid)
+                    elif source == 'comm':
+                        row.append(comm)
+                    elif source == 'stat':
+                        row.append(self._getStatFlags(pid, cols, locked))
+                    elif source == 'cmd':
+                        if cmdline:
+                            row.append(cmdline.rstrip('\0').replace('\0', ' '))
+                        else:
+                            row.append("[%s]" % comm)
+                    elif source == 'user':
+                        row.append(self._getUserName(uid))
+                    elif source == 'uid':
+                        row.append(str(uid))
+                    elif source == 'nice':
+                        if len(cols) > 38 and cols[38] not in ('0', '3', '5'):
+                            # Real-time scheduling policy.
+                            row.append('-')
+                        else:
+                            row.append(cols[16])
+                    elif source == 'vsz':
+                        row.append(str(int(cols[20]) / 1024))
+                    elif source == 'rss':
+                        row.append(str(int(cols[21]) * page_kb))
+                stats.append(row)
+        return {'headers': headers, 'stats': stats}
+    
+    def _readProcFile(self, dirpath, name):
+        """Read file in /proc/[pid] directory.
+        
+        The file is read using the file descriptor directly, which is 
+        considerably cheaper than a file object for the small files in /proc.
+        
+        @param dirpath: Path of directory.
+        @param name:    File name.
+        @return:        File contents.
+        
+        """
+        fd = os.open("%s/%s" % (dirpath, name), os.O_RDONLY)
+        try:
+            data = os.read(fd, procReadSize)
+            if len(data) < procReadSize:
+                return data
+            chunks = [data]
+            while data:
+                data = os.read(fd, procReadSize)
+                chunks.append(data)
+            return ''.join(chunks)
+        finally:
+            os.close(fd)
+        
+    def _isLocked(self, pid_dir):
+        """Returns True if process has pages locked into memory.
+        
+        @param pid_dir: Path of /proc/[pid] directory.
+        @return:        Boolean
+        
+        """
+        data = self._readProcFile(pid_dir, 'status')
+        idx = data.find('VmLck:')
+        if idx < 0:
+            return False
+        cols = data[idx + 6:idx + 40].split()
+        return len(cols) > 0 and cols[0] != '0'
+            
+    def _getStatFlags(self, pid, cols, locked):
+        """Returns multi-character process state as shown by ps in the stat 
+        field.
+        
+        @param pid:    Process ID.
+        @param cols:   Fields of /proc/[pid]/stat following the command name.
+        @param locked: True if the process has pages locked into memory.
+        @return:       State string.
+        
+        """
+        flags = [cols[0]]
+        nice = cols[16]
+        if nice.startswith('-'):
+            flags.append('<')
+        elif nice != '0':
+            flags.append('N')
+        if locked:
+            flags.append('L')
+        if cols[3] == pid:
+            flags.append('s')
+        if cols[17] != '1':
+            flags.append('l')
+        if cols[5] == cols[2]:
+            flags.append('+')
+        return ''.join(flags)
+    
+    def _getUserName(self, uid):
+        """Returns user name for user ID. The user ID is returned if no user 
+        name is defined.
+        
+        @param uid: User ID.
+        @return:    User name.
+        
+        """
+        name = self._users.get(uid)
+        if name is None:
+            try:
+                name = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                name = str(uid)
+            self._users[uid] = name
+        return name
+    
+    def getProcTable(self, fields=('pid', 'user', 'cmd',), threads=False):
+        """Return the fields for all processes or threads as nested list. 
+        
+        The /proc filesystem is scanned if possible and the ps command is 
+        executed otherwise.
+        
+        @param fields:  List of fields included in the output.
+                        Default: pid, user, cmd
+        @param threads: If True, include threads in output. 
+        @return:        List of headers and list of rows and columns.
+        
+        """
+        if self._useProcfs:
+            pinfo = self.parseProcDir(fields, threads)
+            if pinfo is not None:
+                return pinfo
+        return self.parseProcCmd(fields, threads)
+        
     def getProcList(self, fields=('pid', 'user', 'cmd',), threads=False,
                     **kwargs):
-        """Execute ps command with custom output format with columns columns 
-        from fields, select lines using the filters defined by kwargs and return 
-        result as a nested list.
+        """Get process table with columns from fields, select lines using the 
+        filters defined by kwargs and return result as a nested list.
         
         The Standard Format Specifiers from ps man page must be used for the
-        fields parameter.
+        fields parameter. The table is built by scanning /proc if possible and 
+        using the ps command otherwise.
         
         @param fields:   Fields included in the output.
                          Default: pid, user, cmd
@@ -131,7 +373,7 @@ class ProcessInfo:
             col = re.sub('(_ic)?(_regex)?$', '', key)
             if not col in field_list:
                 field_list.append(col)
-        pinfo = self.parseProcCmd(field_list, threads)
+        pinfo = self.getProcTable(field_list, threads)
         if pinfo:
             if len(kwargs) > 0:
                 pfilter = util.TableFilter()
@@ -197,9 +439,118 @@ class ProcessInfo:
         else:
             return None
     
+    def getProcStatCounts(self):
+        """Return process and thread counts per status and priority, counted 
+        in a single pass over /proc.
+        
+        Only the state, nice and thread count fields of /proc/[pid]/stat and 
+        the locked memory of /proc/[pid]/status are read. The counters are kept
+        in arrays indexed by state letter and no per-process rows are built. 
+        The task directory is only read for multi-threaded processes, because 
+        the stat of the main thread matches the stat of the process for the 
+        fields that are counted.
+        
+        @return: Dictionary with the counters for processes (proc) and threads
+                 (thread) in the same format as getProcStatStatus or None if 
+                 /proc is not available.
+        
+        """
+        if not self._useProcfs:
+            return None
+        try:
+            entries = os.listdir(procDir)
+        except OSError:
+            return None
+        # Counters per state letter and priority for processes and threads.
+        # Priority counters: high, low, norm, locked_in_mem
+        proc_states = [0] * 256
+        proc_prio = [0] * 4
+        thread_states = [0] * 256
+        thread_prio = [0] * 4
+        for pid in entries:
+            if not pid.isdigit():
+                continue
+            pid_dir = "%s/%s" % (procDir, pid)
+            try:
+                data = self._readProcFile(pid_dir, 'stat')
+                locked = self._isLocked(pid_dir)
+            except (IOError, OSError):
+                continue
+            cols = data[data.rfind(')') + 2:].split(' ', 18)
+            if len(cols) < 18:
+                continue
+            state = ord(cols[0][0])
+            nice = cols[16]
+            if nice[0] == '-':
+                prio_idx = 0
+            elif nice != '0':
+                prio_idx = 1
+            else:
+                prio_idx = 2
+            proc_states[state] += 1
+            proc_prio[prio_idx] += 1
+            thread_states[state] += 1
+            thread_prio[prio_idx] += 1
+            if locked:
+                proc_prio[3] += 1
+                thread_prio[3] += 1
+            if cols[17] == '1':
+                continue
+            task_dir = "%s/task" % pid_dir
+            try:
+                tasks = os.listdir(task_dir)
+            except OSError:
+                continue
+            for tid in tasks:
+                if tid == pid:
+                    continue
+                try:
+                    data = self._readProcFile("%s/%s" % (task_dir, tid), 'stat')
+                except (IOError, OSError):
+                    continue
+                cols = data[data.rfind(')') + 2:].split(' ', 17)
+                if len(cols) < 17:
+                    continue
+                thread_states[ord(cols[0][0])] += 1
+                nice = cols[16]
+                if nice[0] == '-':
+                    thread_prio[0] += 1
+                elif nice != '0':
+                    thread_prio[1] += 1
+                else:
+                    thread_prio[2] += 1
+                if locked:
+                    thread_prio[3] += 1
+        return {'proc': self._getStatCountDict(proc_states, proc_prio),
+                'thread': self._getStatCountDict(thread_states, thread_prio)}
+    
+    def _getStatCountDict(self, states, prio):
+        """Convert the counter arrays of getProcStatCounts to the dictionary 
+        format returned by getProcStatStatus.
+        
+        @param states: Counters indexed by state letter.
+        @param prio:   Counters for high, low and normal priority and locked 
+                       memory.
+        @return:       Dictionary of process counters.
+        
+        """
+        status = dict(zip(procStatusNames.values(), 
+                          [0,] * len(procStatusNames)))
+        for (letter, name) in procStatusNames.iteritems():
+            status[name] += states[ord(letter)]
+        return {'status': status,
+                'prio': {'high': prio[0], 'low': prio[1], 'norm': prio[2],
+                         'locked_in_mem': prio[3]},
+                'locked_in_mem': prio[3],
+                'total': sum(prio[:3])}
+    
     def getProcStatStatus(self, threads=False, **kwargs):
         """Return process counts per status and priority.
         
+        Without filters the counters are computed by getProcStatCounts() if 
+        /proc is available.
+        
+        @param threads:  If True, count threads instead of processes.
         @param **kwargs: Keyword variables are used for filtering the results
                          depending on the values of the columns. Each keyword 
                          must correspond to a field name with an optional 
@@ -217,26 +568,255 @@ class ProcessInfo:
         @return: Dictionary of process counters.
         
         """
-        procs = self.getProcList(['stat',], threads=threads, **kwargs)
+        if not kwargs:
+            counts = self.getProcStatCounts()
+            if counts is not None:
+                if threads:
+                    return counts['thread']
+                else:
+                    return counts['proc']
+        field_list = ['stat',]
+        for key in kwargs:
+            col = re.sub('(_ic)?(_regex)?$', '', key)
+            if not col in field_list:
+                field_list.append(col)
+        pinfo = self.getProcTable(field_list, threads)
         status = dict(zip(procStatusNames.values(), 
                           [0,] * len(procStatusNames)))
         prio = {'high': 0, 'low': 0, 'norm': 0, 'locked_in_mem': 0}
         total = 0
         locked_in_mem = 0
-        if procs is not None:
-            for cols in procs['stats']:
-                col_stat = cols[0]
-                status[procStatusNames[col_stat[0]]] += 1
+        if pinfo is not None:
+            pfilter = util.TableFilter()
+            pfilter.registerFilters(**kwargs)
+            stat_counts = pfilter.countFilters(pinfo['headers'], 
+                                               pinfo['stats'], 'stat')
+            for (col_stat, count) in stat_counts.iteritems():
+                name = procStatusNames.get(col_stat[:1])
+                if name is not None:
+                    status[name] += count
                 if '<' in col_stat[1:]:
-                    prio['high'] += 1
+                    prio['high'] += count
                 elif 'N' in col_stat[1:]:
-                    prio['low'] += 1
+                    prio['low'] += count
                 else:
-                    prio['norm'] += 1
+                    prio['norm'] += count
                 if 'L' in col_stat[1:]:
-                    locked_in_mem += 1
-                total += 1
+                    locked_in_mem += count
+                total += count
+        prio['locked_in_mem'] = locked_in_mem
         return {'status': status, 
                 'prio': prio, 
                 'locked_in_mem': locked_in_mem, 
                 'total': total}
+
+
+class ProcessAcctInfo(ProcessInfo):
+    """Class to retrieve CPU, memory, page fault and I/O accounting stats for
+    groups of processes."""
+    
+    def __init__(self, groups=None, group_by='comm', exec_cache=None):
+        """Initialize Process Accounting Stats.
+        
+        @param groups:   List of tuples of group name and dictionary of filters
+                         for selecting the processes of the group. The filters 
+                         are defined in the format of the keyword arguments of 
+                         getProcList() on the fields pid, user, comm and cmd.
+                         Processes are assigned to the first matching group and 
+                         processes not matching any group are ignored.
+        @param group_by: Field used as group name for grouping all processes if
+                         groups are not defined: comm or user.
+        @param exec_cache: ExecCache instance for the output of commands.
+        
+        """
+        ProcessInfo.__init__(self, exec_cache=exec_cache)
+        self._groups = []
+        self._groupIdx = None
+        columns = set()
+        if groups:
+            for (name, filters) in groups:
+                for key in filters:
+                    col = re.sub('(_ic)?(_regex)?$', '', key)
+                    if not col in procAcctHeaders:
+                        raise ValueError("Invalid field %s in filters of "
+                                         "process group %s." % (col, name))
+                    columns.add(col)
+                pfilter = util.TableFilter()
+                pfilter.registerFilters(**filters)
+                self._groups.append((name, pfilter))
+        elif group_by in ('comm', 'user'):
+            columns.add(group_by)
+            self._groupIdx = procAcctHeaders.index(group_by)
+        else:
+            raise ValueError("Invalid field for grouping processes: %s" 
+                             % group_by)
+        self._needUid = 'user' in columns
+        self._needCmd = 'cmd' in columns
+    
+    def _getGroup(self, row):
+        """Returns the name of the group for process.
+        
+        @param row: Tuple of the values of the fields in procAcctHeaders.
+        @return:    Group name or None if the process does not belong to any 
+                    group.
+        
+        """
+        if self._groupIdx is not None:
+            return row[self._groupIdx]
+        for (name, pfilter) in self._groups:
+            if pfilter.checkRow(procAcctHeaders, row):
+                return name
+        return None
+    
+    def _getIOBytes(self, pid_dir):
+        """Returns the bytes read and written by process from storage.
+        
+        @param pid_dir: Path of /proc/[pid] directory.
+        @return:        Tuple of bytes read and written; -1 for counters that 
+                        are not available. (Reading /proc/[pid]/io requires the
+                        permissions of the owner of the process.) 
+        
+        """
+        try:
+            data = self._readProcFile(pid_dir, 'io')
+        except (IOError, OSError):
+            return (-1, -1)
+        vals = []
+        for key in ('\nread_bytes:', '\nwrite_bytes:'):
+            idx = data.find(key)
+            if idx < 0:
+                vals.append(-1)
+            else:
+                end = data.find('\n', idx + 1)
+                if end < 0:
+                    end = len(data)
+                vals.append(int(data[idx + len(key):end]))
+        return tuple(vals)
+    
+    def getUptime(self):
+        """Returns time since boot.
+        
+        @return: Uptime in seconds.
+        
+        """
+        return float(self._readProcFile(procDir, 'uptime').split()[0])
+    
+    def getAcctTable(self):
+        """Scan /proc and return accounting counters for the processes that
+        belong to groups.
+        
+        @return: List of tuples of process key (pid.starttime), group name, 
+                 start time in clock ticks since boot, RSS in bytes and tuple 
+                 of counters: CPU time in clock ticks, major page faults, bytes
+                 read and written from storage (-1 if not available).
+                 None if /proc is not available.
+        
+        """
+        try:
+            entries = os.listdir(procDir)
+        except OSError:
+            return None
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        table = []
+        for pid in entries:
+            if not pid.isdigit():
+                continue
+            pid_dir = "%s/%s" % (procDir, pid)
+            try:
+                data = self._readProcFile(pid_dir, 'stat')
+                if self._needUid:
+                    user = self._getUserName(os.stat(pid_dir).st_uid)
+                else:
+                    user = None
+                if self._needCmd:
+                    cmdline = self._readProcFile(pid_dir, 'cmdline')
+                else:
+                    cmdline = None
+            except (IOError, OSError):
+                continue
+            idx = data.rfind(')')
+            if idx < 0:
+                continue
+            comm = data[data.find('(') + 1:idx]
+            if cmdline:
+                cmd = cmdline.rstrip('\0').replace('\0', ' ')
+            elif self._needCmd:
+                cmd = "[%s]" % comm
+            else:
+                cmd = None
+            group = self._getGroup((pid, user, comm, cmd))
+            if group is None:
+                continue
+            cols = data[idx + 2:].split(' ', 22)
+            if len(cols) < 22:
+                continue
+            (io_read, io_write) = self._getIOBytes(pid_dir)
+            table.append(("%s.%s" % (pid, cols[19]), group, int(cols[19]),
+                          int(cols[21]) * page_size,
+                          (int(cols[11]) + int(cols[12]), int(cols[9]), 
+                           io_read, io_write)))
+        return table
+    
+    def getGroupStats(self, prev=None):
+        """Return accounting stats per group of processes.
+        
+        The CPU time, page fault and I/O counters are compared with the 
+        counters of the same processes in the table returned by the previous 
+        call. Processes are identified by PID and start time, so that reused 
+        PIDs are not mistaken for the previous processes. Processes started 
+        after the previous call are counted from zero and processes that have 
+        exited since are dropped from the table, so the size of the table is 
+        bounded by the number of live processes in the groups.
+        
+        @param prev: Table returned by the previous call or None.
+        @return:     Tuple of dictionary of stats per group and table of 
+                     counters for the next call, or None if /proc is not 
+                     available. The stats include the number of processes 
+                     (procs) and the RSS in bytes (rss), and if a previous 
+                     table is available the CPU utilization in percent (cpu),
+                     the major page faults per second (majflt) and the bytes 
+                     per second read and written from storage (read, write).
+        
+        """
+        table = self.getAcctTable()
+        if table is None:
+            return None
+        uptime = self.getUptime()
+        ticks = float(os.sysconf('SC_CLK_TCK'))
+        if prev:
+            prev_counters = prev.get('procs', {})
+            prev_start = prev.get('uptime', uptime) * ticks
+            elapsed = uptime - prev.get('uptime', uptime)
+        else:
+            elapsed = 0
+        counters = {}
+        deltas = {}
+        stats = {}
+        for (key, group, start, rss, vals) in table:
+            counters[key] = vals
+            group_stats = stats.get(group)
+            if group_stats is None:
+                group_stats = {'procs': 0, 'rss': 0}
+                stats[group] = group_stats
+                deltas[group] = [0, 0, 0, 0]
+            group_stats['procs'] += 1
+            group_stats['rss'] += rss
+            if elapsed > 0:
+                prev_vals = prev_counters.get(key)
+                if prev_vals is None:
+                    if start < prev_start:
+                        # Process not tracked in previous run.
+                        continue
+                    prev_vals = (0, 0, 0, 0)
+                group_deltas = deltas[group]
+                for idx in range(4):
+                    if vals[idx] >= 0 and prev_vals[idx] >= 0:
+                        group_deltas[idx] += max(vals[idx] - prev_vals[idx], 0)
+        if elapsed > 0:
+            for (group, group_deltas) in deltas.iteritems():
+                group_stats = stats[group]
+                group_stats['cpu'] = group_deltas[0] * 100 / ticks / elapsed
+                group_stats['majflt'] = group_deltas[1] / elapsed
+                group_stats['read'] = group_deltas[2] / elapsed
+                group_stats['write'] = group_deltas[3] / elapsed
+        return (stats, {'uptime': uptime, 'procs': counters})
@@ -0,0 +1,113 @@
+"""Implements ProcSnapshot Class for sharing the contents of the files in /proc
+between the collectors used in a collection cycle.
+
+    - Each file is read at most once until the snapshot is refreshed; reads
+      go through a single reusable buffer that is sized to hold the whole
+      file, so that the kernel renders files like /proc/stat in one pass.
+    - Parsed views of the files are built lazily on first access and cached
+      on the snapshot along with the raw contents.
+
+"""
+
+import io
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+snapshotBuffSize = 65536
+
+
+class ProcSnapshot:
+    """Class to read and cache the contents of files in /proc."""
+
+    def __init__(self, buff_size=snapshotBuffSize):
+        """Initialize snapshot.
+
+        @param buff_size: Initial size of the read buffer in bytes. The buffer
+                          is grown as needed for larger files.
+
+        """
+        self._buff = bytearray(buff_size)
+        self._files = {}
+        self._views = {}
+
+    def _readFile(self, path):
+        """Read the contents of file into the reusable buffer.
+
+        @param path: File path.
+        @return:     File contents.
+
+        """
+        fp = io.FileIO(path, 'r')
+        try:
+            size = 0
+            while True:
+                if size == len(self._buff):
+                    self._buff.extend(bytearray(len(self._buff)))
+                num_bytes = fp.readinto(memoryview(self._buff)[size:])
+                if not num_bytes:
+                    break
+                size += num_bytes
+        finally:
+            fp.close()
+        return str(self._buff[:size])
+
+    def read(self, path):
+        """Return the contents of file, reading it only if it was not read
+        since the last refresh.
+
+        @param path: File path.
+        @return:     File contents.
+
+        """
+        data = self._files.get(path)
+        if data is None:
+            try:
+                data = self._readFile(path)
+            except (IOError, OSError):
+                raise IOError('Failed reading stats from file: %s' % path)
+            self._files[path] = data
+        return data
+
+    def getView(self, path, parser):
+        """Return parsed view of file, parsing the contents only on first
+        access since the last refresh.
+
+        The views are shared by all callers; they must not be modified.
+
+        @param path:   File path.
+        @param parser: Function that takes the file contents as the single
+                       argument and returns the parsed view.
+        @return:       Parsed view.
+
+        """
+        key = (path, parser)
+        view = self._views.get(key)
+        if view is None:
+            view = parser(self.read(path))
+            self._views[key] = view
+        return view
+
+    def refresh(self, path=None):
+        """Discard cached contents and views so that the files are read again
+        on next access.
+
+        @param path: Discard only the contents and views of file if defined.
+
+        """
+        if path is None:
+            self._files.clear()
+            self._views.clear()
+        else:
+            self._files.pop(path, None)
+            for key in self._views.keys():
+                if key[0] == path:
+                    del self._views[key]
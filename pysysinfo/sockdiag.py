@@ -0,0 +1,345 @@
+"""Implements SockDiagInfo Class for gathering socket stats through the
+NETLINK_SOCK_DIAG interface of the Linux kernel.
+
+    - Socket dumps are requested with state masks and local port filters that
+      are applied by the kernel and the binary replies are aggregated without
+      having the kernel render a text line for each socket.
+    - The socket tables in /proc/net (or the netstat command) are used through
+      NetstatInfo for kernels without sock_diag support and for the requests
+      that cannot be answered through sock_diag.
+
+"""
+
+import os
+import errno
+import socket
+import struct
+from netstat import NetstatInfo, tcpStates
+
+__author__ = "Ali Onur Uyar"
+__copyright__ = "Copyright 2011, Ali Onur Uyar"
+__credits__ = []
+__license__ = "GPL"
+__version__ = "0.9.21"
+__maintainer__ = "Ali Onur Uyar"
+__email__ = "aouyar at gmail.com"
+__status__ = "Development"
+
+
+# Defaults
+sockDiagEnabled = True
+sockDiagBuffSize = 65536
+
+# Netlink and inet_diag constants from the Linux kernel headers.
+netlinkSockDiag = 4
+sockDiagByFamily = 20
+nlmFlagRequest = 0x1
+nlmFlagDump = 0x300
+nlmsgError = 2
+nlmsgDone = 3
+inetDiagReqBytecode = 1
+inetDiagBcJump = 1
+inetDiagBcSrcGE = 2
+inetDiagBcSrcLE = 3
+
+sockDiagProtocols = {'tcp': socket.IPPROTO_TCP,
+                     'udp': socket.IPPROTO_UDP,}
+sockDiagAllStates = 0xffffffff
+
+_nlmsgHeader = struct.Struct('=IHHII')
+_diagReqHeader = struct.Struct('=BBBxI')
+_diagSockID = '\0' * 48
+_nlattrHeader = struct.Struct('=HH')
+_bcOp = struct.Struct('=BBH')
+_portStruct = struct.Struct('>H')
+_errStruct = struct.Struct('=i')
+
+
+def get_state_mask(states):
+    """Returns the bitmask of TCP states for sock_diag requests.
+
+    @param states: List of state names (ESTABLISHED, LISTEN, etc.)
+    @return:       Bitmask of states.
+
+    """
+    mask = 0
+    for (code, name) in tcpStates.iteritems():
+        if name in states:
+            mask |= 1 << int(code, 16)
+    return mask
+
+
+def get_port_filter(ports):
+    """Returns inet_diag bytecode for matching sockets with local port in list
+    of ports.
+
+    Each port is tested with a pair of greater or equal and less or equal
+    comparisons; the tests are chained with jumps to the end of the bytecode
+    on match. Jumps past the end of the bytecode reject the socket.
+
+    @param ports: List of port numbers.
+    @return:      Bytecode string.
+
+    """
+    ops = []
+    num_ports = len(ports)
+    for (idx, port) in enumerate(ports):
+        ops.append(_bcOp.pack(inetDiagBcSrcGE, 8, 20))
+        ops.append(_bcOp.pack(0, 0, port))
+        ops.append(_bcOp.pack(inetDiagBcSrcLE, 8, 12))
+        ops.append(_bcOp.pack(0, 0, port))
+        if idx < num_ports - 1:
+            ops.append(_bcOp.pack(inetDiagBcJump, 4,
+                                  20 * (num_ports - idx - 1)))
+    return ''.join(ops)
+
+
+class SockDiagInfo(NetstatInfo):
+    """Class to retrieve socket stats through NETLINK_SOCK_DIAG."""
+
+    def __init__(self, use_sockdiag=True, use_procfs=True, exec_cache=None):
+        """Initialize Socket Stats.
+
+        @param use_sockdiag: Use NETLINK_SOCK_DIAG if True and supported by
+                             the kernel.
+        @param use_procfs:   Read the socket tables in /proc/net if True
+                             when sock_diag is not used; the netstat command
+                             is used otherwise.
+        @param exec_cache:   ExecCache instance for the output of commands.
+
+        """
+        NetstatInfo.__init__(self, use_procfs, exec_cache)
+        self._useSockDiag = use_sockdiag and sockDiagEnabled
+        self._unsupported = set()
+        self._seq = 0
+
+    def _buildRequest(self, family, protocol, states, ports=None):
+        """Build sock_diag dump request message.
+
+        @param family:   Address family: socket.AF_INET or socket.AF_INET6
+        @param protocol: Protocol number.
+        @param states:   Bitmask of states.
+        @param ports:    List of local ports or None for all ports.
+        @return:         Message string.
+
+        """
+        payload = [_diagReqHeader.pack(family, protocol, 0, states),
+                   _diagSockID]
+        if ports:
+            bytecode = get_port_filter(ports)
+            payload.append(_nlattrHeader.pack(_nlattrHeader.size
+                                              + len(bytecode),
+                                              inetDiagReqBytecode))
+            payload.append(bytecode)
+        payload = ''.join(payload)
+        self._seq += 1
+        return _nlmsgHeader.pack(_nlmsgHeader.size + len(payload),
+                                 sockDiagByFamily,
+                                 nlmFlagRequest | nlmFlagDump,
+                                 self._seq, 0) + payload
+
+    def _countSockets(self, protocol='tcp', ipv4=True, ipv6=True,
+                      states=sockDiagAllStates, ports=None, by_port=False):
+        """Dump sockets through sock_diag and count them by state or by local
+        port.
+
+        @param protocol: Protocol: tcp or udp
+        @param ipv4:     Include IPv4 sockets if True.
+        @param ipv6:     Include IPv6 sockets if True.
+        @param states:   Bitmask of states.
+        @param ports:    List of local ports or None for all ports.
+        @param by_port:  Count sockets by local port if True, by state
+                         otherwise.
+        @return:         List of counts indexed by state or dictionary of
+                         counts indexed by port number, or None if sock_diag
+                         is not available.
+
+        """
+        if not self._useSockDiag or protocol in self._unsupported:
+            return None
+        families = []
+        if ipv4:
+            families.append(socket.AF_INET)
+        if ipv6:
+            families.append(socket.AF_INET6)
+        if by_port:
+            counts = {}
+        else:
+            counts = [0] * 32
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                 netlinkSockDiag)
+        except (socket.error, AttributeError):
+            self._useSockDiag = False
+            return None
+        header_size = _nlmsgHeader.size
+        unpack_header = _nlmsgHeader.unpack_from
+        unpack_port = _portStruct.unpack_from
+        try:
+            sock.bind((0, 0))
+            for family in families:
+                sock.send(self._buildRequest(family,
+                                             sockDiagProtocols[protocol],
+                                             states, ports))
+                done = False
+                while not done:
+                    data = sock.recv(sockDiagBuffSize)
+                    if not data:
+                        break
+                    offset = 0
+                    data_len = len(data)
+                    while offset + header_size <= data_len:
+                        (msg_len, msg_type,
+                         flags, seq, pid) = unpack_header(data, offset) #@UnusedVariable
+                        if msg_type == sockDiagByFamily:
+                            if by_port:
+                                port = unpack_port(data, offset + 20)[0]
+                                counts[port] = counts.get(port, 0) + 1
+                            else:
+                                counts[ord(data[offset + 17])] += 1
+                        elif msg_type == nlmsgDone:
+                            done = True
+                            break
+                        elif msg_type == nlmsgError:
+                            err = -_errStruct.unpack_from(data,
+                                                          offset + 16)[0]
+                            if err:
+                                raise socket.error(err, os.strerror(err))
+                        if msg_len < header_size:
+                            break
+                        offset += (msg_len + 3) & ~3
+        except socket.error, e:
+            if e.args and e.args[0] in (errno.ENOENT, errno.EOPNOTSUPP,
+                                        errno.EPROTONOSUPPORT,
+                                        errno.EAFNOSUPPORT, errno.EINVAL):
+                # No support for the protocol or the filter in the kernel.
+                self._unsupported.add(protocol)
+                return None
+            raise
+        finally:
+            sock.close()
+        return counts
+
+    def getSockStateCounts(self, protocol='tcp', ipv4=True, ipv6=True,
+                           states=None, ports=None):
+        """Returns the number of sockets discriminated by state.
+
+        @param protocol: Protocol: tcp or udp
+        @param ipv4:     Include IPv4 sockets if True.
+        @param ipv6:     Include IPv6 sockets if True.
+        @param states:   List of state names. (All states if None.)
+        @param ports:    List of local port numbers. (All ports if None.)
+        @return:         Dictionary mapping state names to the number of
+                         sockets, or None if sock_diag is not available.
+
+        """
+        if states is None:
+            mask = sockDiagAllStates
+        else:
+            mask = get_state_mask(states)
+        counts = self._countSockets(protocol, ipv4, ipv6, mask, ports)
+        if counts is None:
+            return None
+        state_dict = {}
+        for (state, count) in enumerate(counts):
+            if count > 0:
+                name = tcpStates.get('%02X' % state, 'UNKNOWN')
+                state_dict[name] = state_dict.get(name, 0) + count
+        return state_dict
+
+    def getSockPortCounts(self, protocol='tcp', ipv4=True, ipv6=True,
+                          states=None, ports=None):
+        """Returns the number of sockets for each local port.
+
+        @param protocol: Protocol: tcp or udp
+        @param ipv4:     Include IPv4 sockets if True.
+        @param ipv6:     Include IPv6 sockets if True.
+        @param states:   List of state names. (All states if None.)
+        @param ports:    List of local port numbers. (All ports if None.)
+        @return:         Dictionary mapping port numbers to the number of
+                         sockets, or None if sock_diag is not available.
+
+        """
+        if states is None:
+            mask = sockDiagAllStates
+        else:
+            mask = get_state_mask(states)
+        return self._countSockets(protocol, ipv4, ipv6, mask, ports, True)
+
+    def getTCPportConnStatus(self, ipv4=True, ipv6=True, include_listen=False,
+                             **kwargs):
+        """Returns the number of TCP endpoints discriminated by status.
+
+        The sockets are counted through sock_diag if possible; the socket
+        tables are parsed by NetstatInfo if filters are defined or sock_diag
+        is not available.
+
+        @param ipv4:           Include IPv4 ports in output if True.
+        @param ipv6:           Include IPv6 ports in output if True.
+        @param include_listen: Include listening ports in output if True.
+        @param **kwargs:       Keyword variables are used for filtering the
+                               results depending on the values of the columns
+                               as in NetstatInfo.getTCPportConnStatus.
+        @return:               Dictionary mapping connection status to the
+                               number of endpoints.
+
+        """
+        if not kwargs:
+            if include_listen:
+                mask = sockDiagAllStates
+            else:
+                mask = sockDiagAllStates & ~get_state_mask(('LISTEN',))
+            counts = self._countSockets('tcp', ipv4, ipv6, mask)
+            if counts is not None:
+                status_dict = {}
+                for (state, count) in enumerate(counts):
+                    if count > 0:
+                        status = tcpStates.get('%02X' % state,
+                                               'UNKNOWN').lower()
+                        status_dict[status] = (status_dict.get(status, 0)
+                                               + count)
+                return status_dict
+        return NetstatInfo.getTCPportConnStatus(self, ipv4, ipv6,
+                                                include_listen, **kwargs)
+
+    def getTCPportConnCount(self, ipv4=True, ipv6=True, resolve_ports=False,
+                            **kwargs):
+        """Returns TCP connection counts for each local port.
+
+        The connections are counted through sock_diag with the filter on
+        local ports applied by the kernel if possible; the socket tables are
+        parsed by NetstatInfo if filters on other fields are defined or
+        sock_diag is not available.
+
+        @param ipv4:          Include IPv4 ports in output if True.
+        @param ipv6:          Include IPv6 ports in output if True.
+        @param resolve_ports: Resolve numeric ports to names if True.
+        @param **kwargs:      Keyword variables are used for filtering the
+                              results depending on the values of the columns
+                              as in NetstatInfo.getTCPportConnCount.
+        @return:              Dictionary mapping port number or name to the
+                              number of established connections.
+
+        """
+        filters = dict(kwargs)
+        ports = filters.pop('localport', None)
+        if isinstance(ports, basestring):
+            ports = [ports,]
+        if not (resolve_ports or filters):
+            try:
+                if ports is not None:
+                    port_list = [int(port) for port in ports]
+                else:
+                    port_list = None
+            except ValueError:
+                port_list = ()
+            if port_list is not None and len(port_list) == 0:
+                return {}
+            counts = self._countSockets('tcp', ipv4, ipv6,
+                                        get_state_mask(('ESTABLISHED',)),
+                                        port_list, True)
+            if counts is not None:
+                return dict([(str(port), count)
+                             for (port, count) in counts.iteritems()])
+        return NetstatInfo.getTCPportConnCount(self, ipv4, ipv6,
+                                               resolve_ports, **kwargs)
@@ -27,6 +27,13 @@ buffSize = 4096
 
 memMultiplier = {'G': 1024 * 1024 * 1024, 'M':1024 * 1024, 'K':1024}
 
+_intUnitPattern = re.compile('(-{0,1}\d+)\s*(\sseconds|/\s*\w+)$')
+_floatUnitPattern = re.compile('(-{0,1}\d*\.\d+)\s*(\sseconds|/\s*\w+)$')
+_memPattern = re.compile('(-{0,1}\d+)\s*([GMK])B$')
+_percentPattern = re.compile('(-{0,1}\d+(\.\d+){0,1})\s*\%$')
+_counterPattern = re.compile('^[ \t]*([\w\.]+)[ \t]*=[ \t]*(\S.*?)[ \t]*\r?$', 
+                             re.MULTILINE)
+
 
 def parse_value(val):
     """Parse input string and return int, float or str depending on format.
@@ -35,17 +42,19 @@ def parse_value(val):
     @return:    Value of type int, float or str.
         
     """
-    
-    mobj = re.match('(-{0,1}\d+)\s*(\sseconds|/\s*\w+)$',  val)
+    val = util.parse_value(val)
+    if not isinstance(val, str):
+        return val
+    mobj = _intUnitPattern.match(val)
     if mobj:
         return int(mobj.group(1))
-    mobj = re.match('(-{0,1}\d*\.\d+)\s*(\sseconds|/\s*\w+)$',  val)
+    mobj = _floatUnitPattern.match(val)
     if mobj:
         return float(mobj.group(1))
-    re.match('(-{0,1}\d+)\s*([GMK])B$',  val)
+    mobj = _memPattern.match(val)
     if mobj:
         return int(mobj.group(1)) * memMultiplier[mobj.group(2)]
-    mobj = re.match('(-{0,1}\d+(\.\d+){0,1})\s*\%$',  val)
+    mobj = _percentPattern.match(val)
     if mobj:
         return float(mobj.group(1)) / 100 
     return val
@@ -114,20 +123,18 @@ class SquidInfo:
                             "HTTP - Status: %s    Reason: %s" 
                             % (self._host, self._port, rp.status, rp.reason))
     
-    def _parseCounters(self, data):
+    def _parseCounters(self, data, wanted=None):
         """Parse simple stats list of key, value pairs.
         
-        @param data: Multiline data with one key-value pair in each line.
-        @return:     Dictionary of stats.
+        @param data:   Multiline data with one key-value pair in each line.
+        @param wanted: List of wanted counter names. Names ending with .* 
+                       select all counters with the prefix. All counters are
+                       parsed if None.
+        @return:       CounterStore object with counters.
             
         """
-        info_dict = util.NestedDict()
-        for line in data.splitlines():
-            mobj = re.match('^\s*([\w\.]+)\s*=\s*(\S.*)$', line)
-            if mobj:
-                (key, value) = mobj.groups()
-                klist = key.split('.')
-                info_dict.set_nested(klist, parse_value(value))
+        info_dict = util.CounterStore(wanted)
+        info_dict.load(_counterPattern.findall(data), parse_value)
         return info_dict
     
     def _parseSections(self, data):
@@ -181,14 +188,21 @@ class SquidInfo:
                 info_list.append(mobj.groups())
         return info_list
     
-    def getCounters(self):
+    def getCounters(self, wanted=None):
         """Get Traffic and Resource Counters from Squid Proxy Server.
         
-        @return: Dictionary of stats.
+        The counters are returned in a flat store indexed by dotted names 
+        (client_http.requests), which also supports nested access 
+        (stats['client_http']['requests']).
+        
+        @param wanted: List of wanted counter names. Names ending with .* 
+                       select all counters with the prefix (client_http.*).
+                       All counters are returned if None.
+        @return:       CounterStore object with counters.
             
         """
         data = self._retrieve('counters')
-        return self._parseCounters(data)
+        return self._parseCounters(data, wanted)
     
     def getInfo(self):
         """Get General Run-time Information from Squid Proxy Server.
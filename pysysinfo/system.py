@@ -5,6 +5,7 @@
 import re
 import os
 import platform
+from array import array
 
 __author__ = "Ali Onur Uyar"
 __copyright__ = "Copyright 2011, Ali Onur Uyar"
@@ -23,12 +24,199 @@ cpustatFile = '/proc/stat'
 meminfoFile = '/proc/meminfo'
 swapsFile = '/proc/swaps'
 vmstatFile = '/proc/vmstat'
+interruptsFile = '/proc/interrupts'
+softirqsFile = '/proc/softirqs'
 
+cpuStatHeaders = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 
+                  'softirq', 'steal', 'guest')
+
+
+def parse_cpustat(data):
+    """Parse the contents of /proc/stat.
+    
+    @param data: File contents.
+    @return:     Dictionary mapping the first column of each line to the list 
+                 of the remaining columns.
+    
+    """
+    info_dict = {}
+    for line in data.splitlines():
+        arr = line.split()
+        if len(arr) > 1:
+            info_dict[arr[0]] = arr[1:]
+    return info_dict
+
+
+def parse_irqstat(data):
+    """Parse the contents of /proc/interrupts or /proc/softirqs.
+    
+    The header line lists the online CPUs; each of the remaining lines starts 
+    with the name of the interrupt followed by the per CPU counts and an 
+    optional description. The per CPU counts of each interrupt are kept in an 
+    array along with the sum for all CPUs.
+    
+    @param data: File contents.
+    @return:     Tuple of list of cpu names (cpu0, cpu1, etc.), list of 
+                 interrupt names, list of descriptions, array of counts summed 
+                 up for all cpus and list of arrays of per cpu counts. (The 
+                 per cpu arrays are shorter than the list of cpus for 
+                 interrupts that are not counted per cpu.)
+    
+    """
+    cpus = []
+    names = []
+    descs = []
+    counts = array('d')
+    cpu_counts = []
+    lines = data.splitlines()
+    if lines:
+        cpus = [col.lower() for col in lines[0].split()]
+        num_cpus = len(cpus)
+        for line in lines[1:]:
+            (name, sep, rest) = line.partition(':')
+            if not sep:
+                continue
+            cols = rest.split(None, num_cpus)
+            try:
+                row = array('d', map(int, cols[:num_cpus]))
+            except ValueError:
+                # Fewer counts than cpus followed by description.
+                row = array('d')
+                for col in cols[:num_cpus]:
+                    if not col.isdigit():
+                        break
+                    row.append(int(col))
+            if not row:
+                continue
+            names.append(name.strip())
+            descs.append(' '.join(' '.join(cols[len(row):]).split()))
+            counts.append(sum(row))
+            cpu_counts.append(row)
+    return (cpus, names, descs, counts, cpu_counts)
+
+
+def calc_counter_deltas(names, counts, prev_names, prev_counts):
+    """Return the increments of counters since a previous reading.
+    
+    Counters are matched by name; counters that are missing from the previous 
+    reading or that have been reset are counted from zero.
+    
+    @param names:       List of counter names.
+    @param counts:      Array of counter values.
+    @param prev_names:  List of counter names of previous reading.
+    @param prev_counts: Array of counter values of previous reading.
+    @return:            Array of increments in the order of names.
+    
+    """
+    deltas = array('d', counts)
+    if list(names) == list(prev_names):
+        for idx in xrange(len(deltas)):
+            if deltas[idx] >= prev_counts[idx]:
+                deltas[idx] -= prev_counts[idx]
+    else:
+        prev_idx = dict([(name, idx) for (idx, name) in enumerate(prev_names)])
+        for (idx, name) in enumerate(names):
+            pidx = prev_idx.get(name)
+            if pidx is not None and deltas[idx] >= prev_counts[pidx]:
+                deltas[idx] -= prev_counts[pidx]
+    return deltas
+
+
+def parse_meminfo(data):
+    """Parse the contents of /proc/meminfo.
+    
+    @param data: File contents.
+    @return:     Dictionary of stats in bytes.
+    
+    """
+    info_dict = {}
+    for line in data.splitlines():
+        mobj = re.match('^(.+):\s*(\d+)\s*(\w+|)\s*$', line)
+        if mobj:
+            if mobj.group(3).lower() == 'kb':
+                mult = 1024
+            else:
+                mult = 1
+            info_dict[mobj.group(1)] = int(mobj.group(2)) * mult
+    return info_dict
+
+
+def parse_swaps(data):
+    """Parse the contents of /proc/swaps.
+    
+    @param data: File contents.
+    @return:     Dictionary mapping swap partitions and files to dictionaries 
+                 of attributes.
+    
+    """
+    info_dict = {}
+    lines = data.splitlines()
+    if len(lines) > 1:
+        colnames = [name.lower() for name in lines[0].split()]
+        for line in lines[1:]:
+            cols = line.split()
+            info_dict[cols[0]] = dict(zip(colnames[1:], cols[1:]))
+    return info_dict
+
+
+def parse_vmstat(data):
+    """Parse the contents of /proc/vmstat.
+    
+    @param data: File contents.
+    @return:     Dictionary of stats.
+    
+    """
+    info_dict = {}
+    for line in data.splitlines():
+        cols = line.split()
+        if len(cols) == 2:
+            info_dict[cols[0]] = cols[1]
+    return info_dict
 
 
 class SystemInfo:
     """Class to retrieve stats for system resources."""
     
+    def __init__(self, snapshot=None):
+        """Initialize System Stats.
+        
+        @param snapshot: ProcSnapshot instance shared with other collectors. 
+                         The files in /proc are read once per refresh of the 
+                         snapshot if defined, and on each call otherwise.
+        
+        """
+        self._snapshot = snapshot
+    
+    def _readFile(self, path):
+        """Read the contents of a file in /proc.
+        
+        @param path: File path.
+        @return:     File contents.
+        
+        """
+        if self._snapshot is not None:
+            return self._snapshot.read(path)
+        try:
+            fp = open(path, 'r')
+            data = fp.read()
+            fp.close()
+        except:
+            raise IOError('Failed reading stats from file: %s' % path)
+        return data
+    
+    def _getView(self, path, parser):
+        """Return the parsed contents of a file in /proc.
+        
+        @param path:   File path.
+        @param parser: Parser function.
+        @return:       Parsed view; shared with other callers if the snapshot 
+                       is used.
+        
+        """
+        if self._snapshot is not None:
+            return self._snapshot.getView(path, parser)
+        return parser(self._readFile(path))
+    
     def getPlatformInfo(self):
         """Get platform info.
         
@@ -49,13 +237,7 @@ class SystemInfo:
         @return: Float that represents uptime in seconds.
         
         """
-        try:
-            fp = open(uptimeFile, 'r')
-            line = fp.readline()
-            fp.close()
-        except:
-            raise IOError('Failed reading stats from file: %s' % uptimeFile)
-        return float(line.split()[0])
+        return float(self._readFile(uptimeFile).split()[0])
     
     def getLoadAvg(self):
         """Return system Load Average.
@@ -63,13 +245,7 @@ class SystemInfo:
         @return: List of 1 min, 5 min and 15 min Load Average figures.
         
         """
-        try:
-            fp = open(loadavgFile, 'r')
-            line = fp.readline()
-            fp.close()
-        except:
-            raise IOError('Failed reading stats from file: %s' % loadavgFile)
-        arr = line.split()
+        arr = self._readFile(loadavgFile).split()
         if len(arr) >= 3:
             return [float(col) for col in arr[:3]]
         else:
@@ -82,18 +258,30 @@ class SystemInfo:
         
         """
         hz = os.sysconf('SC_CLK_TCK')
-        info_dict = {}
-        try:
-            fp = open(cpustatFile, 'r')
-            line = fp.readline()
-            fp.close()
-        except:
-            raise IOError('Failed reading stats from file: %s' % cpustatFile)
-        headers = ['user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal', 'guest']
-        arr = line.split()
-        if len(arr) > 1 and arr[0] == 'cpu':
-            return dict(zip(headers[0:len(arr)], [(float(t) / hz) for t in arr[1:]]))
-        return info_dict
+        arr = self._getView(cpustatFile, parse_cpustat).get('cpu')
+        if arr:
+            return dict(zip(cpuStatHeaders[0:len(arr)], [(float(t) / hz) for t in arr]))
+        return {}
+    
+    def getCPUuseList(self):
+        """Return cpu time utilization in seconds for each cpu.
+        
+        @return: List of tuples of cpu name (cpu0, cpu1, etc.) and array of 
+                 times in seconds in the order of cpuStatHeaders.
+        
+        """
+        hz = float(os.sysconf('SC_CLK_TCK'))
+        stats = self._getView(cpustatFile, parse_cpustat)
+        cpu_nums = [int(key[3:]) for key in stats 
+                    if key.startswith('cpu') and key[3:].isdigit()]
+        cpu_nums.sort()
+        cpu_list = []
+        for num in cpu_nums:
+            cpu = 'cpu%d' % num
+            times = array('d', [int(t) / hz 
+                                for t in stats[cpu][:len(cpuStatHeaders)]])
+            cpu_list.append((cpu, times))
+        return cpu_list
     
     def getProcessStats(self):
         """Return stats for running and blocked processes, forks, 
@@ -103,42 +291,74 @@ class SystemInfo:
         
         """
         info_dict = {}
-        try:
-            fp = open(cpustatFile, 'r')
-            data = fp.read()
-            fp.close()
-        except:
-            raise IOError('Failed reading stats from file: %s' % cpustatFile)
-        for line in data.splitlines():
-            arr = line.split()
-            if len(arr) > 1 and arr[0] in ('ctxt', 'intr', 'softirq',
-                                           'processes', 'procs_running', 
-                                           'procs_blocked'):
-                info_dict[arr[0]] = arr[1]
+        stats = self._getView(cpustatFile, parse_cpustat)
+        for key in ('ctxt', 'intr', 'softirq', 'processes', 'procs_running', 
+                    'procs_blocked'):
+            if stats.has_key(key):
+                info_dict[key] = stats[key][0]
         return info_dict
         
+    def getInterruptStats(self):
+        """Return hardware interrupt counts for each IRQ summed up for all 
+        cpus.
+        
+        @return: Tuple of list of IRQ names, list of descriptions and array of 
+                 counts.
+        
+        """
+        (cpus, names, descs, 
+         counts, cpu_counts) = self._getView(interruptsFile, parse_irqstat) #@UnusedVariable
+        return (list(names), list(descs), array('d', counts))
+    
+    def getInterruptCPUstats(self):
+        """Return hardware interrupt counts for each cpu summed up for all 
+        IRQs.
+        
+        @return: Tuple of list of cpu names and array of counts.
+        
+        """
+        (cpus, names, descs, 
+         counts, cpu_counts) = self._getView(interruptsFile, parse_irqstat) #@UnusedVariable
+        # ERR and MIS are system wide error counters.
+        rows = [row for (name, row) in zip(names, cpu_counts)
+                if len(row) == len(cpus) and name not in ('ERR', 'MIS')]
+        if rows:
+            totals = array('d', map(sum, zip(*rows)))
+        else:
+            totals = array('d', [0]) * len(cpus)
+        return (list(cpus), totals)
+    
+    def getSoftirqStats(self):
+        """Return software interrupt counts for each type (NET_RX, TIMER, 
+        etc.) summed up for all cpus.
+        
+        @return: Tuple of list of softirq names and array of counts.
+        
+        """
+        (cpus, names, descs, 
+         counts, cpu_counts) = self._getView(softirqsFile, parse_irqstat) #@UnusedVariable
+        return (list(names), array('d', counts))
+    
+    def getSoftirqCPUstats(self):
+        """Return software interrupt counts for each type (NET_RX, TIMER, 
+        etc.) and cpu.
+        
+        @return: Tuple of list of cpu names and dictionary mapping softirq 
+                 names to arrays of per cpu counts.
+        
+        """
+        (cpus, names, descs, 
+         counts, cpu_counts) = self._getView(softirqsFile, parse_irqstat) #@UnusedVariable
+        return (list(cpus), dict([(name, array('d', row)) 
+                                  for (name, row) in zip(names, cpu_counts)]))
+        
     def getMemoryUse(self):
         """Return stats for memory utilization.
         
         @return: Dictionary of stats.
         
         """
-        info_dict = {}
-        try:
-            fp = open(meminfoFile, 'r')
-            data = fp.read()
-            fp.close()
-        except:
-            raise IOError('Failed reading stats from file: %s' % meminfoFile)
-        for line in data.splitlines():
-            mobj = re.match('^(.+):\s*(\d+)\s*(\w+|)\s*$', line)
-            if mobj:
-                if mobj.group(3).lower() == 'kb':
-                    mult = 1024
-                else:
-                    mult = 1
-                info_dict[mobj.group(1)] = int(mobj.group(2)) * mult
-        return info_dict
+        return dict(self._getView(meminfoFile, parse_meminfo))
     
     def getSwapStats(self):
         """Return information on swap partition and / or files.
@@ -146,20 +366,8 @@ class SystemInfo:
             @return: Dictionary of stats.
             
         """
-        info_dict = {}
-        try:
-            fp = open(swapsFile, 'r')
-            data = fp.read()
-            fp.close()
-        except:
-            raise IOError('Failed reading stats from file: %s' % swapsFile)
-        lines = data.splitlines()
-        if len(lines) > 1:
-            colnames = [name.lower() for name in lines[0].split()]
-            for line in lines[1:]:
-                cols = line.split()
-                info_dict[cols[0]] = dict(zip(colnames[1:], cols[1:]))
-        return info_dict
+        return dict([(swap, dict(attrs)) for (swap, attrs) 
+                     in self._getView(swapsFile, parse_swaps).iteritems()])
     
     def getVMstats(self):
         """Return stats for Virtual Memory Subsystem.
@@ -167,15 +375,4 @@ class SystemInfo:
         @return: Dictionary of stats.
         
         """
-        info_dict = {}
-        try:
-            fp = open(vmstatFile, 'r')
-            data = fp.read()
-            fp.close()
-        except:
-            raise IOError('Failed reading stats from file: %s' % vmstatFile)
-        for line in data.splitlines():
-            cols = line.split()
-            if len(cols) == 2:
-                info_dict[cols[0]] = cols[1]
-        return info_dict
+        return dict(self._getView(vmstatFile, parse_vmstat))
@@ -2,12 +2,23 @@
 
 """
 
+import os
 import sys
 import re
+import stat
+import time
+import errno
+import fcntl
+import hashlib
+import tempfile
+import base64
+import select
 import subprocess
-import urllib, urllib2
+import urllib
+import urlparse
+import httplib
 import socket
-import telnetlib
+import threading
 
 
 __author__ = "Ali Onur Uyar"
@@ -22,6 +33,72 @@ __status__ = "Development"
 
 buffSize = 4096
 timeoutHTTP = 10
+httpMaxIdleConns = 4
+httpIdleTimeout = 60
+httpMaxRedirects = 5
+httpMaxResponseSize = 32 * 1024 * 1024
+maxLineLen = 65536
+defaultExecCacheDir = '/tmp/pymunin-exec-cache'
+
+statsPatterns = {
+    'colon': re.compile(r'^[ \t]*([^:\r\n]*[^:\s])[ \t]*:[ \t]*'
+                        r'(\S[^\r\n]*?)[ \t]*\r?$', re.MULTILINE),
+    'stat': re.compile(r'^STAT[ \t]+(\S+)[ \t]+(\S+)[ \t]*\r?$', 
+                       re.MULTILINE),
+    'equals': re.compile(r'^[ \t]*([^=\r\n]*[^=\s])[ \t]*=[ \t]*'
+                         r'(\S[^\r\n]*?)[ \t]*\r?$', re.MULTILINE),
+}
+_numPattern = re.compile(r'-?(?:(\d+)|\d*\.\d+)$')
+_boolPattern = re.compile(r'(yes|on)|no|off', re.IGNORECASE)
+
+_callStats = None
+_callStatsLock = threading.Lock()
+_httpPool = None
+_httpPoolLock = threading.Lock()
+_execCache = None
+
+
+def enable_call_stats():
+    """Enable recording of call counts and latencies for data collection 
+    calls (exec_command, get_url, database queries) and reset the stats.
+    
+    """
+    global _callStats
+    _callStats = {}
+    
+    
+def get_call_stats():
+    """Returns recorded call counts and latencies.
+    
+    @return: Dictionary that maps call type to list of call count, total time 
+             and maximum time in seconds. None if recording is not enabled.
+    
+    """
+    return _callStats
+
+
+def record_call(name, start):
+    """Record latency of data collection call if call stats are enabled.
+    
+    @param name:  Call type.
+    @param start: Start time of call in seconds since the epoch.
+    
+    """
+    if _callStats is None:
+        return
+    elapsed = time.time() - start
+    _callStatsLock.acquire()
+    try:
+        stats = _callStats.get(name)
+        if stats is None:
+            _callStats[name] = [1, elapsed, elapsed]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+    finally:
+        _callStatsLock.release()
 
 
 def parse_value(val, parsebool=False):
@@ -32,16 +109,93 @@ def parse_value(val, parsebool=False):
     @return:          Value of type int, float or str.
         
     """
-    if re.match('-{0,1}\d+$',  str(val)):
+    if isinstance(val, str):
+        if val.isdigit():
             return int(val)
-    elif re.match('-{0,1}\d*\.\d+$',  str(val)):
-        return float(val)
-    elif parsebool and re.match('yes|on', str(val), re.IGNORECASE):
-        return True
-    elif parsebool and re.match('no|off', str(val), re.IGNORECASE):
-        return False
+        sval = val
+    else:
+        sval = str(val)
+    mobj = _numPattern.match(sval)
+    if mobj:
+        if mobj.group(1) is not None:
+            return int(sval)
+        else:
+            return float(sval)
+    if parsebool:
+        mobj = _boolPattern.match(sval)
+        if mobj:
+            return mobj.group(1) is not None
+    return val
+
+
+def parse_bool_value(val):
+    """Parse input string and return int, float, bool or str depending on 
+    format. Equivalent to parse_value(val, True).
+    
+    @param val: Input string.
+    @return:    Value of type int, float, bool or str.
+    
+    """
+    return parse_value(val, True)
+
+
+def parse_stats(data, fmt='colon', schema=None, parsebool=False, 
+                convert=None):
+    """Parse multiline text with one key-value pair per line and return 
+    dictionary of values.
+    
+    The whole text is scanned in one pass with a precompiled pattern; lines 
+    that do not match the pattern are ignored. Predefined formats:
+        colon  - key: value
+        stat   - STAT key value
+        equals - key = value
+    
+    @param data:      Multiline text.
+    @param fmt:       Name of predefined format or compiled regular expression
+                      pattern with two groups for key and value that is 
+                      applied in MULTILINE mode.
+    @param schema:    Dictionary that maps keys to conversion functions (int, 
+                      float, str, etc.) that are applied directly to the 
+                      values of known fields. Values of other fields and 
+                      values failing conversion are parsed using convert.
+    @param parsebool: If True parse yes / no, on / off as boolean.
+    @param convert:   Conversion function for values. (Default: parse_value)
+    @return:          Dictionary of values.
+    
+    """
+    if isinstance(fmt, basestring):
+        try:
+            pattern = statsPatterns[fmt]
+        except KeyError:
+            raise ValueError("Invalid stats format: %s" % fmt)
+    else:
+        pattern = fmt
+    if convert is None:
+        if parsebool:
+            convert = parse_bool_value
+        else:
+            convert = parse_value
+        # Shortcut for the most common case of unsigned integer values.
+        fastint = True
     else:
-        return val
+        fastint = False
+    if schema is None:
+        schema = {}
+    stats = {}
+    for (key, val) in pattern.findall(data):
+        if schema:
+            func = schema.get(key)
+            if func is not None:
+                try:
+                    stats[key] = func(val)
+                    continue
+                except ValueError:
+                    pass
+        if fastint and val.isdigit():
+            stats[key] = int(val)
+        else:
+            stats[key] = convert(val)
+    return stats
     
 
 def safe_sum(seq):
@@ -57,35 +211,94 @@ def safe_sum(seq):
         return sum(seq)
 
 
-def socket_read(fp):
+def socket_read(fp, max_size=None):
     """Buffered read from socket. Reads all data available from socket.
     
-    @fp:     File pointer for socket.
-    @return: String of characters read from buffer.
+    @fp:       File pointer for socket.
+    @max_size: Maximum number of bytes; IOError is raised for larger responses.
+               (No limit if None.)
+    @return:   String of characters read from buffer.
     
     """
-    response = ''
-    oldlen = 0
-    newlen = 0
+    chunks = []
+    total = 0
     while True:
-        response += fp.read(buffSize)
-        newlen = len(response)
-        if newlen - oldlen == 0:
+        data = fp.read(buffSize)
+        if not data:
             break
-        else:
-            oldlen = newlen
-    return response
+        total += len(data)
+        if max_size is not None and total > max_size:
+            raise IOError("Response exceeds maximum size of %d bytes." 
+                          % max_size)
+        chunks.append(data)
+    return ''.join(chunks)
 
 
-def exec_command(args, env=None):
+def enable_exec_cache(ttl, cache_dir=defaultExecCacheDir):
+    """Enable caching of the output of commands executed by exec_command.
+    
+    The cache is shared by all processes using the same cache directory.
+    
+    @param ttl:       Time to live for cached output in seconds.
+    @param cache_dir: Cache directory.
+    
+    """
+    global _execCache
+    _execCache = ExecCache(cache_dir, ttl)
+    
+    
+def disable_exec_cache():
+    """Disable caching of the output of commands."""
+    global _execCache
+    _execCache = None
+    
+    
+def get_exec_cache_stats():
+    """Returns the number of command executions served from the cache and 
+    the number of fresh executions of commands.
+    
+    @return: Dictionary with the cached and fresh counts. None if caching is 
+             not enabled.
+    
+    """
+    if _execCache is None:
+        return None
+    return _execCache.getStats()
+
+
+def exec_command(args, env=None, cache=None):
     """Convenience function that executes command and returns result.
     
+    The output is served from the command cache passed by the caller, or 
+    from the process wide command cache if caching is enabled by 
+    enable_exec_cache.
+    
+    @param args:  Tuple of command and arguments.
+    @param env:   Dictionary of environment variables.
+                  (Environment is not modified if None.)
+    @param cache: ExecCache instance. The process wide command cache is used 
+                  if None and no command cache is used if False.
+    @return:      Command output.
+    
+    """ 
+    if cache is None:
+        cache = _execCache
+    if cache:
+        return cache.execute(_exec_command, args, env)
+    else:
+        return _exec_command(args, env)
+
+
+def _exec_command(args, env=None):
+    """Executes command and returns result.
+    
     @param args: Tuple of command and arguments.
     @param env:  Dictionary of environment variables.
                  (Environment is not modified if None.)
     @return:     Command output.
     
     """ 
+    start = time.time()
     try:
         cmd = subprocess.Popen(args, 
                                stdout=subprocess.PIPE,
@@ -96,41 +309,756 @@ def exec_command(args, env=None):
         raise Exception("Execution of command failed.\n",
                         "  Command: %s\n  Error: %s" % (' '.join(args), str(e)))
     out, err = cmd.communicate(None)
+    record_call('exec_command', start)
     if cmd.returncode != 0:
         raise Exception("Execution of command failed with error code: %s\n%s\n" 
                         % (cmd.returncode, err))
     return out
 
 
-def get_url(url, user=None, password=None, params=None, use_post=False):
-    if user is not None and password is not None:
-        pwdmgr = urllib2.HTTPPasswordMgrWithDefaultRealm()
-        pwdmgr.add_password(None, url, user, password)
-        auth_handler = urllib2.HTTPBasicAuthHandler(pwdmgr)
-        opener = urllib2.build_opener(auth_handler)
-    else:
-        opener = urllib2.build_opener()
-    if params is not None:
-        req_params = urllib.urlencode(params)
-        if use_post:
-            req_url = url
-            data = req_params
+def get_url(url, user=None, password=None, params=None, use_post=False,
+            timeout=None, max_size=httpMaxResponseSize):
+    """Retrieve URL and return the response body.
+    
+    The request is sent through the process wide pool of persistent HTTP 
+    connections. (See HTTPConnectionPool.)
+    
+    @param url:      URL.
+    @param user:     Username for Basic Authentication.
+    @param password: Password for Basic Authentication.
+    @param params:   Dictionary of request parameters.
+    @param use_post: Send parameters in body of POST request if True, in 
+                     the query string of GET request otherwise.
+    @param timeout:  Timeout in seconds. (Default: timeoutHTTP)
+    @param max_size: Maximum size of response in bytes. (No limit if None.)
+    @return:         Response body.
+    
+    """
+    start = time.time()
+    data = get_http_pool().request(url, user, password, params, use_post, 
+                                   timeout, max_size)
+    record_call('get_url', start)
+    return data
+
+
+def get_http_pool():
+    """Returns the process wide pool of persistent HTTP connections, which is
+    shared by all collectors and plugins running in the process.
+    
+    @return: HTTPConnectionPool instance.
+    
+    """
+    global _httpPool
+    if _httpPool is None:
+        _httpPoolLock.acquire()
+        try:
+            if _httpPool is None:
+                _httpPool = HTTPConnectionPool()
+        finally:
+            _httpPoolLock.release()
+    return _httpPool
+
+
+def timed_connection(conn, name='db_query'):
+    """Wraps DB-API connection to record the latency of queries when call 
+    stats are enabled.
+    
+    @param conn: DB-API connection object.
+    @param name: Call type for recorded queries.
+    @return:     Wrapped connection if call stats are enabled, the original
+                 connection otherwise.
+    
+    """
+    if _callStats is None:
+        return conn
+    return TimedConnection(conn, name)
+
+
+class TimedConnection:
+    """Wrapper for DB-API connection that returns cursors that record the
+    latency of queries.
+    
+    """
+    
+    def __init__(self, conn, name):
+        """Initialize wrapper.
+        
+        @param conn: DB-API connection object.
+        @param name: Call type for recorded queries.
+        
+        """
+        self._conn = conn
+        self._name = name
+        
+    def cursor(self, *args, **kwargs):
+        """Returns cursor that records the latency of queries."""
+        return TimedCursor(self._conn.cursor(*args, **kwargs), self._name)
+        
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class TimedCursor:
+    """Wrapper for DB-API cursor that records the latency of queries."""
+    
+    def __init__(self, cursor, name):
+        """Initialize wrapper.
+        
+        @param cursor: DB-API cursor object.
+        @param name:   Call type for recorded queries.
+        
+        """
+        self._cursor = cursor
+        self._name = name
+        
+    def execute(self, *args, **kwargs):
+        """Execute query recording the latency."""
+        start = time.time()
+        try:
+            return self._cursor.execute(*args, **kwargs)
+        finally:
+            record_call(self._name, start)
+            
+    def __iter__(self):
+        return iter(self._cursor)
+            
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+        
+
+
+class SocketReader:
+    """Buffered reader for sockets with cost linear in the size of the data.
+    
+    Data is received with recv_into() into a reusable bytearray buffer that 
+    is compacted or doubled in size when full. Payloads of known size are 
+    received directly into a buffer of the final size. The total number of 
+    bytes received can be capped to protect against runaway responses.
+    
+    """
+    
+    def __init__(self, sock, max_size=None, bufsize=buffSize):
+        """Initialize reader.
+        
+        @param sock:     Socket object.
+        @param max_size: Maximum number of bytes to receive; IOError is raised
+                         when the limit is exceeded. (No limit if None.)
+        @param bufsize:  Initial buffer size.
+        
+        """
+        self._sock = sock
+        self._maxSize = max_size
+        self._buf = bytearray(bufsize)
+        self._start = 0
+        self._end = 0
+        self._total = 0
+        self._eof = False
+        
+    def _recvInto(self, view):
+        """Receive data into memoryview and account for the received bytes.
+        
+        @param view: Writable memoryview.
+        @return:     Number of bytes received. 0 on EOF.
+        
+        """
+        while True:
+            try:
+                nbytes = self._sock.recv_into(view)
+                break
+            except socket.error, e:
+                if e.args[0] != errno.EINTR:
+                    raise
+        self._total += nbytes
+        if self._maxSize is not None and self._total > self._maxSize:
+            raise IOError("Response exceeds maximum size of %d bytes." 
+                          % self._maxSize)
+        return nbytes
+        
+    def _fill(self):
+        """Receive more data into the buffer.
+        
+        @return: Number of bytes received. 0 on EOF.
+        
+        """
+        if self._eof:
+            return 0
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buf):
+            if self._start > 0:
+                size = self._end - self._start
+                self._buf[:size] = self._buf[self._start:self._end]
+                self._start = 0
+                self._end = size
+            else:
+                self._buf.extend(bytearray(len(self._buf)))
+        nbytes = self._recvInto(memoryview(self._buf)[self._end:])
+        if nbytes == 0:
+            self._eof = True
+        self._end += nbytes
+        return nbytes
+    
+    def hasBufferedData(self):
+        """Returns True if data received from the socket has not been read.
+        
+        @return: Boolean.
+        
+        """
+        return self._end > self._start
+    
+    def readline(self):
+        """Read line.
+        
+        @return: Line including terminating newline. Shorter if EOF is
+                 reached, empty string on EOF.
+        
+        """
+        scanned = 0
+        while True:
+            idx = self._buf.find('\n', self._start + scanned, self._end)
+            if idx >= 0:
+                line = str(self._buf[self._start:idx + 1])
+                self._start = idx + 1
+                return line
+            scanned = self._end - self._start
+            if scanned > maxLineLen:
+                raise IOError("Line exceeds maximum length of %d bytes." 
+                              % maxLineLen)
+            if self._fill() == 0:
+                line = str(self._buf[self._start:self._end])
+                self._start = self._end
+                return line
+            
+    def read(self, size):
+        """Read exactly size bytes.
+        
+        @param size: Number of bytes.
+        @return:     String.
+        
+        """
+        avail = self._end - self._start
+        if avail >= size:
+            data = str(self._buf[self._start:self._start + size])
+            self._start += size
+            return data
+        if self._maxSize is not None and self._total - avail + size > self._maxSize:
+            raise IOError("Response exceeds maximum size of %d bytes." 
+                          % self._maxSize)
+        out = bytearray(size)
+        out[:avail] = self._buf[self._start:self._end]
+        self._start = self._end = 0
+        view = memoryview(out)
+        pos = avail
+        while pos < size:
+            nbytes = self._recvInto(view[pos:])
+            if nbytes == 0:
+                self._eof = True
+                raise IOError("Connection closed after %d of %d bytes." 
+                              % (pos, size))
+            pos += nbytes
+        return str(out)
+    
+    def readAll(self):
+        """Read until EOF.
+        
+        @return: String.
+        
+        """
+        while self._fill() > 0:
+            pass
+        data = str(self._buf[self._start:self._end])
+        self._start = self._end
+        return data
+    
+    def readChunked(self):
+        """Read body with chunked transfer coding.
+        
+        @return: Decoded body.
+        
+        """
+        chunks = []
+        while True:
+            line = self.readline()
+            if not line:
+                raise IOError("Connection closed in chunked body.")
+            try:
+                size = int(line.split(';', 1)[0].strip(), 16)
+            except ValueError:
+                raise IOError("Invalid chunk size line: %r" % line)
+            if size == 0:
+                break
+            chunks.append(self.read(size))
+            self.readline()
+        while True:
+            line = self.readline()
+            if line in ('\r\n', '\n', ''):
+                break
+        return ''.join(chunks)
+
+
+class ExecCache:
+    """Class for caching the output of commands in files shared between 
+    processes.
+    
+    The entries are keyed by the SHA1 hash of the command arguments and the 
+    environment and expire ttl seconds after the command was executed. 
+    Callers that miss the cache serialize on a lock file for the entry using 
+    flock; callers waiting for the lock are served the output of the 
+    execution that was in progress. Entries are replaced atomically and only
+    the output of successful executions is cached.
+    
+    """
+    
+    def __init__(self, cache_dir, ttl):
+        """Initialize command cache.
+        
+        @param cache_dir: Cache directory. The directory is created if it does
+                          not exist and must be owned by the effective user.
+        @param ttl:       Time to live for cached output in seconds.
+        
+        """
+        self._dir = cache_dir
+        self._ttl = ttl
+        self._stats = {'cached': 0, 'fresh': 0}
+        self._statsLock = threading.Lock()
+        try:
+            os.mkdir(cache_dir, 0700)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+        st = os.lstat(cache_dir)
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.geteuid():
+            raise IOError("Cache directory %s is not a directory owned by "
+                          "the user." % cache_dir)
+        
+    def _getPath(self, args, env):
+        """Returns the path of the cache entry for command.
+        
+        @param args: Tuple of command and arguments.
+        @param env:  Dictionary of environment variables or None.
+        @return:     Path of cache file.
+        
+        """
+        if env is not None:
+            env = sorted(env.items())
+        key = hashlib.sha1(repr((list(args), env))).hexdigest()
+        return os.path.join(self._dir, key)
+    
+    def _readEntry(self, path):
+        """Read cache entry if it has not expired.
+        
+        @param path: Path of cache file.
+        @return:     Cached output or None.
+        
+        """
+        try:
+            fp = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            age = time.time() - os.fstat(fp.fileno()).st_mtime
+            if age < 0 or age >= self._ttl:
+                return None
+            return fp.read()
+        finally:
+            fp.close()
+            
+    def _writeEntry(self, path, data):
+        """Write cache entry replacing the existing entry atomically.
+        
+        @param path: Path of cache file.
+        @param data: Command output.
+        
+        """
+        (fd, tmp_path) = tempfile.mkstemp(prefix='.tmp', dir=self._dir)
+        try:
+            fp = os.fdopen(fd, 'wb')
+            try:
+                fp.write(data)
+            finally:
+                fp.close()
+            os.rename(tmp_path, path)
+        except:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        
+    def _count(self, name):
+        """Increment counter for cached or fresh executions.
+        
+        @param name: Counter name.
+        
+        """
+        self._statsLock.acquire()
+        try:
+            self._stats[name] += 1
+        finally:
+            self._statsLock.release()
+    
+    def getStats(self):
+        """Returns the number of executions served from the cache and the 
+        number of fresh executions.
+        
+        @return: Dictionary with the cached and fresh counts.
+        
+        """
+        return self._stats.copy()
+    
+    def execute(self, func, args, env=None):
+        """Returns the cached output of command or executes the command and 
+        caches the output.
+        
+        @param func: Function that executes command with args and env 
+                     arguments and returns the output.
+        @param args: Tuple of command and arguments.
+        @param env:  Dictionary of environment variables.
+        @return:     Command output.
+        
+        """
+        path = self._getPath(args, env)
+        data = self._readEntry(path)
+        if data is None:
+            lock_fp = open(path + '.lock', 'a')
+            try:
+                fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
+                data = self._readEntry(path)
+                if data is None:
+                    data = func(args, env)
+                    self._count('fresh')
+                    try:
+                        self._writeEntry(path, data)
+                    except (IOError, OSError):
+                        pass
+                    return data
+            finally:
+                lock_fp.close()
+        self._count('cached')
+        return data
+
+
+class HTTPConnectionPool:
+    """Pool of persistent HTTP / HTTPS connections.
+    
+    Idle keep-alive connections are kept per (scheme, host, port) and reused
+    for subsequent requests, which saves the TCP connection setup and the TLS
+    handshake. Basic Authentication credentials are sent preemptively using 
+    cached authorization headers. Connections that have been closed by the 
+    server while idle are discarded, and requests failing on a reused 
+    connection are retried once on a new connection. Responses are read 
+    directly from the socket using SocketReader according to the message 
+    framing (Content-Length or chunked transfer coding).
+    
+    """
+    
+    def __init__(self, max_idle=httpMaxIdleConns, idle_timeout=httpIdleTimeout):
+        """Initialize connection pool.
+        
+        @param max_idle:     Maximum number of idle connections per server.
+        @param idle_timeout: Idle connections are closed after idle_timeout 
+                             seconds.
+        
+        """
+        self._maxIdle = max_idle
+        self._idleTimeout = idle_timeout
+        self._idle = {}
+        self._authHeaders = {}
+        self._lock = threading.Lock()
+        
+    def _getConnection(self, key, timeout, reuse=True):
+        """Returns idle connection for server or new connection.
+        
+        @param key:     Tuple of scheme, host and port.
+        @param timeout: Timeout in seconds.
+        @param reuse:   Return idle connection if available when True, new 
+                        connection otherwise.
+        @return:        Tuple of connection and True if the connection is 
+                        reused.
+        
+        """
+        now = time.time()
+        conn = None
+        self._lock.acquire()
+        try:
+            if reuse:
+                conns = self._idle.get(key)
+            else:
+                conns = None
+            while conns:
+                (idle_conn, last_use) = conns.pop()
+                if (now - last_use < self._idleTimeout 
+                    and not self._isStale(idle_conn)):
+                    conn = idle_conn
+                    break
+                idle_conn.close()
+        finally:
+            self._lock.release()
+        if conn is not None:
+            conn.timeout = timeout
+            conn.sock.settimeout(timeout)
+            return (conn, True)
+        (scheme, host, port) = key
+        if scheme == 'https':
+            conn_class = httplib.HTTPSConnection
         else:
-            req_url = "%s?%s" % (url, req_params)
-            data = None
-    else:
-        req_url = url
-        data = None
-    try:
+            conn_class = httplib.HTTPConnection
         if sys.version_info[:2] < (2,6):
-            resp = opener.open(req_url, data)
+            conn = conn_class(host, port)
         else:
-            resp = opener.open(req_url, data, timeoutHTTP)
-    except urllib2.URLError, e:
-        raise Exception("Retrieval of URL failed.\n"
-                        "  url: %s\n  Error: %s" % (url, str(e)))
-    return socket_read(resp)
+            conn = conn_class(host, port, timeout=timeout)
+        return (conn, False)
+    
+    def _isStale(self, conn):
+        """Returns True if idle connection cannot be reused.
+        
+        An idle keep-alive connection must not be readable; data or EOF 
+        pending on the socket means that the server has closed the connection.
+        
+        @param conn: Connection.
+        @return:     Boolean.
+        
+        """
+        if conn.sock is None:
+            return True
+        try:
+            (rlist, wlist, xlist) = select.select([conn.sock], [], [], 0) #@UnusedVariable
+        except (select.error, socket.error, ValueError):
+            return True
+        return len(rlist) > 0
+        
+    def _releaseConnection(self, key, conn):
+        """Returns connection to the pool of idle connections.
+        
+        @param key:  Tuple of scheme, host and port.
+        @param conn: Connection.
+        
+        """
+        self._lock.acquire()
+        try:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self._maxIdle:
+                conns.append((conn, time.time()))
+                conn = None
+        finally:
+            self._lock.release()
+        if conn is not None:
+            conn.close()
+            
+    def _getAuthHeader(self, user, password):
+        """Returns cached header value for Basic Authentication.
+        
+        @param user:     Username.
+        @param password: Password.
+        @return:         Header value.
+        
+        """
+        auth = self._authHeaders.get((user, password))
+        if auth is None:
+            auth = "Basic %s" % base64.b64encode("%s:%s" % (user, password))
+            self._authHeaders[(user, password)] = auth
+        return auth
+    
+    def _send(self, key, method, path, body, headers, timeout, max_size):
+        """Send request and read response using pooled connection.
         
+        @param key:      Tuple of scheme, host and port.
+        @param method:   HTTP method.
+        @param path:     Request path including query string.
+        @param body:     Request body or None.
+        @param headers:  Dictionary of request headers.
+        @param timeout:  Timeout in seconds.
+        @param max_size: Maximum size of response in bytes.
+        @return:         Tuple of status code, reason phrase, dictionary of 
+                         response headers with lowercase names and body.
+        
+        """
+        (scheme, host, port) = key
+        if ':' in host:
+            host = "[%s]" % host
+        if port not in (httplib.HTTP_PORT, httplib.HTTPS_PORT):
+            host = "%s:%d" % (host, port)
+        lines = ["%s %s HTTP/1.1" % (method, path), "Host: %s" % host,
+                 "Accept-Encoding: identity"]
+        for (name, val) in headers.iteritems():
+            lines.append("%s: %s" % (name, val))
+        if body is not None:
+            lines.append("Content-Length: %d" % len(body))
+        req = "%s\r\n\r\n%s" % ("\r\n".join(lines), body or '')
+        for reuse in (True, False):
+            # A request failing on a reused connection is retried once on a
+            # new connection; the last attempt never reuses a connection, 
+            # so that errors are always raised.
+            (conn, reused) = self._getConnection(key, timeout, reuse)
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                conn.sock.sendall(req)
+                (status, reason, resp_headers, 
+                 data, will_close) = self._readResponse(conn.sock, method, 
+                                                        max_size)
+            except (httplib.HTTPException, IOError), e:
+                conn.close()
+                if (reused and method != 'POST' 
+                    and not isinstance(e, socket.timeout)):
+                    continue
+                raise
+            if will_close:
+                conn.close()
+            else:
+                self._releaseConnection(key, conn)
+            return (status, reason, resp_headers, data)
+    
+    def _readResponse(self, sock, method, max_size):
+        """Read HTTP response from socket.
+        
+        The body is read according to the framing of the message (no body,
+        chunked transfer coding, Content-Length or until the connection is 
+        closed), so reading stops as soon as the message is complete.
+        
+        @param sock:     Socket object.
+        @param method:   HTTP method of request.
+        @param max_size: Maximum size of response in bytes.
+        @return:         Tuple of status code, reason phrase, dictionary of 
+                         response headers with lowercase names, body and 
+                         True if the connection must be closed.
+        
+        """
+        reader = SocketReader(sock, max_size)
+        while True:
+            line = reader.readline()
+            if not line:
+                raise httplib.BadStatusLine(line)
+            parts = line.split(None, 2)
+            if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+                raise httplib.BadStatusLine(line)
+            version = parts[0]
+            try:
+                status = int(parts[1])
+            except ValueError:
+                raise httplib.BadStatusLine(line)
+            if len(parts) > 2:
+                reason = parts[2].strip()
+            else:
+                reason = ''
+            headers = {}
+            while True:
+                line = reader.readline()
+                if line in ('\r\n', '\n', ''):
+                    break
+                (name, sep, val) = line.partition(':') #@UnusedVariable
+                name = name.strip().lower()
+                val = val.strip()
+                if headers.has_key(name):
+                    headers[name] = "%s, %s" % (headers[name], val)
+                else:
+                    headers[name] = val
+            if status < 100 or status >= 200:
+                break
+        conn_opts = headers.get('connection', '').lower()
+        will_close = ('close' in conn_opts 
+                      or (version == 'HTTP/1.0' and 'keep-alive' not in conn_opts))
+        if method == 'HEAD' or status in (204, 304):
+            data = ''
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            data = reader.readChunked()
+        elif headers.has_key('content-length'):
+            try:
+                length = int(headers['content-length'])
+            except ValueError:
+                raise httplib.HTTPException("Invalid Content-Length: %s" 
+                                            % headers['content-length'])
+            data = reader.read(length)
+        else:
+            data = reader.readAll()
+            will_close = True
+        if reader.hasBufferedData():
+            will_close = True
+        return (status, reason, headers, data, will_close)
+    
+    def request(self, url, user=None, password=None, params=None, 
+                use_post=False, timeout=None, max_size=httpMaxResponseSize):
+        """Retrieve URL and return the response body.
+        
+        @param url:      URL.
+        @param user:     Username for Basic Authentication.
+        @param password: Password for Basic Authentication.
+        @param params:   Dictionary of request parameters.
+        @param use_post: Send parameters in body of POST request if True, in 
+                         the query string of GET request otherwise.
+        @param timeout:  Timeout in seconds. (Default: timeoutHTTP)
+        @param max_size: Maximum size of response in bytes. (No limit if None.)
+        @return:         Response body.
+        
+        """
+        if timeout is None:
+            timeout = timeoutHTTP
+        method = 'GET'
+        body = None
+        headers = {'Accept': '*/*', 'Connection': 'keep-alive'}
+        if params is not None:
+            req_params = urllib.urlencode(params)
+            if use_post:
+                method = 'POST'
+                body = req_params
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            else:
+                url = "%s?%s" % (url, req_params)
+        if user is not None and password is not None:
+            headers['Authorization'] = self._getAuthHeader(user, password)
+        netloc = urlparse.urlsplit(url).netloc
+        for redirect in range(httpMaxRedirects + 1): #@UnusedVariable
+            parts = urlparse.urlsplit(url)
+            if parts.netloc != netloc:
+                # Credentials are not passed on to other servers.
+                headers.pop('Authorization', None)
+            scheme = parts.scheme.lower()
+            if scheme not in ('http', 'https') or not parts.hostname:
+                raise Exception("Retrieval of URL failed.\n"
+                                "  url: %s\n  Error: Invalid URL." % url)
+            if parts.port is not None:
+                port = parts.port
+            elif scheme == 'https':
+                port = httplib.HTTPS_PORT
+            else:
+                port = httplib.HTTP_PORT
+            path = parts.path or '/'
+            if parts.query:
+                path = "%s?%s" % (path, parts.query)
+            try:
+                (status, reason, resp_headers, 
+                 data) = self._send((scheme, parts.hostname, port), method, 
+                                    path, body, headers, timeout, max_size)
+            except (httplib.HTTPException, IOError), e:
+                raise Exception("Retrieval of URL failed.\n"
+                                "  url: %s\n  Error: %s" % (url, str(e)))
+            location = resp_headers.get('location')
+            if status in (301, 302, 303, 307) and location:
+                url = urlparse.urljoin(url, location)
+                if status != 307:
+                    method = 'GET'
+                    body = None
+                    headers.pop('Content-Type', None)
+                continue
+            if status >= 400:
+                raise Exception("Retrieval of URL failed.\n"
+                                "  url: %s\n  Error: HTTP Error %d: %s" 
+                                % (url, status, reason))
+            return data
+        raise Exception("Retrieval of URL failed.\n"
+                        "  url: %s\n  Error: Too many redirects." % url)
+    
+    def clear(self):
+        """Close all idle connections."""
+        self._lock.acquire()
+        try:
+            idle = self._idle
+            self._idle = {}
+        finally:
+            self._lock.release()
+        for conns in idle.values():
+            for (conn, last_use) in conns: #@UnusedVariable
+                conn.close()
 
 
 class NestedDict(dict):
@@ -163,6 +1091,246 @@ class NestedDict(dict):
             curr_dict[last_key] = value
 
     
+class CounterStore:
+    """Flat container for counters with dotted names (e.g. client_http.hits).
+    
+    The values are stored in a list indexed by a dictionary that maps the 
+    full names to list positions, instead of a tree of nested dictionaries.
+    Views on the counters with a common prefix are returned for partial 
+    names, so nested access (store['client_http']['hits']) keeps working.
+    Optionally only a declared set of wanted counters is loaded.
+    
+    """
+    
+    def __init__(self, wanted=None):
+        """Initialize counter store.
+        
+        @param wanted: List of wanted counter names. Names ending with .* 
+                       select all counters with the prefix. All counters are 
+                       loaded if None.
+        
+        """
+        self._index = {}
+        self._keys = []
+        self._values = []
+        self._prefixIndex = None
+        if wanted is None:
+            self._wantedKeys = None
+            self._wantedPrefixes = None
+        else:
+            self._wantedKeys = frozenset([key for key in wanted 
+                                          if not key.endswith('.*')])
+            self._wantedPrefixes = tuple([key[:-1] for key in wanted 
+                                          if key.endswith('.*')])
+    
+    def wants(self, key):
+        """Returns True if the counter is in the set of wanted counters.
+        
+        @param key: Counter name.
+        @return:    Boolean
+        
+        """
+        if self._wantedKeys is None or key in self._wantedKeys:
+            return True
+        return key.startswith(self._wantedPrefixes)
+    
+    def set(self, key, value):
+        """Set value of counter.
+        
+        @param key:   Counter name.
+        @param value: Value.
+        
+        """
+        idx = self._index.get(key)
+        if idx is None:
+            self._index[key] = len(self._values)
+            self._keys.append(key)
+            self._values.append(value)
+            self._prefixIndex = None
+        else:
+            self._values[idx] = value
+    
+    __setitem__ = set
+    
+    def load(self, pairs, convert=None):
+        """Load wanted counters from sequence of name-value pairs.
+        
+        @param pairs:   Sequence of tuples of counter name and value.
+        @param convert: Conversion function applied to values of wanted 
+                        counters.
+        
+        """
+        if self._wantedKeys is None:
+            wants = None
+        else:
+            wants = self.wants
+        for (key, value) in pairs:
+            if wants is None or wants(key):
+                if convert is not None:
+                    value = convert(value)
+                self.set(key, value)
+            
+    def _getPrefixSlots(self, prefix):
+        """Returns list positions of counters with prefix.
+        
+        The index of prefixes is built on first use after modification.
+        
+        @param prefix: Prefix including the trailing dot.
+        @return:       List of positions.
+        
+        """
+        if self._prefixIndex is None:
+            prefix_index = {}
+            for (idx, key) in enumerate(self._keys):
+                pos = key.find('.')
+                while pos >= 0:
+                    prefix_index.setdefault(key[:pos + 1], []).append(idx)
+                    pos = key.find('.', pos + 1)
+            self._prefixIndex = prefix_index
+        return self._prefixIndex.get(prefix, [])
+    
+    def getView(self, prefix):
+        """Returns view on the counters with prefix.
+        
+        @param prefix: Prefix without the trailing dot.
+        @return:       CounterView object.
+        
+        """
+        return CounterView(self, "%s." % prefix)
+    
+    def get(self, key, default=None):
+        """Returns value of counter.
+        
+        @param key:     Counter name.
+        @param default: Value returned for missing counters.
+        @return:        Value of counter, view for prefix or default.
+        
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def __getitem__(self, key):
+        idx = self._index.get(key)
+        if idx is not None:
+            return self._values[idx]
+        if self._getPrefixSlots("%s." % key):
+            return self.getView(key)
+        raise KeyError(key)
+    
+    def has_key(self, key):
+        """Returns True if counter or counters with prefix exist.
+        
+        @param key: Counter name or prefix.
+        @return:    Boolean
+        
+        """
+        return (self._index.has_key(key) 
+                or len(self._getPrefixSlots("%s." % key)) > 0)
+    
+    __contains__ = has_key
+    
+    def __len__(self):
+        return len(self._values)
+    
+    def keys(self):
+        """Returns list of counter names."""
+        return list(self._keys)
+    
+    def values(self):
+        """Returns list of counter values."""
+        return list(self._values)
+    
+    def items(self):
+        """Returns list of (name, value) pairs."""
+        return zip(self._keys, self._values)
+    
+    def iteritems(self):
+        """Returns iterator on (name, value) pairs."""
+        return iter(self.items())
+    
+    def toDict(self):
+        """Returns dictionary that maps counter names to values."""
+        return dict(zip(self._keys, self._values))
+
+
+class CounterView:
+    """View on the counters of a CounterStore with a common prefix. The names
+    of counters are relative to the prefix.
+    
+    """
+    
+    def __init__(self, store, prefix):
+        """Initialize view.
+        
+        @param store:  CounterStore object.
+        @param prefix: Prefix including the trailing dot.
+        
+        """
+        self._store = store
+        self._prefix = prefix
+        
+    def get(self, key, default=None):
+        """Returns value of counter.
+        
+        @param key:     Counter name relative to prefix.
+        @param default: Value returned for missing counters.
+        @return:        Value of counter, view for prefix or default.
+        
+        """
+        return self._store.get(self._prefix + key, default)
+    
+    def __getitem__(self, key):
+        return self._store[self._prefix + key]
+    
+    def has_key(self, key):
+        """Returns True if counter or counters with prefix exist.
+        
+        @param key: Counter name or prefix relative to prefix.
+        @return:    Boolean
+        
+        """
+        return self._store.has_key(self._prefix + key)
+    
+    __contains__ = has_key
+    
+    def __len__(self):
+        return len(self._store._getPrefixSlots(self._prefix))
+    
+    def keys(self):
+        """Returns list of counter names relative to prefix."""
+        start = len(self._prefix)
+        keys = self._store._keys
+        return [keys[idx][start:] 
+                for idx in self._store._getPrefixSlots(self._prefix)]
+    
+    def items(self):
+        """Returns list of (name, value) pairs with names relative to 
+        prefix.
+        
+        """
+        start = len(self._prefix)
+        keys = self._store._keys
+        values = self._store._values
+        return [(keys[idx][start:], values[idx]) 
+                for idx in self._store._getPrefixSlots(self._prefix)]
+    
+    def iteritems(self):
+        """Returns iterator on (name, value) pairs with names relative to 
+        prefix.
+        
+        """
+        return iter(self.items())
+    
+    def toDict(self):
+        """Returns dictionary that maps counter names relative to prefix to 
+        values.
+        
+        """
+        return dict(self.items())
+
+    
 class SoftwareVersion(tuple):
     """Class for parsing, storing and comparing versions.
     
@@ -220,11 +1388,19 @@ class TableFilter:
     
     The tables are represented as nested lists (list of lists of columns.)
     
+    The filters are compiled once for the column headers of the table into a 
+    list of column tests; equality filters are checked using set lookups and 
+    the patterns of regex filters are combined into a single expression. The 
+    tests are applied column by column on the rows remaining after the 
+    previous tests, starting with the tests that are expected to be the most 
+    selective and the cheapest.
+    
     """
     
     def __init__(self):
         """Initialize Filter."""
         self._filters = {}
+        self._compiled = None
     
     def registerFilter(self, column, patterns, is_regex=False, 
                        ignore_case=False):
@@ -258,6 +1434,7 @@ class TableFilter:
             else:
                 patt_exprs = patt_list
         self._filters[column] = (patt_exprs, is_regex, ignore_case)
+        self._compiled = None
                     
     def unregisterFilter(self, column):
         """Unregister filter on a column of the table.
@@ -267,6 +1444,7 @@ class TableFilter:
         """
         if self._filters.has_key(column):
             del self._filters[column]
+            self._compiled = None
             
     def registerFilters(self, **kwargs):
         """Register multiple filters at once.
@@ -298,6 +1476,86 @@ class TableFilter:
             else:
                 ignore_case = False
             self.registerFilter(col, patterns, is_regex, ignore_case)
+    
+    def _compileRegex(self, patt_exprs):
+        """Returns test function for a list of compiled regex patterns.
+        
+        The patterns are combined into a single alternation unless more than 
+        one of the patterns has groups, whose numbers and names would clash 
+        or shift in the combined expression, or the patterns use inline 
+        flags; the patterns are tested separately in that case.
+        
+        @param patt_exprs: List of compiled regex patterns.
+        @return:           Function that returns a true value for strings 
+                           matching any of the patterns.
+        
+        """
+        if len(patt_exprs) == 1:
+            return patt_exprs[0].search
+        def test(val):
+            for expr in patt_exprs:
+                if expr.search(val):
+                    return True
+            return False
+        if len([expr for expr in patt_exprs if expr.groups > 0]) > 1:
+            return test
+        for expr in patt_exprs:
+            if re.search(r'\(\?[iLmsux]', expr.pattern):
+                return test
+        combined = '|'.join(['(?:%s)' % expr.pattern for expr in patt_exprs])
+        try:
+            return re.compile(combined, patt_exprs[0].flags).search
+        except re.error:
+            return test
+            
+    def _compileFilters(self, headers):
+        """Compile registered filters for table with headers into ordered 
+        list of column tests. The result is cached for the last headers.
+        
+        @param headers: List of column headers.
+        @return:        List of tuples of column index and test function.
+        
+        """
+        key = tuple(headers)
+        if self._compiled is not None and self._compiled[0] == key:
+            return self._compiled[1]
+        tests = []
+        for (column, (patterns, 
+                      is_regex, 
+                      ignore_case)) in self._filters.iteritems():
+            try:
+                col_idx = headers.index(column)
+            except ValueError:
+                raise ValueError('Invalid column name %s in filter.' % column)
+            if is_regex:
+                cost = 2
+                test = self._compileRegex(patterns)
+            elif ignore_case:
+                cost = 1
+                test = (lambda val, values=frozenset(patterns): 
+                        val.lower() in values)
+            else:
+                cost = 0
+                test = frozenset(patterns).__contains__
+            tests.append((cost, len(patterns), col_idx, test))
+        tests.sort(key=lambda item: item[:3])
+        steps = [item[2:] for item in tests]
+        self._compiled = (key, steps)
+        return steps
+    
+    def _filterRows(self, steps, rows):
+        """Apply column tests on rows.
+        
+        @param steps: List of tuples of column index and test function.
+        @param rows:  Nested list of rows and columns.
+        @return:      List of rows passing all tests.
+        
+        """
+        for (col_idx, test) in steps:
+            rows = [row for row in rows if test(row[col_idx])]
+            if not rows:
+                break
+        return rows
             
     def applyFilters(self, headers, table):
         """Apply filter on ps command result.
@@ -308,85 +1566,395 @@ class TableFilter:
                         registered filters.
                         
         """
-        result = []
-        column_idxs = {}
-        for column in self._filters.keys():
+        steps = self._compileFilters(headers)
+        if steps:
+            return self._filterRows(steps, table)
+        else:
+            return list(table)
+    
+    def checkRow(self, headers, row):
+        """Check if a single row passes the registered filters.
+        
+        @param headers: List of column headers.
+        @param row:     List of columns.
+        @return:        True if the row passes all filters.
+        
+        """
+        for (col_idx, test) in self._compileFilters(headers):
+            if not test(row[col_idx]):
+                return False
+        return True
+    
+    def countFilters(self, headers, table, column=None):
+        """Count rows passing the registered filters without building the 
+        filtered table.
+        
+        @param headers: List of column headers.
+        @param table:   Nested list of rows and columns.
+        @param column:  Column header. If defined the rows are counted 
+                        separately for each value of the column.
+        @return:        Number of rows, or dictionary that maps the values of 
+                        column to the number of rows if column is defined.
+                        
+        """
+        steps = self._compileFilters(headers)
+        if column is not None:
             try:
-                column_idxs[column] = headers.index(column)
+                key_idx = headers.index(column)
             except ValueError:
-                raise ValueError('Invalid column name %s in filter.' % column)
-        for row in table:
-            for (column, (patterns, 
-                          is_regex, 
-                          ignore_case)) in self._filters.items():
-                col_idx = column_idxs[column]
-                col_val = row[col_idx]
-                if is_regex:
-                    for pattern in patterns:
-                        if pattern.search(col_val):
-                            break
-                    else:
-                        break
-                else:
-                    if ignore_case:
-                        col_val = col_val.lower()
-                    if col_val in patterns:
-                        pass
-                    else:
-                        break
-            else:
-                result.append(row)
-        return result
+                raise ValueError('Invalid column name %s.' % column)
+        if steps:
+            rows = self._filterRows(steps[:-1], table)
+            (col_idx, test) = steps[-1]
+            rows = (row for row in rows if test(row[col_idx]))
+        else:
+            rows = table
+        if column is None:
+            count = 0
+            for row in rows: #@UnusedVariable
+                count += 1
+            return count
+        counts = {}
+        for row in rows:
+            val = row[key_idx]
+            counts[val] = counts.get(val, 0) + 1
+        return counts
     
 
-class Telnet(telnetlib.Telnet):
+def run_requests(requests, timeout=None):
+    """Execute requests on multiple LineClient instances concurrently.
     
-    __doc__ = telnetlib.Telnet.__doc__
+    The requests are sent and the responses are read using non-blocking 
+    sockets served by a single poll loop, so the total time is determined by
+    the slowest server instead of the sum of the response times.
     
-    def __init__(self, host=None, port=0, socket_file=None, 
-                 timeout=socket.getdefaulttimeout()):
-        """Constructor.
+    @param requests: List of tuples of client, request data (None if nothing
+                     has to be sent), response terminator (None if no 
+                     response is expected) and optionally timeout in 
+                     seconds for request. Each client can appear only once.
+    @param timeout:  Default timeout in seconds for requests that do not 
+                     define a timeout. The timeout of the client is used if 
+                     None.
+    @return:         List with the response text for each request or the 
+                     exception raised for the request.
+    
+    """
+    results = [None] * len(requests)
+    pending = {}
+    for (idx, req) in enumerate(requests):
+        client = req[0]
+        if len(req) > 3 and req[3] is not None:
+            req_timeout = req[3]
+        else:
+            req_timeout = timeout
+        try:
+            if client._begin(req[1], req[2], req_timeout):
+                results[idx] = client._result
+                continue
+        except (IOError, socket.error), e:
+            client.close()
+            results[idx] = e
+            continue
+        fd = client.fileno()
+        if pending.has_key(fd):
+            raise ValueError("Multiple requests for the same client.")
+        pending[fd] = (idx, client)
+    while pending:
+        now = time.time()
+        wait = None
+        for (fd, (idx, client)) in pending.items():
+            deadline = client._deadline
+            if deadline is None:
+                continue
+            if deadline <= now:
+                client.close()
+                results[idx] = socket.timeout("Request to %s timed out." 
+                                              % client.getName())
+                del pending[fd]
+            elif wait is None or deadline - now < wait:
+                wait = deadline - now
+        if not pending:
+            break
+        poller = select.poll()
+        for (fd, (idx, client)) in pending.iteritems():
+            poller.register(fd, client._getEvents())
+        try:
+            if wait is not None:
+                ready = poller.poll(int(wait * 1000) + 1)
+            else:
+                ready = poller.poll()
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        for (fd, events) in ready:
+            (idx, client) = pending[fd]
+            try:
+                done = client._process(events)
+            except (IOError, socket.error), e:
+                client.close()
+                results[idx] = e
+                del pending[fd]
+                continue
+            if done:
+                results[idx] = client._result
+                del pending[fd]
+    return results
+
 
-        When called without arguments, create an unconnected instance.
-        With a host argument, it connects the instance using TCP; port number 
-        and timeout are optional, socket_file must be None.
+class LineClient:
+    """Client for line and block oriented text protocols (Memcached text 
+    protocol, Asterisk Manager Interface, etc.) over TCP or UNIX sockets.
+    
+    The socket is non-blocking and requests are driven by a poll loop; the 
+    end of the response is detected incrementally as the data arrives, by 
+    scanning only the new data for a terminator string or by matching each 
+    new complete line with a terminator regex. Multiple clients are polled 
+    concurrently by run_requests(). Closed connections are reopened on the 
+    next request.
+    
+    """
+    
+    def __init__(self, host=None, port=0, socket_file=None, timeout=None, 
+                 autoConnect=True):
+        """Initialize client.
         
-        With a socket_file argument, it connects the instance using
-        named socket; timeout is optional and host must be None.
+        @param host:        Server host for TCP connections.
+        @param port:        Server port for TCP connections.
+        @param socket_file: Socket file path for UNIX socket connections.
+        @param timeout:     Default timeout in seconds for requests. 
+                            (No timeout if None.)
+        @param autoConnect: Connect on instantiation if True.
         
         """
-        telnetlib.Telnet.__init__(self, timeout=timeout)
-        if host is not None or socket_file is not None:
-            self.open(host, port, socket_file, timeout=timeout)
+        if host is None and socket_file is None:
+            raise TypeError("Either host or socket_file argument is required.")
+        self._host = host
+        self._port = port
+        self._socketFile = socket_file
+        self._timeout = timeout
+        self._sock = None
+        self._connecting = False
+        self._rbuf = bytearray()
+        self._wbuf = ''
+        self._scanPos = 0
+        self._term = None
+        self._deadline = None
+        self._result = None
+        if autoConnect:
+            self.connect()
+            
+    def getName(self):
+        """Returns description of server address.
+        
+        @return: Address string.
+        
+        """
+        if self._socketFile is not None:
+            return "socket file %s" % self._socketFile
+        else:
+            return "host %s and port %s" % (self._host, self._port)
+        
+    def fileno(self):
+        """Returns file descriptor of socket.
+        
+        @return: File descriptor.
+        
+        """
+        return self._sock.fileno()
     
-    def open(self, host=None, port=0, socket_file=None, 
-             timeout=socket.getdefaulttimeout()):
-        """Connect to a host.
-
-        With a host argument, it connects the instance using TCP; port number 
-        and timeout are optional, socket_file must be None. The port number
-        defaults to the standard telnet port (23).
+    def connect(self, timeout=None):
+        """Connect to server.
         
-        With a socket_file argument, it connects the instance using
-        named socket; timeout is optional and host must be None.
-
-        Don't try to reopen an already connected instance.
+        @param timeout: Timeout in seconds. (Default timeout of client if None.)
         
         """
-        self.socket_file = socket_file
-        if host is not None:
-            if sys.version_info[:2] >= (2,6):
-                telnetlib.Telnet.open(self, host, port, timeout)
-            else:
-                telnetlib.Telnet.open(self, host, port)
-        elif socket_file is not None:
-            self.eof = 0
-            self.host = host
-            self.port = port
-            self.timeout = timeout
-            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-            self.sock.settimeout(timeout)
-            self.sock.connect(socket_file)
+        if self._sock is None:
+            self._open()
+        if self._connecting:
+            self._runRequest(None, None, timeout)
+    
+    def _open(self):
+        """Create non-blocking socket and start connecting to server."""
+        if self._socketFile is not None:
+            family = socket.AF_UNIX
+            addr = self._socketFile
+        else:
+            addrinfo = socket.getaddrinfo(self._host, self._port, 0, 
+                                          socket.SOCK_STREAM)[0]
+            family = addrinfo[0]
+            addr = addrinfo[4]
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(0)
+        err = sock.connect_ex(addr)
+        if err in (errno.EINPROGRESS, errno.EALREADY):
+            self._connecting = True
+        elif err == 0:
+            self._connecting = False
         else:
-            raise TypeError("Either host or socket_file argument is required.")      
-        
\ No newline at end of file
+            sock.close()
+            raise socket.error(err, os.strerror(err))
+        if family != socket.AF_UNIX:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._rbuf = bytearray()
+        self._scanPos = 0
+        
+    def close(self):
+        """Close connection."""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            self._connecting = False
+        
+    def _begin(self, data, terminator, timeout):
+        """Prepare request and connect if the connection is closed.
+        
+        @param data:       Request data or None.
+        @param terminator: Terminator string or compiled regex that matches 
+                           the last line of the response. None if no response
+                           is expected.
+        @param timeout:    Timeout in seconds. (Default timeout of client if 
+                           None.)
+        @return:           True if the response is already available in the 
+                           read buffer.
+        
+        """
+        if self._sock is None:
+            self._open()
+        self._wbuf = data or ''
+        self._term = terminator
+        self._result = None
+        if timeout is None:
+            timeout = self._timeout
+        if timeout is not None:
+            self._deadline = time.time() + timeout
+        else:
+            self._deadline = None
+        if self._connecting or self._wbuf:
+            return False
+        return self._scan()
+            
+    def _getEvents(self):
+        """Returns poll events the client is waiting for.
+        
+        @return: Poll event mask.
+        
+        """
+        if self._connecting or self._wbuf:
+            return select.POLLOUT
+        else:
+            return select.POLLIN
+            
+    def _process(self, events):
+        """Process poll events for socket.
+        
+        @param events: Poll event mask.
+        @return:       True if the request is complete.
+        
+        """
+        try:
+            if self._connecting:
+                err = self._sock.getsockopt(socket.SOL_SOCKET, 
+                                            socket.SO_ERROR)
+                if err != 0:
+                    raise socket.error(err, os.strerror(err))
+                self._connecting = False
+            if self._wbuf:
+                sent = self._sock.send(self._wbuf)
+                self._wbuf = self._wbuf[sent:]
+                if self._wbuf:
+                    return False
+                return self._scan()
+            if self._term is None:
+                return True
+            data = self._sock.recv(buffSize * 4)
+        except socket.error, e:
+            if e.args[0] in (errno.EAGAIN, errno.EINTR):
+                return False
+            raise
+        if not data:
+            raise IOError("Connection closed by %s." % self.getName())
+        self._rbuf += data
+        return self._scan()
+    
+    def _scan(self):
+        """Scan new data in read buffer for terminator and extract the 
+        response if the terminator is found.
+        
+        @return: True if the response is complete.
+        
+        """
+        term = self._term
+        buf = self._rbuf
+        if term is None:
+            self._result = None
+            return True
+        if isinstance(term, basestring):
+            idx = buf.find(term, max(self._scanPos - len(term) + 1, 0))
+            if idx < 0:
+                self._scanPos = len(buf)
+                return False
+            end = idx + len(term)
+        else:
+            while True:
+                idx = buf.find('\n', self._scanPos)
+                if idx < 0:
+                    return False
+                start = self._scanPos
+                self._scanPos = idx + 1
+                if term.match(str(buf[start:idx + 1])):
+                    end = idx + 1
+                    break
+        self._result = str(buf[:end])
+        del buf[:end]
+        self._scanPos = 0
+        return True
+    
+    def _runRequest(self, data, terminator, timeout):
+        """Execute single request.
+        
+        @param data:       Request data or None.
+        @param terminator: Response terminator or None.
+        @param timeout:    Timeout in seconds.
+        @return:           Response text.
+        
+        """
+        result = run_requests(((self, data, terminator, timeout),))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+            
+    def send(self, data, timeout=None):
+        """Send data to server.
+        
+        @param data:    Data string.
+        @param timeout: Timeout in seconds. (Default timeout of client if None.)
+        
+        """
+        self._runRequest(data, None, timeout)
+        
+    def read(self, terminator, timeout=None):
+        """Read response from server.
+        
+        @param terminator: Terminator string or compiled regex that matches the
+                           last line of the response.
+        @param timeout:    Timeout in seconds. (Default timeout of client if 
+                           None.)
+        @return:           Response text including the terminator.
+        
+        """
+        return self._runRequest(None, terminator, timeout)
+    
+    def request(self, data, terminator, timeout=None):
+        """Send request to server and read response.
+        
+        @param data:       Request data.
+        @param terminator: Terminator string or compiled regex that matches the
+                           last line of the response.
+        @param timeout:    Timeout in seconds. (Default timeout of client if 
+                           None.)
+        @return:           Response text including the terminator.
+        
+        """
+        return self._runRequest(data, terminator, timeout)
@@ -27,13 +27,15 @@ class VarnishInfo:
     
     _descDict = {}
     
-    def __init__(self, instance=None):
+    def __init__(self, instance=None, exec_cache=None):
         """Initialization for monitoring Varnish Cache instance.
         
-        @param instance: Name  of the Varnish Cache instance.
-                        (Defaults to hostname.)
+        @param instance:   Name  of the Varnish Cache instance.
+                           (Defaults to hostname.)
+        @param exec_cache: ExecCache instance for the output of commands.
         """
         self._instance = instance
+        self._execCache = exec_cache
         
 
     def getStats(self):
@@ -46,7 +48,7 @@ class VarnishInfo:
         args = [varnishstatCmd, '-1']
         if self._instance is not None:
             args.extend(['-n', self._instance])
-        output = util.exec_command(args)
+        output = util.exec_command(args, cache=self._execCache)
         if self._descDict is None:
             self._descDict = {}
         for line in output.splitlines():
@@ -23,6 +23,14 @@ wanpipemonCmd = '/usr/sbin/wanpipemon'
 
 class WanpipeInfo:
     """Class to retrieve stats for Wanpipe Interfaces."""
+    
+    def __init__(self, exec_cache=None):
+        """Initialize Wanpipe Stats.
+        
+        @param exec_cache: ExecCache instance for the output of commands.
+        
+        """
+        self._execCache = exec_cache
 
     def getIfaceStats(self):
         """Return dictionary of Traffic Stats for each Wanpipe Interface.
@@ -46,7 +54,8 @@ class WanpipeInfo:
 
         """
         info_dict = {}
-        output = util.exec_command([wanpipemonCmd, '-i', iface, '-c',  'Ta'])
+        output = util.exec_command([wanpipemonCmd, '-i', iface, '-c',  'Ta'],
+                                   cache=self._execCache)
         for line in output.splitlines():
             mobj = re.match('^\s*(Line Code Violation|Far End Block Errors|'
                             'CRC4 Errors|FAS Errors)\s*:\s*(\d+)\s*$', 
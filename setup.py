@@ -42,6 +42,7 @@ for modname in modules:
     }
     plugin_names.append(modname)
     console_scripts.append(u'%(script_name)s = %(script_path)s:%(entry)s' % params)
+console_scripts.append(u'%s-node = pymunin.node:main' % PYMUNIN_SCRIPT_FILENAME_PREFIX)
 
 
 class install(_install): 